@@ -0,0 +1,681 @@
+"""
+This module implements benchmarks for the background removal pipeline. It can be directly executed:
+    python benchmark.py inference --batch-sizes 1 4 8 16
+    python benchmark.py round-trip --megapixels 1 12 24
+    python benchmark.py composite --megapixels 1 12 48
+    python benchmark.py matting --megapixels 0.5 1 4
+    python benchmark.py stages path/to/image.jpg path/to/other_image.png
+    python benchmark.py suite --output results.json
+    python benchmark.py compare baseline.json results.json
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Iterator, Sequence
+
+
+def synthetic_image(megapixels: float, seed: int = 0):
+    """
+    Creates a random RGB image (4:3) with about "megapixels" million pixels and a mask for it
+    (an ellipse with soft borders, like the ones the model predicts).
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+    from PIL import Image, ImageDraw, ImageFilter  # type: ignore[import]
+
+    width: int = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height: int = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    img = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+    mask = Image.new("L", (320, 320), 0)
+    ImageDraw.Draw(mask).ellipse((60, 30, 260, 310), fill=255)
+    return img, mask.filter(ImageFilter.GaussianBlur(4))
+
+
+def bench_round_trip(megapixels: list[float]) -> dict[float, dict[str, float]]:
+    """
+    Compares (in seconds) the old way of compositing rm_bg's output, which went through a PNG
+    encoded by rembg and decoded again, with the current in memory one.
+    """
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image  # type: ignore[import]
+
+    import project  # type: ignore[import]
+
+    results: dict[float, dict[str, float]] = {}
+    for size in megapixels:
+        img, mask = synthetic_image(size)
+        timings: dict[str, float] = {}
+
+        with project.timed(timings, "old: cutout"):
+            full_mask = mask.resize(img.size, Image.LANCZOS)
+            cutout = Image.composite(img, Image.new("RGBA", img.size, 0), full_mask)
+        with project.timed(timings, "old: png encode"):
+            output_as_bytes = io.BytesIO()
+            cutout.save(output_as_bytes, "PNG")
+        with project.timed(timings, "old: png decode"):
+            pil_img = Image.open(io.BytesIO(output_as_bytes.getvalue())).convert("RGBA")
+        with project.timed(timings, "old: composite"):
+            background = Image.new("RGB", pil_img.size, (255, 255, 255))
+            background.paste(pil_img, pil_img.split()[-1])
+            background.convert("RGB")
+
+        new_timings: dict[str, float] = {}
+        project.composite(img, mask, timings=new_timings)
+        timings.update({f"new: {stage}": sec for stage, sec in new_timings.items()})
+
+        timings["old: total"] = sum(
+            sec for stage, sec in timings.items() if stage.startswith("old")
+        )
+        timings["new: total"] = sum(new_timings.values())
+        results[size] = timings
+    return results
+
+
+# Rows blended at a time by composite_array, so its temporary buffers stay small.
+COMPOSITE_ROWS: int = 64
+
+
+def composite_array(
+    foreground,
+    alpha,
+    fill_color: tuple[int, int, int] | None = (255, 255, 255),
+    premultiplied: bool = False,
+    out=None,
+):
+    """
+    Blends a foreground (a (height, width, 3) uint8 array) over a "fill_color" background using an
+    alpha (a (height, width) uint8 array), in a single vectorized pass (the numpy baseline which
+    bench_composite compares project.composite with). If "premultiplied" is True, the foreground is
+    expected to already be multiplied by the alpha.
+    If "fill_color" is None, the foreground and alpha are stacked into a (straight alpha) RGBA array
+    instead.
+    The output is written to "out" (which is allocated only if it's None) and returned. Rows are
+    blended in small bands, so the temporary buffers don't grow with the image.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    height, width = alpha.shape
+    channels: int = 3 if fill_color is not None else 4
+    if out is None:
+        out = np.empty((height, width, channels), dtype=np.uint8)
+    if out.shape != (height, width, channels) or out.dtype != np.uint8:
+        raise ValueError(
+            f"Expected out to be a {(height, width, channels)} uint8 array."
+        )
+
+    fill = None if fill_color is None else np.array(fill_color, dtype=np.uint16)
+    for top in range(0, height, COMPOSITE_ROWS):
+        rows = slice(top, top + COMPOSITE_ROWS)
+        band_alpha = alpha[rows, :, None].astype(np.uint16)
+
+        if fill_color is None:
+            out[rows, :, 3:] = alpha[rows, :, None]
+            if not premultiplied:
+                out[rows, :, :3] = foreground[rows]
+                continue
+            # Un-premultiplying: foreground * 255 / alpha (rounded).
+            band = foreground[rows].astype(np.uint32) * 255 + band_alpha // 2
+            band //= np.maximum(band_alpha, 1)
+            np.minimum(band, 255, out=band)
+            out[rows, :, :3] = band
+            continue
+
+        # Straight: foreground * alpha + fill * (255 - alpha), premultiplied: foreground * 255 +
+        # fill * (255 - alpha). Both are divided by 255 at the end (the max is 255 * 255, so it
+        # fits in 16 bits).
+        inverse_alpha = 255 - band_alpha
+        band = foreground[rows].astype(np.uint16)
+        if premultiplied:
+            # A premultiplied foreground can't be bigger than its alpha (it would overflow).
+            np.minimum(band, band_alpha, out=band)
+        band *= 255 if premultiplied else band_alpha
+        band += fill * inverse_alpha
+        # Rounded division by 255 (exact for these values): (x + 128 + (x + 128) / 256) / 256.
+        band += 128
+        band += band >> 8
+        band >>= 8
+        out[rows] = band
+    return out
+
+
+def bench_composite(megapixels: list[float]) -> dict[float, dict[str, float]]:
+    """
+    Compares (in seconds) the original PIL compositing chain (convert/split/paste/convert) with
+    PIL's composite, the current in place paste (project.composite), the vectorized numpy one
+    (composite_array) and the tiled one (project.composite_tiled, which also upsamples the
+    mask).
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+    from PIL import Image  # type: ignore[import]
+
+    import project  # type: ignore[import]
+
+    results: dict[float, dict[str, float]] = {}
+    for size in megapixels:
+        img, mask = synthetic_image(size)
+        alpha = mask.resize(img.size, Image.LANCZOS)
+        cutout = img.copy()
+        cutout.putalpha(alpha)
+        timings: dict[str, float] = {}
+
+        with project.timed(timings, "pil chain"):
+            pil_img = cutout.convert("RGBA")
+            background = Image.new("RGB", pil_img.size, (255, 255, 255))
+            background.paste(pil_img, pil_img.split()[-1])
+            background.convert("RGB")
+        with project.timed(timings, "pil composite"):
+            Image.composite(img, Image.new("RGB", img.size, (255, 255, 255)), alpha)
+        with project.timed(timings, "pil paste (in place)"):
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, (0, 0), alpha)
+
+        foreground, alpha_array = np.asarray(img), np.asarray(alpha)
+        out = np.empty_like(foreground)
+        with project.timed(timings, "numpy"):
+            composite_array(foreground, alpha_array, out=out)
+        with project.timed(timings, "numpy (premultiplied)"):
+            composite_array(foreground, alpha_array, premultiplied=True, out=out)
+        with project.timed(timings, "tiled"):
+            project.composite_tiled(img, mask)
+        with project.timed(timings, "tiled (refined)"):
+            project.composite_tiled(img, mask, refine=True)
+
+        results[size] = timings
+    return results
+
+
+def bench_matting(megapixels: list[float]) -> dict[float, dict[str, float]]:
+    """
+    Compares (in seconds) rembg's alpha matting of the whole image ("full") with the one solved
+    only around the mask's edges ("band"), and how different (mean absolute difference, from 0
+    to 255) their alphas are. This needs rembg, but not the model.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    import project  # type: ignore[import]
+
+    results: dict[float, dict[str, float]] = {}
+    for size in megapixels:
+        img, mask = synthetic_image(size)
+        timings: dict[str, float] = {}
+        alphas = {}
+        for mode in project.ALPHA_MATTING_MODES:
+            with project.timed(timings, mode):
+                _, alphas[mode] = project.model_session.cutout(img, mask, mode)
+        timings["difference"] = float(
+            np.abs(
+                np.asarray(alphas["band"], dtype=float)
+                - np.asarray(alphas["full"], dtype=float)
+            ).mean()
+        )
+        results[size] = timings
+    return results
+
+
+def bench_stages(image_paths: list[str], alpha_matting: bool) -> dict[str, float]:
+    """
+    Runs rm_bg over real images and returns the average seconds spent in each stage.
+    """
+    # pylint: disable=import-outside-toplevel
+    import project  # type: ignore[import]
+
+    project.model_session.warm_up()
+    timings: dict[str, float] = {}
+    for image_path in image_paths:
+        project.rm_bg(image_path, alpha_matting, timings=timings)
+    return {stage: sec / len(image_paths) for stage, sec in timings.items()}
+
+
+def bench_inference(
+    batch_sizes: list[int],
+    images_amount: int = 32,
+    image_size: tuple[int, int] = (640, 480),
+) -> dict[int, float]:
+    """
+    Measures how many images per second ModelSession.predict_masks handles for each batch size.
+    Synthetic (random) images are used, as only the speed matters here.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+    from PIL import Image  # type: ignore[import]
+
+    import project  # type: ignore[import]
+
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(
+            rng.integers(0, 256, (image_size[1], image_size[0], 3), dtype=np.uint8)
+        )
+        for _ in range(images_amount)
+    ]
+
+    # Loading time shouldn't be part of the results.
+    project.model_session.warm_up()
+
+    images_per_second: dict[int, float] = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for pos in range(0, images_amount, batch_size):
+            project.model_session.predict_masks(images[pos : pos + batch_size])
+        images_per_second[batch_size] = images_amount / (time.perf_counter() - start)
+    return images_per_second
+
+
+# Sizes (in megapixels) and formats of the synthetic images the suite is run on.
+SUITE_MEGAPIXELS: tuple[float, ...] = (1, 12, 24, 48)
+SUITE_FORMATS: tuple[str, ...] = ("jpg", "png")
+# Size modes of load_img: original size, a box (the GUI's preview) and a scale.
+LOAD_IMG_SIZES: tuple = (None, (320, 240), 0.25)
+
+
+def write_corpus(
+    directory: str,
+    megapixels: list[float],
+    formats: tuple[str, ...] = SUITE_FORMATS,
+) -> dict[str, str]:
+    """
+    Saves a synthetic image (see synthetic_image, always with the same seed) of each size in each
+    format into "directory", unless it's already there. Returns their paths, keyed by
+    "format/sizeMP" (e.g. "jpg/12MP").
+    """
+    corpus: dict[str, str] = {}
+    for size in megapixels:
+        img = None
+        for file_type in formats:
+            image_path: str = os.path.join(
+                directory, f"synthetic_{size:g}MP.{file_type}"
+            )
+            if not os.path.exists(image_path):
+                if img is None:
+                    img, _ = synthetic_image(size)
+                # Random pixels don't compress anyway, so PNGs are saved as fast as possible.
+                img.save(
+                    image_path,
+                    **(
+                        {"quality": 90} if file_type == "jpg" else {"compress_level": 1}
+                    ),
+                )
+            corpus[f"{file_type}/{size:g}MP"] = image_path
+    return corpus
+
+
+@contextlib.contextmanager
+def model_or_stub(stub: bool | None = None) -> Iterator[bool]:
+    """
+    While inside this context, project.model_session is replaced by a stub if "stub" is True or,
+    by default, if the model (or rembg) isn't installed. The stub skips loading the model and
+    always predicts the same (synthetic) mask, so everything but the inference is measured offline.
+    Yields whether the model is stubbed.
+    """
+    # pylint: disable=import-outside-toplevel
+    import project  # type: ignore[import]
+
+    if stub is None:
+        stub = not project.model_exists() or importlib.util.find_spec("rembg") is None
+    if not stub:
+        yield False
+        return
+
+    _, mask = synthetic_image(0.01)
+    session = project.ModelSession()
+    session.model, session.is_warm = "stub", True
+    session.predict_mask = lambda _img: mask  # type: ignore[method-assign]
+    session.predict_masks = (  # type: ignore[method-assign]
+        lambda images: [mask] * len(images)
+    )
+    model_session = project.model_session
+    project.model_session = session
+    try:
+        yield True
+    finally:
+        project.model_session = model_session
+
+
+def bench_rm_bg(
+    corpus: dict[str, str], alpha_matting: bool | str = "band", repeats: int = 3
+) -> dict[str, float]:
+    """
+    Runs rm_bg (without the results cache) "repeats" times on each image of the corpus. Returns
+    the median seconds of the whole call ("rm_bg/jpg/12MP/total") and of each of its stages
+    ("rm_bg/jpg/12MP/decode", ...).
+    """
+    # pylint: disable=import-outside-toplevel
+    import project  # type: ignore[import]
+
+    project.model_session.warm_up()
+    results: dict[str, float] = {}
+    for name, image_path in corpus.items():
+        runs: list[dict[str, float]] = []
+        for _ in range(repeats):
+            timings: dict[str, float] = {}
+            with project.timed(timings, "total"):
+                project.rm_bg(image_path, alpha_matting, timings=timings)
+            runs.append(timings)
+        for stage in runs[0]:
+            results[f"rm_bg/{name}/{stage}"] = statistics.median(
+                timings[stage] for timings in runs
+            )
+    return results
+
+
+def bench_load_img(corpus: dict[str, str], repeats: int = 3) -> dict[str, float]:
+    """
+    Times load_img on each image of the corpus at each size mode (LOAD_IMG_SIZES), as the median
+    seconds of a first (decoding) load ("load_img/jpg/12MP/0.25/cold") and of a load from the
+    thumbnail cache (".../cached"). Without a display (PhotoImages need Tk), only the decoding and
+    resizing load_img does through the thumbnail cache is timed.
+    """
+    # pylint: disable=import-outside-toplevel
+    import project  # type: ignore[import]
+
+    try:
+        import tkinter
+
+        root = tkinter.Tk()
+        root.withdraw()
+        load_img = project.load_img
+    except Exception:  # pylint: disable=broad-except
+        root, load_img = None, project.thumbnail_cache.get
+
+    results: dict[str, float] = {}
+    try:
+        for name, image_path in corpus.items():
+            for size in LOAD_IMG_SIZES:
+                mode: str = (
+                    "x".join(map(str, size)) if isinstance(size, tuple) else str(size)
+                )
+                for state in ("cold", "cached"):
+                    seconds: list[float] = []
+                    for _ in range(repeats):
+                        if state == "cold":
+                            project.thumbnail_cache.clear()
+                        start: float = time.perf_counter()
+                        load_img(image_path, size)
+                        seconds.append(time.perf_counter() - start)
+                    results[f"load_img/{name}/{mode}/{state}"] = statistics.median(
+                        seconds
+                    )
+    finally:
+        project.thumbnail_cache.clear()
+        if root is not None:
+            root.destroy()
+    return results
+
+
+def bench_paths(amount: int = 1_000_000) -> dict[str, float]:
+    """
+    Times (in seconds) check_image_type and process_img_path over "amount" image paths (with
+    folders, mixed case extensions and Windows separators).
+    """
+    # pylint: disable=import-outside-toplevel
+    import project  # type: ignore[import]
+
+    extensions: tuple[str, ...] = ("jpg", "JPEG", "png", "Jpg")
+    image_paths: list[str] = [
+        (
+            f"C:\\Users\\me\\session{index % 97}\\photo.{index}.{extensions[index % 4]}"
+            if index % 2
+            else f"/home/me/session{index % 97}/photo.{index}.{extensions[index % 4]}"
+        )
+        for index in range(amount)
+    ]
+
+    results: dict[str, float] = {}
+    for function in (project.check_image_type, project.process_img_path):
+        start: float = time.perf_counter()
+        for image_path in image_paths:
+            function(image_path)
+        results[f"paths/{function.__name__}"] = time.perf_counter() - start
+    return results
+
+
+def run_suite(
+    megapixels: Sequence[float] = SUITE_MEGAPIXELS,
+    repeats: int = 3,
+    paths_amount: int = 1_000_000,
+    alpha_matting: bool | str = "band",
+    corpus_dir: str | None = None,
+    stub: bool | None = None,
+) -> dict:
+    """
+    Runs the whole suite (rm_bg, load_img and the path helpers) on a synthetic corpus, saved in
+    "corpus_dir" (a temporary folder by default, which is removed afterwards). Returns a JSON
+    serializable dict with the environment the suite ran in and "results": seconds (lower is
+    better) keyed by benchmark (see bench_rm_bg, bench_load_img and bench_paths).
+    Without rembg, alpha matting silently falls back to the predicted mask, so its stage isn't
+    measured: it's left out of "results" and listed in the environment's "skipped" instead.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+    import PIL  # type: ignore[import]
+
+    with contextlib.ExitStack() as stack:
+        if corpus_dir is None:
+            corpus_dir = stack.enter_context(tempfile.TemporaryDirectory())
+        corpus: dict[str, str] = write_corpus(corpus_dir, list(megapixels))
+        stubbed: bool = stack.enter_context(model_or_stub(stub))
+
+        results: dict[str, float] = {}
+        results.update(bench_rm_bg(corpus, alpha_matting, repeats))
+        results.update(bench_load_img(corpus, repeats))
+        results.update(bench_paths(paths_amount))
+
+    skipped: dict[str, str] = {}
+    if alpha_matting and importlib.util.find_spec("rembg") is None:
+        skipped["matting"] = "rembg isn't installed"
+        results = {
+            name: seconds
+            for name, seconds in results.items()
+            if not name.endswith("/matting")
+        }
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "pillow": PIL.__version__,
+            "numpy": np.__version__,
+            "model": "stub" if stubbed else "u2net_human_seg",
+            "alpha_matting": alpha_matting,
+            "repeats": repeats,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    threshold: float = 0.1,
+    min_seconds: float = 0.001,
+) -> list[tuple[str, float, float]]:
+    """
+    Compares the results of two runs of the suite (see run_suite). Returns the regressions, as
+    (benchmark, baseline seconds, current seconds), sorted from the worst: benchmarks which got
+    more than "threshold" (10% by default) slower, ignoring differences smaller than "min_seconds"
+    (which are just noise). Benchmarks missing from either run are ignored.
+    """
+    if not isinstance(threshold, (float, int)) or threshold < 0:
+        raise ValueError("Expected threshold to be a non negative number.")
+
+    regressions: list[tuple[str, float, float]] = [
+        (name, before, after)
+        for name, before in baseline["results"].items()
+        if (after := current["results"].get(name)) is not None
+        and after > before * (1 + threshold)
+        and after - before >= min_seconds
+    ]
+    return sorted(
+        regressions, key=lambda item: item[2] / max(item[1], 1e-12), reverse=True
+    )
+
+
+def main() -> int:
+    """
+    Parses the command line arguments and runs the selected benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    inference_parser = subparsers.add_parser(
+        "inference", help="Images per second of batched U2Net inference on CPU."
+    )
+    inference_parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16]
+    )
+    inference_parser.add_argument("--images", type=int, default=32)
+
+    round_trip_parser = subparsers.add_parser(
+        "round-trip",
+        help="Old PNG round trip vs in memory compositing (doesn't need the model).",
+    )
+    round_trip_parser.add_argument(
+        "--megapixels", type=float, nargs="+", default=[1, 12, 24]
+    )
+
+    composite_parser = subparsers.add_parser(
+        "composite", help="PIL compositing chain vs vectorized numpy compositing."
+    )
+    composite_parser.add_argument(
+        "--megapixels", type=float, nargs="+", default=[1, 12, 48]
+    )
+
+    matting_parser = subparsers.add_parser(
+        "matting", help="Alpha matting of the whole image vs only around the edges."
+    )
+    matting_parser.add_argument(
+        "--megapixels", type=float, nargs="+", default=[0.5, 1, 4]
+    )
+
+    stages_parser = subparsers.add_parser(
+        "stages", help="Average seconds per stage of rm_bg over real images."
+    )
+    stages_parser.add_argument("image_paths", nargs="+")
+    stages_parser.add_argument(
+        "--alpha-matting",
+        nargs="?",
+        choices=("band", "full"),
+        const="band",
+        default=False,
+    )
+
+    suite_parser = subparsers.add_parser(
+        "suite",
+        help="rm_bg, load_img and path helpers on synthetic images, saved as JSON.",
+    )
+    suite_parser.add_argument(
+        "--megapixels", type=float, nargs="+", default=list(SUITE_MEGAPIXELS)
+    )
+    suite_parser.add_argument("--repeats", type=int, default=3)
+    suite_parser.add_argument("--paths", type=int, default=1_000_000)
+    suite_parser.add_argument(
+        "--alpha-matting",
+        choices=("band", "full", "off"),
+        default="band",
+    )
+    suite_parser.add_argument(
+        "--corpus-dir", help="Folder to keep the synthetic images in (reused)."
+    )
+    suite_parser.add_argument(
+        "--stub-model",
+        action="store_true",
+        default=None,
+        help="Stub the model even if it's installed (it's stubbed if it isn't).",
+    )
+    suite_parser.add_argument("--output", "-o", help="JSON file for the results.")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Flags regressions of a suite's results against a baseline."
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown (as a fraction) flagged as a regression.",
+    )
+
+    args = parser.parse_args()
+
+    if args.benchmark == "inference":
+        # Hiding GPUs from torch (this has to happen before it's imported).
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+        results = bench_inference(args.batch_sizes, args.images)
+        print(f"{'batch size':>10} | {'images/s':>8}")
+        for batch_size, images_per_second in results.items():
+            print(f"{batch_size:>10} | {images_per_second:>8.2f}")
+
+    if args.benchmark in ("round-trip", "composite", "matting"):
+        bench = {
+            "round-trip": bench_round_trip,
+            "composite": bench_composite,
+            "matting": bench_matting,
+        }[args.benchmark]
+        for size, timings in bench(args.megapixels).items():
+            print(f"{size} MP:")
+            for stage, seconds in timings.items():
+                print(f"    {stage:>20} | {seconds:>8.4f}s")
+
+    if args.benchmark == "stages":
+        for stage, seconds in bench_stages(
+            args.image_paths, args.alpha_matting
+        ).items():
+            print(f"{stage:>10} | {seconds:>8.4f}s")
+
+    if args.benchmark == "suite":
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
+        results = run_suite(
+            args.megapixels,
+            args.repeats,
+            args.paths,
+            False if args.alpha_matting == "off" else args.alpha_matting,
+            args.corpus_dir,
+            args.stub_model,
+        )
+        for name, seconds in results["results"].items():
+            print(f"{name:>40} | {seconds:>8.4f}s")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+
+    if args.benchmark == "compare":
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline: dict = json.load(file)
+        with open(args.current, encoding="utf-8") as file:
+            current: dict = json.load(file)
+        if baseline["environment"] != current["environment"]:
+            print(
+                "Warning: the runs were made in different environments.",
+                file=sys.stderr,
+            )
+        regressions = compare(baseline, current, args.threshold)
+        for name, before, after in regressions:
+            print(
+                f"{name:>40} | {before:>8.4f}s -> {after:>8.4f}s ({after / before:.2f}x)"
+            )
+        print(f"{len(regressions)} regression(s) found.")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
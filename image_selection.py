@@ -0,0 +1,80 @@
+"""
+This module implements the ordered set of images selected (to be processed) in the GUI.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Iterable, Iterator, Sequence
+
+
+class ImageSelection(Sequence[str]):
+    """
+    Ordered set of image paths, indexed by an ordered dict keyed by their full (absolute and, on
+    Windows, case normalized) path, so images with the same name in different folders are different
+    entries while the same file can't be selected twice. Adding, removing and checking a path are
+    O(1) and clearing is O(1) per path.
+    Views read it by position (e.g. only their visible window): positions come from a list which is
+    kept up to date while paths are only added, and is rebuilt (once) on the first read after a
+    removal.
+    """
+
+    def __init__(self, image_paths: Iterable[str] = ()):
+        self._paths: OrderedDict[str, str] = OrderedDict()
+        self._order: list[str] | None = []
+        self.extend(image_paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths.values())
+
+    def __contains__(self, image_path: object) -> bool:
+        return isinstance(image_path, str) and path_key(image_path) in self._paths
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if self._order is None:
+            self._order = list(self._paths.values())
+        return self._order[index]
+
+    def add(self, image_path: str) -> bool:
+        """
+        Adds "image_path" to the end of the selection. Returns False (and keeps its position) if it
+        was already selected.
+        """
+        key: str = path_key(image_path)
+        if key in self._paths:
+            return False
+        self._paths[key] = image_path
+        if self._order is not None:
+            self._order.append(image_path)
+        return True
+
+    def extend(self, image_paths: Iterable[str]) -> list[str]:
+        """
+        Adds many paths, in order, and returns the ones which were already selected.
+        """
+        return [image_path for image_path in image_paths if not self.add(image_path)]
+
+    def discard(self, image_path: str) -> bool:
+        """
+        Removes "image_path" from the selection. Returns False if it wasn't selected.
+        """
+        if self._paths.pop(path_key(image_path), None) is None:
+            return False
+        self._order = None
+        return True
+
+    def clear(self) -> None:
+        """
+        Removes every path from the selection.
+        """
+        self._paths.clear()
+        self._order = []
+
+
+def path_key(image_path: str) -> str:
+    """
+    Key of an image path: two paths have the same key if they point to the same file.
+    """
+    return os.path.normcase(os.path.abspath(image_path))
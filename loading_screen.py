@@ -3,40 +3,50 @@ This module implements the loading screen class.
 """
 
 from tkinter import Tk, Label  # Toplevel
-from typing import Callable, Union
+from typing import Callable, Iterable, Union
 from PIL import ImageTk  # type: ignore[import]
 
+from readiness import Readiness  # type: ignore[import]
+
 
 class LoadingScreen(Tk):
     """
-    This top level will create a loading screen and display it for a given amount of seconds.
-    It can accept a list of threads to wait for before closing itself and showing the main screen.
+    This top level will create a loading screen and display it until the "required" stages of
+    "readiness" (defaults to all of them) are finished, showing which stage is running. It polls
+    the stages without ever blocking the Tk loop and closes itself (so the main screen can be
+    shown) as soon as they are finished.
     """
 
+    # Milliseconds between each time the stages are checked.
+    poll_interval: int = 50
+
     def __init__(
         self,
         # parent: Tk,
         *,
-        seconds: float = 0.5,
         load_img: Callable[[str, Union[tuple[int, int], float]], ImageTk.PhotoImage],
-        wait_for: list | None = None,
+        readiness: Readiness,
+        required: Iterable[str] | None = None,
     ):
         super().__init__()
         # self.parent = parent
-        self.seconds: float = seconds
         self.photo_image: ImageTk.PhotoImage = load_img("./images/cs50p.png", 0.6)
 
-        if wait_for is None:
-            wait_for = []
-        self.wait_for: list = wait_for
+        self.readiness: Readiness = readiness
+        self.required: tuple[str, ...] = tuple(
+            readiness.stages if required is None else required
+        )
 
         self._draw_window()
-        self._wait()
+        # Checked from the Tk loop, so the screen is destroyed by it (even if it's already ready).
+        self.after(0, self._wait)
 
     def _draw_window(self) -> None:
 
         label = Label(self, image=self.photo_image, bg="#010101")
         label.place(x=0, y=0)
+        self.stage_label = Label(self, text="", fg="white", bg="#010101")
+        self.stage_label.place(relx=0.5, rely=1, anchor="s")
 
         self.withdraw()
         self.geometry(f"{self.photo_image.width()}x{self.photo_image.height()}")
@@ -61,40 +71,45 @@ class LoadingScreen(Tk):
         self.deiconify()
 
     def _wait(self) -> None:
-        # self.parent._load_window()
-        # self.parent.withdraw()
-        # self.parent.update()
-        # self.parent.withdraw()
-        self.lift()
-
-        miliseconds = int(self.seconds * 1000)
-        for thread in self.wait_for:
-            self.after(miliseconds + 50, thread.join)
-
-        # self.after(miliseconds + 100, self.parent.deiconify)
-        # self.after(miliseconds + 150, self.parent.lift)
-        self.after(miliseconds + 200, self.destroy)
+        """
+        Shows the running stage and closes the screen once the required stages are finished.
+        """
+        if self.readiness.is_ready(self.required):
+            self.destroy()
+            return
+
+        stages: tuple[str, ...] = self.readiness.stages
+        stage: str | None = self.readiness.current()
+        self.stage_label.configure(
+            text=(
+                f"{stage}... ({stages.index(stage) + 1}/{len(stages)})"
+                if stage is not None
+                else ""
+            )
+        )
+        self.after(self.poll_interval, self._wait)
 
 
 def main() -> int:
     """
-    This function exists for easily testing this module "directly". This will only shows the loading
-    screen and then a blank screen (this won't load main screen).
+    This function exists for easily testing this module "directly". This will only show the loading
+    screen for a few fake stages and then a blank screen (this won't load main screen).
     """
     # pylint: disable=import-error, import-outside-toplevel, cyclic-import
-    # root = Tk()
+    import threading
+    import time
+
     from project import load_img
 
-    root = LoadingScreen(seconds=2, load_img=load_img)
-    # root.after(4000, root.destroy)
-    print("hi")
-    root.mainloop()
-    print("hello")
+    readiness = Readiness(["Importing things", "Loading things", "Warming things up"])
 
-    # root = Tk()
+    def load() -> None:
+        for stage in readiness.stages:
+            with readiness.stage(stage):
+                time.sleep(1)
 
-    root = LoadingScreen(seconds=2, load_img=load_img)
-    # root.after(4000, root.destroy)
+    threading.Thread(target=load, daemon=True).start()
+    root = LoadingScreen(load_img=load_img, readiness=readiness)
     print("hi")
     root.mainloop()
     print("hello")
@@ -2,13 +2,19 @@
 This module implements the app's main window class.
 """
 
+import queue
 import threading
-import tkinter as tk
+import time
 from tkinter import filedialog, messagebox
 from typing import Callable
 
 import customtkinter  # type: ignore[import]
 
+from image_selection import ImageSelection  # type: ignore[import]
+from preview_grid import PreviewGrid  # type: ignore[import]
+from readiness import Readiness  # type: ignore[import]
+from stage_recorder import AggregateRecorder, NullRecorder  # type: ignore[import]
+
 # Modes: system (default), light, dark
 customtkinter.set_appearance_mode("dark")
 
@@ -21,19 +27,41 @@ class MainWindow(customtkinter.CTk):
     All the app's main functionality should be acessible through this window.
     """
 
+    # Milliseconds between each time the events queue is drained (a few UI updates per second,
+    # however fast images are done).
+    poll_interval: int = 250
+
     def __init__(
         self,
         *,
         functions: dict[str, Callable],
+        readiness: Readiness | None = None,
     ):
         super().__init__()
 
         self.functions: dict[str, Callable] = functions
+        # Stages still loading in the background (rembg, the model), shown until they're done.
+        self.readiness: Readiness | None = readiness
         self.widgets: dict = {}
 
-        self.selected_images: list[str] = []
+        # Ordered and indexed by full path (adding/removing an image is O(1)).
+        self.selected_images: ImageSelection = ImageSelection()
+
+        # Workers push "done"/"finished" events here and the Tk loop drains it (see _poll_events).
+        self.events: queue.Queue = queue.Queue()
+        self.progress: dict = {}
+        # Whether the model was verified (in the background) for the next batch (see _verify_model).
+        self.model_verified: bool = False
+
+        # Set to stop warming up the model (see _start_warm_up) and downloading it.
+        self.warm_up_cancel = threading.Event()
+        self.download_cancel = threading.Event()
 
         self._load_app()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after_idle(self._start_warm_up)
+        if self.readiness is not None:
+            self.after(0, self._poll_readiness)
 
     def _load_app(self):
         """
@@ -66,6 +94,7 @@ class MainWindow(customtkinter.CTk):
         self.grid_rowconfigure(4, weight=1)
         self.grid_rowconfigure(5, weight=1)
         self.grid_rowconfigure(6, weight=2, minsize=30)
+        self.grid_rowconfigure(7, minsize=20)
 
         # self.grid_columnconfigure(0, uniform=10)
         self.grid_columnconfigure(0, weight=1, minsize=10)
@@ -92,17 +121,14 @@ class MainWindow(customtkinter.CTk):
             sticky="w",
         )
 
-        self.widgets["lbx_image_paths"] = tk.Listbox(
+        # Thumbnails are decoded in the background, only for the visible rows.
+        self.widgets["grd_previews"] = PreviewGrid(
             self,
-            width=40,
+            image_paths=self.selected_images,
+            load_thumbnail=self.functions["load_thumbnail"],
             bg="#4a4e69",
-            highlightthickness=0,
-            relief="flat",
-            bd=3,
-            # selectmode=tk.MULTIPLE,
         )
-        self.widgets["lbx_image_paths"].insert(0, "Empty")
-        self.widgets["lbx_image_paths"].grid(
+        self.widgets["grd_previews"].grid(
             row=2,
             column=1,
             columnspan=2,
@@ -173,6 +199,30 @@ class MainWindow(customtkinter.CTk):
             sticky="NEWS",
         )
 
+        self.widgets["pgb_progress"] = customtkinter.CTkProgressBar(self)
+        self.widgets["pgb_progress"].set(0)
+        self.widgets["pgb_progress"].grid(
+            row=6,
+            column=1,
+            columnspan=4,
+            pady=(10, 0),
+            padx=(20, 15),
+            sticky="EW",
+        )
+        self.widgets["lbl_progress"] = customtkinter.CTkLabel(
+            self,
+            text="",
+            anchor="w",
+        )
+        self.widgets["lbl_progress"].grid(
+            row=7,
+            column=1,
+            columnspan=4,
+            pady=(0, 5),
+            padx=(20, 15),
+            sticky="EW",
+        )
+
         with open("./help.txt", encoding="utf-8") as file:
             message = file.read()
 
@@ -218,8 +268,17 @@ class MainWindow(customtkinter.CTk):
     def apply_button_press(
         self,
         # model_name: str = "u2net_human_seg.pth",
-        alpha_matting: bool = False,
+        alpha_matting: bool | str = "band",
         file_id_to_dowload_model_from: str = "1-Yg0cxgrNhHP-016FPdp902BR-kSsA4P",
+        workers: int | None = None,
+        max_in_flight: int | None = None,
+        backend: str = "thread",
+        batch_size: int = 1,
+        use_cache: bool = True,
+        record_stages: bool = True,
+        record_memory: bool = False,
+        memory_fraction: float | None = 0.5,
+        order: str = "longest",
     ) -> None:
         """
         Implementation of the background removing button.
@@ -228,6 +287,23 @@ class MainWindow(customtkinter.CTk):
         - These images should all be JPGs.
         - If no image is selected the function should return. If any amount of images
         are selected, they should have their background removed.
+        - Images are processed by a pool of "workers" (defaults to the CPU count) and at most
+        "max_in_flight" of them are queued at once (defaults to twice the workers). The "backend"
+        can be "thread" or "process" (processes aren't limited by the GIL). Each worker predicts
+        the masks of "batch_size" images with a single forward pass through the model.
+        - If "use_cache" is True, images which were already processed are taken from the results
+        cache instead of being processed again.
+        - Edges are refined by alpha matting only around the predicted mask ("band"), which is
+        fast enough to be left on. It can also be "full" (much slower) or False.
+        - If "record_stages" is True (and the backend is "thread"), the time and memory of each
+        stage of each image are recorded, and their percentiles are shown when the batch is done.
+        Their peak memory is only traced if "record_memory" is True and there's a single worker, as
+        tracemalloc slows every allocation down and its peak is shared by all the threads.
+        - Images are only processed at the same time while their estimated memory fits in
+        "memory_fraction" of the computer's memory (None for no limit), so big images run with
+        fewer others instead of running out of memory.
+        - Images are processed biggest first ("longest") or in the order they were added ("fifo"),
+        and how much time the biggest first order saved is shown when the batch is done.
         """
         if not self.selected_images:
             messagebox.showinfo(
@@ -237,6 +313,38 @@ class MainWindow(customtkinter.CTk):
             )
             return
 
+        if self.progress.get("running"):
+            messagebox.showinfo(
+                title="Wait...",
+                message=(
+                    "The model is still being downloaded. Wait for it to finish."
+                    if self.progress.get("downloading")
+                    else (
+                        "The model is still being verified. Wait for it to finish."
+                        if self.progress.get("verifying")
+                        else "Images are still being processed. Wait for them to finish."
+                    )
+                ),
+                parent=self,
+            )
+            return
+
+        def apply_again() -> None:
+            # Applying again (with the same settings) once the model is downloaded.
+            self.apply_button_press(
+                alpha_matting,
+                file_id_to_dowload_model_from,
+                workers,
+                max_in_flight,
+                backend,
+                batch_size,
+                use_cache,
+                record_stages,
+                record_memory,
+                memory_fraction,
+                order,
+            )
+
         if not self.functions["model_exists"]():
             should_download = messagebox.askyesno(
                 title="Model is not present in the expected folder.",
@@ -245,43 +353,324 @@ class MainWindow(customtkinter.CTk):
                 parent=self,
             )
             if should_download:
+                self._download_model(
+                    file_id_to_dowload_model_from, on_success=apply_again
+                )
+            return
+
+        # Checked before starting any worker, in the background (the first time, the whole model
+        # is hashed), applying again once it's verified.
+        if not self.model_verified:
+            self._verify_model(file_id_to_dowload_model_from, on_verified=apply_again)
+            return
+        self.model_verified = False
+
+        # Copying it, so the list can be changed while the images are processed.
+        image_paths: list[str] = list(self.selected_images)
+        recorder: NullRecorder = (
+            AggregateRecorder(memory=record_memory and workers == 1)
+            if record_stages and backend == "thread"
+            else NullRecorder()
+        )
+        self.progress = {
+            "running": True,
+            "total": len(image_paths),
+            "done": 0,
+            "failures": [],
+            "start": time.perf_counter(),
+            "recorder": recorder,
+            "makespans": {},
+        }
+        self._update_progress()
+
+        def process_images() -> None:
+            # model_name: str = "u2net_human_seg",
+            # Only "workers" images are processed at once, however many were selected.
+            try:
+                self.functions["rm_bg_batch"](
+                    image_paths,
+                    # model_name,
+                    alpha_matting,
+                    backend=backend,
+                    workers=workers,
+                    max_in_flight=max_in_flight,
+                    batch_size=batch_size,
+                    on_done=lambda img_path, error: self.events.put(
+                        ("done", img_path, error)
+                    ),
+                    cache=self.functions["result_cache"]() if use_cache else None,
+                    recorder=recorder,
+                    memory_budget=(
+                        self.functions["default_memory_budget"](memory_fraction)
+                        if memory_fraction
+                        else None
+                    ),
+                    order=order,
+                    makespans=self.progress["makespans"],
+                )
+            except Exception as error:  # pylint: disable=broad-except
+                # E.g. the model couldn't be loaded, so no image could be processed.
+                self.events.put(("error", "All images", error))
+            finally:
+                recorder.close()
+                self.events.put(("finished", None, None))
+
+        # Processing never blocks the Tk loop: it only polls the events queue.
+        threading.Thread(target=process_images, daemon=True).start()
+        self.after(self.poll_interval, self._poll_events)
+
+    def _verify_model(
+        self, file_id_to_dowload_model_from: str, on_verified: Callable[[], None]
+    ) -> None:
+        """
+        Verifies the model in a background thread (the window stays responsive), then calls
+        "on_verified" if it's verified or offers to download it again if it isn't.
+        """
+        self.progress = {"running": True, "verifying": True}
+        results: queue.Queue = queue.Queue()
+
+        def verify() -> None:
+            try:
+                results.put(self.functions["verify_model"]())
+            except Exception as error:  # pylint: disable=broad-except
+                results.put((False, f"The model couldn't be verified: {error}."))
+
+        threading.Thread(target=verify, daemon=True).start()
+        self.widgets["lbl_progress"].configure(text="Verifying the model...")
+        self.after(
+            self.poll_interval,
+            self._poll_verification,
+            results,
+            file_id_to_dowload_model_from,
+            on_verified,
+        )
+
+    def _poll_verification(
+        self,
+        results: queue.Queue,
+        file_id_to_dowload_model_from: str,
+        on_verified: Callable[[], None],
+    ) -> None:
+        """
+        Waits for the model's verification (see _verify_model) and acts on its result.
+        """
+        try:
+            verified, message = results.get_nowait()
+        except queue.Empty:
+            self.after(
+                self.poll_interval,
+                self._poll_verification,
+                results,
+                file_id_to_dowload_model_from,
+                on_verified,
+            )
+            return
+
+        self.progress = {}
+        self.widgets["lbl_progress"].configure(text="")
+        if verified:
+            self.model_verified = True
+            on_verified()
+            return
+
+        should_download = messagebox.askyesno(
+            title="Model couldn't be verified.",
+            message=f"{message} Should it be downloaded again?",
+            parent=self,
+        )
+        if should_download:
+            self._download_model(file_id_to_dowload_model_from, on_success=on_verified)
+
+    def _download_model(
+        self, file_id_to_dowload_model_from: str, on_success: Callable[[], None]
+    ) -> None:
+        """
+        Downloads the model in a background thread, showing its progress in the progress bar (the
+        window stays responsive), then calls "on_success" (if it didn't fail).
+        """
+        self.progress = {"running": True, "downloading": True}
+        downloads: queue.Queue = queue.Queue()
+
+        def download() -> None:
+            try:
                 self.functions["download_model"](
-                    # model_name=model_name,
                     file_id_to_dowload_model_from=file_id_to_dowload_model_from,
-                    parent_window=self,
-                )
-            else:
-                return
-
-        # model_name: str = "u2net_human_seg",
-        threads: list = []
-        for pos, image_path in enumerate(self.selected_images):
-            threads.append(
-                threading.Thread(
-                    target=self.functions["rm_bg"],
-                    args=(
-                        image_path,
-                        # model_name,
-                        alpha_matting,
+                    on_progress=lambda downloaded, total: downloads.put(
+                        ("progress", downloaded, total)
                     ),
+                    cancel=self.download_cancel,
                 )
+            except Exception as error:  # pylint: disable=broad-except
+                downloads.put(("finished", error, None))
+            else:
+                downloads.put(("finished", None, None))
+
+        threading.Thread(target=download, daemon=True).start()
+        self.widgets["lbl_progress"].configure(text="Downloading the model...")
+        self.after(self.poll_interval, self._poll_download, downloads, on_success)
+
+    def _poll_download(
+        self, downloads: queue.Queue, on_success: Callable[[], None]
+    ) -> None:
+        """
+        Shows the latest progress of the model's download and tells the user when it's done.
+        """
+        progress: tuple | None = None
+        finished: tuple | None = None
+        while True:
+            try:
+                event = downloads.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                progress = event
+            else:
+                finished = event
+
+        if progress is not None:
+            _, downloaded, total = progress
+            text: str = f"Downloading the model: {downloaded / 1024**2:.1f}"
+            if total:
+                self.widgets["pgb_progress"].set(downloaded / total)
+                text += f"/{total / 1024**2:.1f}"
+            self.widgets["lbl_progress"].configure(text=text + "MB")
+
+        if finished is None:
+            self.after(self.poll_interval, self._poll_download, downloads, on_success)
+            return
+
+        self.progress = {}
+        error: BaseException | None = finished[1]
+        if error is not None:
+            self.widgets["lbl_progress"].configure(text="")
+            messagebox.showerror(
+                title="Download failed.",
+                message=f"The model couldn't be downloaded: {error}\n"
+                + "Press Apply to try again (it continues from where it stopped).",
+                parent=self,
             )
-            threads[pos].start()
+            return
 
         messagebox.showinfo(
-            title="Wait...",
-            message=(
-                "This can take a while, specially if you select many. "
-                + "Please press OK and wait all images to be processed."
-            ),
+            title="Done.",
+            message="Download finished successfully!",
             parent=self,
         )
-        for thread in threads:
-            thread.join()
+        on_success()
+
+    def _poll_events(self) -> None:
+        """
+        Drains the events pushed by the workers and updates the progress widgets once.
+        """
+        finished: bool = False
+        while True:
+            try:
+                event, img_path, error = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "finished":
+                finished = True
+                continue
+            if event == "done":
+                self.progress["done"] += 1
+            if error is not None:
+                self.progress["failures"].append((img_path, error))
+
+        self._update_progress()
+        if finished:
+            self.progress["running"] = False
+            self._show_results()
+        else:
+            self.after(self.poll_interval, self._poll_events)
+
+    def _start_warm_up(self) -> None:
+        """
+        Starts loading and warming up the model in the background as soon as the window opens, so
+        it's (probably) ready by the time the user is done picking images and presses "Apply".
+        It never blocks the Tk loop and can be cancelled (see cancel_warm_up).
+        """
+        threading.Thread(
+            target=self.functions["preloader"],
+            args=(self.readiness, self.warm_up_cancel),
+            daemon=True,
+        ).start()
+
+    def cancel_warm_up(self) -> None:
+        """
+        Stops warming up the model (the step already running, if any, finishes first). Processing
+        images still loads and warms it up itself.
+        """
+        self.warm_up_cancel.set()
+
+    def _on_close(self) -> None:
+        self.cancel_warm_up()
+        # An unfinished download continues from where it stopped the next time.
+        self.download_cancel.set()
+        self.destroy()
+
+    def _poll_readiness(self) -> None:
+        """
+        Shows which stage the background loading is at (while no images are being processed),
+        until every stage is finished.
+        """
+        stage: str | None = self.readiness.current()  # type: ignore[union-attr]
+        if not self.progress.get("running"):
+            self.widgets["lbl_progress"].configure(
+                text=f"{stage}..." if stage is not None else ""
+            )
+        if stage is not None:
+            self.after(self.poll_interval, self._poll_readiness)
+
+    def _update_progress(self) -> None:
+        """
+        Shows the amount of images done, images per second and ETA.
+        """
+        done: int = self.progress["done"]
+        total: int = self.progress["total"]
+        elapsed: float = time.perf_counter() - self.progress["start"]
+        images_per_second: float = done / elapsed if elapsed > 0 else 0.0
+
+        text: str = f"{done}/{total} images, {images_per_second:.2f} images/s"
+        if 0 < done < total:
+            eta: int = round((total - done) / images_per_second)
+            text += f", ETA: {eta // 60}m{eta % 60:02d}s"
+
+        self.widgets["pgb_progress"].set(done / total)
+        self.widgets["lbl_progress"].configure(text=text)
+
+    def _show_results(self) -> None:
+        """
+        Tells the user the batch is done (and which images failed, if any), with the percentiles of
+        the time each stage took (if they were recorded).
+        """
+        report: str = self.progress["recorder"].report()
+        if report:
+            report = "\n\nTime per image, by stage:\n" + report
+        makespans: dict[str, float] = self.progress["makespans"]
+        if "elapsed" in makespans:
+            report += f"\n\nDone in {makespans['elapsed']:.1f}s."
+            # Both orders are simulated from the same durations, so the difference can be negative.
+            saved: float = makespans["fifo"] - makespans["longest"]
+            if saved > 0:
+                report += (
+                    f" Processing the biggest images first saved about {saved:.1f}s"
+                    + f" ({saved / max(makespans['fifo'], 1e-9):.0%}) compared with the order"
+                    + " they were added in (simulated from the time each image took)."
+                )
+        failures: list = self.progress["failures"]
+        if failures:
+            messagebox.showerror(
+                title="Some images failed.",
+                message=f"{len(failures)} image(s) could not be processed:\n"
+                + "\n".join(f"{img_path}: {error}" for img_path, error in failures)
+                + report,
+                parent=self,
+            )
+            return
 
         messagebox.showinfo(
             title="Done!",
-            message="All background were successfully removed!",
+            message="All background were successfully removed!" + report,
             parent=self,
             # This specific icon removes the bell noise from the messagebox.
             # icon="question",
@@ -306,33 +695,21 @@ class MainWindow(customtkinter.CTk):
         if not selected_images:
             return
 
-        lbx_items = self.widgets["lbx_image_paths"].get(0, tk.END)
-        if lbx_items[0] == "Empty":
-            self.widgets["lbx_image_paths"].delete(0)
-
-        img_names_to_insert: list[str] = []
-        ignored_images: list[str] = []
-
-        for img_path in selected_images:
-            img_name = img_path.split("/")[-1]
-            if img_name in lbx_items:
-                ignored_images.append(img_name)
-            else:
-                img_names_to_insert.append(img_name)
-
-        # for image_path in selected_images:
-
-        self.selected_images.extend(selected_images)
-        self.widgets["lbx_image_paths"].insert(
-            tk.END,
-            *img_names_to_insert,
-        )
+        ignored_images: list[str] = self.selected_images.extend(selected_images)
+        # Only the visible window of the grid is redrawn, however many images were added.
+        self.widgets["grd_previews"].refresh()
 
         if ignored_images:
+            shown: int = 10
             messagebox.showinfo(
                 title="Images already selected.",
-                message="Some of the selected images were ignored, as they were already selected:"
-                + f"\n{ignored_images}",
+                message="Some of the selected images were ignored, as they were already selected:\n"
+                + "\n".join(ignored_images[:shown])
+                + (
+                    f"\n... and {len(ignored_images) - shown} more."
+                    if len(ignored_images) > shown
+                    else ""
+                ),
             )
 
     def _list_is_empty(self) -> bool:
@@ -346,37 +723,32 @@ class MainWindow(customtkinter.CTk):
 
     def remove_image_from_list_button_press(self):
         """
-        Gets the listbox's cursor selection and removes the selected path from it.
+        Removes the image selected (clicked) in the preview grid from the list.
         """
         if self._list_is_empty():
             return
 
-        selected = self.widgets["lbx_image_paths"].curselection()
-        if not selected:
+        selected_path = self.widgets["grd_previews"].selected_path
+        if selected_path not in self.selected_images:
             messagebox.showinfo(
                 title="No image selected",
                 message="Please select an image to remove from the list.",
             )
             return
 
-        selected_text = self.widgets["lbx_image_paths"].get(selected)
-        for img_path in self.selected_images:
-            if img_path.split("/")[-1] == selected_text:
-                self.selected_images.remove(img_path)
-                break
-        self.widgets["lbx_image_paths"].delete(selected)
-        if not self.widgets["lbx_image_paths"].get(0, tk.END):
-            self.widgets["lbx_image_paths"].insert(0, "Empty")
+        self.selected_images.discard(selected_path)
+        self.widgets["grd_previews"].selected_path = None
+        self.widgets["grd_previews"].refresh()
 
     def clear_listbox_button_press(self):
         """
-        Deletes everything in the listbox.
+        Deletes everything in the preview grid.
         """
         if self._list_is_empty():
             return
-        self.widgets["lbx_image_paths"].delete(0, tk.END)
-        self.widgets["lbx_image_paths"].insert(0, "Empty")
         self.selected_images.clear()
+        self.widgets["grd_previews"].selected_path = None
+        self.widgets["grd_previews"].refresh()
 
 
 def main() -> int:
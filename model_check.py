@@ -0,0 +1,128 @@
+"""
+This module implements the integrity check of the model (or any big file), which is cached so it's
+only paid for once.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import zipfile
+
+
+def file_sha256(file_path: str, chunk_size: int = 16 * 1024**2) -> str:
+    """
+    SHA-256 (hex digest) of a file. It's memory-mapped and hashed "chunk_size" bytes at a time
+    (without copying them), so hashing a big file doesn't read it into memory.
+    """
+    if (
+        not isinstance(chunk_size, int)
+        or isinstance(chunk_size, bool)
+        or chunk_size <= 0
+    ):
+        raise ValueError("Expected chunk_size to be a positive int.")
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # Empty files can't be memory-mapped.
+            return digest.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for start in range(0, len(view), chunk_size):
+                    digest.update(view[start : start + chunk_size])
+    return digest.hexdigest()
+
+
+def cached_sha256(file_path: str) -> str:
+    """
+    SHA-256 of a file, cached in "file_path.verified.json" together with the file's size and
+    modification time: it's only hashed again if one of them changed.
+    """
+    stat = os.stat(file_path)
+    try:
+        with open(file_path + ".verified.json", encoding="utf-8") as file:
+            cached: dict = json.load(file)
+        if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    digest: str = file_sha256(file_path)
+    remember_sha256(file_path, digest)
+    return digest
+
+
+def remember_sha256(file_path: str, digest: str) -> None:
+    """
+    Caches the (already known) SHA-256 of a file for cached_sha256, e.g. right after downloading
+    it, so it's never hashed again.
+    """
+    stat = os.stat(file_path)
+    write_atomically(
+        file_path + ".verified.json",
+        json.dumps(
+            {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        ),
+    )
+
+
+def verify_file(file_path: str, sha256: str | None = None) -> tuple[bool, str]:
+    """
+    Checks the integrity of a (model) file. Returns whether it's verified and a message saying why.
+    Its SHA-256 (see cached_sha256) is compared with "sha256" or, if it isn't passed in, with the
+    digest saved next to the file when it was downloaded ("file_path.sha256", see
+    model_download.download).
+    If there's no digest to compare with (e.g. the file was copied by hand), only zip based files
+    (such as the ones saved by recent versions of torch) can be checked: the CRC of every file in
+    them must match, and then the current digest is saved as the one to compare with from then on.
+    Other files (e.g. legacy torch files) can't be checked, so they aren't verified.
+    """
+    if not os.path.isfile(file_path):
+        return False, f"{file_path} wasn't found."
+    if os.path.getsize(file_path) == 0:
+        return False, f"{file_path} is empty."
+
+    expected: str | None = sha256.lower() if sha256 is not None else None
+    digest_path: str = file_path + ".sha256"
+    if expected is None and os.path.exists(digest_path):
+        with open(digest_path, encoding="utf-8") as file:
+            saved: list[str] = file.read().split()
+        expected = saved[0].lower() if saved else None
+
+    if expected is None:
+        with open(file_path, "rb") as file:
+            is_zip: bool = file.read(4) == b"PK\x03\x04"
+        if not is_zip:
+            return False, f"{file_path} can't be verified (it has no known SHA-256)."
+        if not zip_is_intact(file_path):
+            return False, f"{file_path} is truncated or corrupted."
+        write_atomically(
+            digest_path, f"{cached_sha256(file_path)}  {os.path.basename(file_path)}\n"
+        )
+        return True, f"{file_path} has no known SHA-256, its current one was saved."
+
+    if cached_sha256(file_path) != expected:
+        return False, f"{file_path} is corrupted (its SHA-256 doesn't match)."
+    return True, f"{file_path} was verified."
+
+
+def zip_is_intact(file_path: str) -> bool:
+    """
+    Whether a zip file is complete (its central directory, at the end of the file, can be read)
+    and the CRC of every file in it matches its contents.
+    """
+    try:
+        with zipfile.ZipFile(file_path) as file:
+            return file.testzip() is None
+    except (zipfile.BadZipFile, OSError, EOFError):
+        return False
+
+
+def write_atomically(file_path: str, text: str) -> None:
+    """
+    Writes "text" to "file_path" through a temporary file, so it's never left half written.
+    """
+    with open(file_path + ".tmp", "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(file_path + ".tmp", file_path)
@@ -0,0 +1,277 @@
+"""
+This module implements the resumable (and parallel) download of big files, such as the model.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from model_check import file_sha256, remember_sha256  # type: ignore[import]
+
+
+class DownloadError(Exception):
+    """
+    Raised when a download can't be completed: the server failed (or misbehaved), the download was
+    cancelled or the file doesn't match its expected SHA-256.
+    """
+
+
+def download(
+    url: str,
+    destination: str,
+    *,
+    params: dict | None = None,
+    sha256: str | None = None,
+    workers: int = 4,
+    chunk_size: int = 8 * 1024**2,
+    retries: int = 2,
+    on_progress: Callable[[int, int | None], None] | None = None,
+    cancel: threading.Event | None = None,
+    timeout: float = 60,
+) -> str:
+    """
+    Downloads "url" into "destination" and returns the file's SHA-256 (hex digest).
+        - If the server supports byte ranges, the file is split in "chunk_size" chunks which are
+        downloaded by "workers" threads at once (each chunk is retried "retries" times). The
+        chunks already downloaded are kept in "destination.part" (and listed in
+        "destination.part.json"), so an interrupted (or cancelled) download resumes from them.
+        - Otherwise, it's downloaded in a single stream (and can't be resumed).
+        - If "sha256" is passed in, the file must match it. The digest is saved next to the file
+        ("destination.sha256", in the same format as "sha256sum") and only then the file is moved
+        to "destination" (atomically), so "destination" is never a partial file.
+        - "on_progress(downloaded_bytes, total_bytes)" is called (from the download threads) as
+        data arrives. "total_bytes" is None if the server didn't tell it.
+    Raises DownloadError if the download fails (ValueErrors for wrong arguments).
+    """
+    # pylint: disable=import-outside-toplevel
+    import requests  # type: ignore[import]
+
+    for name, value, minimum in (
+        ("workers", workers, 1),
+        ("chunk_size", chunk_size, 1),
+        ("retries", retries, 0),
+    ):
+        if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+            raise ValueError(f"Expected {name} to be an int bigger than {minimum - 1}.")
+
+    session = requests.Session()
+    session.mount(
+        url[: url.find(":") + 3], requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    )
+    part_path: str = destination + ".part"
+    progress = Progress(on_progress, cancel)
+    try:
+        # Asking for the first byte tells whether ranges are supported and the file's size.
+        with session.get(
+            url,
+            params=params,
+            headers={"Range": "bytes=0-0"},
+            stream=True,
+            timeout=timeout,
+        ) as response:
+            response.raise_for_status()
+            # Following requests go straight to the final URL (with "params" in it).
+            url = response.url
+            size: int | None = range_size(response)
+
+        if size is None:
+            download_stream(session, url, part_path, progress, timeout)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                download_ranges(
+                    session,
+                    url,
+                    part_path,
+                    size,
+                    chunk_size,
+                    retries,
+                    progress,
+                    pool,
+                    timeout,
+                )
+    except requests.RequestException as error:
+        raise DownloadError(f"Download failed: {error}") from error
+    finally:
+        session.close()
+
+    digest: str = file_sha256(part_path)
+    if sha256 is not None and digest != sha256.lower():
+        remove_files(part_path, part_path + ".json")
+        raise DownloadError(
+            f"The downloaded file's SHA-256 ({digest}) doesn't match the expected one ({sha256})."
+        )
+
+    with open(destination + ".sha256", "w", encoding="utf-8") as file:
+        file.write(f"{digest}  {os.path.basename(destination)}\n")
+    os.replace(part_path, destination)
+    remove_files(part_path + ".json")
+    # Verifying it (see model_check.verify_file) won't need to hash it again.
+    remember_sha256(destination, digest)
+    return digest
+
+
+class Progress:
+    """
+    Thread safe counter of downloaded bytes, which reports them to "on_progress" and raises a
+    DownloadError as soon as "cancel" is set.
+    """
+
+    def __init__(
+        self,
+        on_progress: Callable[[int, int | None], None] | None,
+        cancel: threading.Event | None,
+    ):
+        self.on_progress = on_progress
+        self.cancel = cancel
+        self.total: int | None = None
+        self.downloaded: int = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount: int) -> None:
+        """
+        Counts "amount" more downloaded bytes.
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise DownloadError("The download was cancelled.")
+        with self._lock:
+            self.downloaded += amount
+            downloaded: int = self.downloaded
+        if self.on_progress is not None:
+            self.on_progress(downloaded, self.total)
+
+
+def range_size(response) -> int | None:
+    """
+    Size of the whole file from the response to a range request, or None if the server ignored
+    the range (or didn't tell the size).
+    """
+    content_range: str = response.headers.get("Content-Range", "")
+    if response.status_code != 206 or not content_range.startswith("bytes "):
+        return None
+    size: str = content_range.rpartition("/")[2]
+    return int(size) if size.isdigit() else None
+
+
+def download_stream(
+    session, url: str, part_path: str, progress: Progress, timeout: float
+) -> None:
+    """
+    Downloads the whole file in a single stream into "part_path".
+    """
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        length: str = response.headers.get("Content-Length", "")
+        progress.total = int(length) if length.isdigit() else None
+        with open(part_path, "wb") as file:
+            for block in response.iter_content(1024**2):
+                file.write(block)
+                progress.add(len(block))
+
+
+def download_ranges(
+    session,
+    url: str,
+    part_path: str,
+    size: int,
+    chunk_size: int,
+    retries: int,
+    progress: Progress,
+    pool: ThreadPoolExecutor,
+    timeout: float,
+) -> None:
+    """
+    Downloads the chunks of the file which aren't in "part_path" yet, in parallel. Each finished
+    chunk is listed in "part_path.json", which is only trusted if the file's size and the chunk size
+    didn't change.
+    """
+    state_path: str = part_path + ".json"
+    state: dict = {"size": size, "chunk_size": chunk_size, "done": []}
+    try:
+        with open(state_path, encoding="utf-8") as file:
+            saved_state: dict = json.load(file)
+        if (
+            saved_state.get("size") == size
+            and saved_state.get("chunk_size") == chunk_size
+            and os.path.getsize(part_path) == size
+        ):
+            state = saved_state
+    except (OSError, ValueError):
+        pass
+
+    if not state["done"]:
+        # Starting over: the file gets its final size right away, and chunks are written in place.
+        with open(part_path, "wb") as file:
+            file.truncate(size)
+        save_state(state_path, state)
+
+    chunks_amount: int = -(-size // chunk_size)
+    done: set[int] = set(state["done"])
+    progress.total = size
+    progress.add(sum(min(chunk_size, size - index * chunk_size) for index in done))
+    lock = threading.Lock()
+
+    def download_chunk(index: int) -> None:
+        start: int = index * chunk_size
+        end: int = min(start + chunk_size, size) - 1
+        for attempt in range(retries + 1):
+            written: int = 0
+            try:
+                with session.get(
+                    url,
+                    headers={"Range": f"bytes={start}-{end}"},
+                    stream=True,
+                    timeout=timeout,
+                ) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206 or not response.headers.get(
+                        "Content-Range", ""
+                    ).startswith(f"bytes {start}-"):
+                        raise DownloadError(
+                            "The server didn't send the requested range."
+                        )
+                    with open(part_path, "r+b") as file:
+                        file.seek(start)
+                        for block in response.iter_content(1024**2):
+                            block = block[: end + 1 - start - written]
+                            file.write(block)
+                            written += len(block)
+                            progress.add(len(block))
+                if written != end + 1 - start:
+                    raise DownloadError("The server sent an incomplete range.")
+                break
+            except Exception:  # pylint: disable=broad-except
+                # Not counting the bytes which will be downloaded again.
+                progress.add(-written)
+                if attempt == retries or (progress.cancel and progress.cancel.is_set()):
+                    raise
+
+        with lock:
+            state["done"].append(index)
+            save_state(state_path, state)
+
+    for future in [
+        pool.submit(download_chunk, index)
+        for index in range(chunks_amount)
+        if index not in done
+    ]:
+        future.result()
+
+
+def save_state(state_path: str, state: dict) -> None:
+    """
+    Saves the state of a download atomically (it's never left half written).
+    """
+    with open(state_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def remove_files(*file_paths: str) -> None:
+    """
+    Removes the files which exist among "file_paths".
+    """
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            os.remove(file_path)
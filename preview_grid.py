@@ -0,0 +1,298 @@
+"""
+This module implements the scrollable grid of image previews used by the main window.
+"""
+
+import os
+import queue
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
+
+import customtkinter  # type: ignore[import]
+from PIL import Image, ImageTk  # type: ignore[import]
+
+
+def grid_columns(width: int, cell_width: int) -> int:
+    """
+    Amount of cells (at least one) which fit side by side in "width" pixels.
+    """
+    if cell_width <= 0:
+        raise ValueError("Expected cell_width to be positive.")
+    return max(width // cell_width, 1)
+
+
+def visible_indices(
+    top: float, height: int, cell_height: int, columns: int, count: int
+) -> range:
+    """
+    Indices of the cells (of a grid with "count" cells and "columns" columns) in any row which is,
+    even partially, between "top" and "top + height" pixels.
+    """
+    if cell_height <= 0 or columns <= 0:
+        raise ValueError("Expected cell_height and columns to be positive.")
+    first_row: int = max(int(top // cell_height), 0)
+    last_row: int = max(int((top + max(height, 1) - 1) // cell_height), first_row)
+    return range(min(first_row * columns, count), min((last_row + 1) * columns, count))
+
+
+class PreviewGrid(tk.Frame):
+    """
+    Scrollable grid of thumbnails (with their file names) of a sequence of image paths, which can
+    be huge. Only the cells in visible rows are drawn, and only their thumbnails are decoded:
+        - "load_thumbnail(image_path, thumbnail_size)" (which returns a PIL image that fits in
+        "thumbnail_size") runs in a pool of background threads, which skip paths that were
+        scrolled away before their turn came;
+        - Decoded thumbnails are handed to the Tk thread through a queue;
+        - The Tk thread turns at most "photos_per_poll" of them into PhotoImages every
+        "poll_interval" milliseconds, so scrolling never waits on decoding.
+    The paths are read from "image_paths" (it isn't copied), so refresh() must be called after it
+    changes.
+    """
+
+    # Milliseconds between each time decoded thumbnails are taken from the queue.
+    poll_interval: int = 30
+    # PhotoImages created per poll (creating one blocks the Tk loop for a moment).
+    photos_per_poll: int = 8
+    # PhotoImages kept for cells which were scrolled away (least recently used are dropped).
+    max_photos: int = 512
+
+    def __init__(
+        self,
+        master,
+        *,
+        image_paths: Sequence[str],
+        load_thumbnail: Callable[[str, tuple[int, int]], Image.Image],
+        thumbnail_size: tuple[int, int] = (80, 80),
+        workers: int = 2,
+        bg: str = "#4a4e69",
+        fg: str = "white",
+        **kwargs,
+    ):
+        super().__init__(master, bg=bg, **kwargs)
+
+        self.image_paths: Sequence[str] = image_paths
+        self.load_thumbnail: Callable[[str, tuple[int, int]], Image.Image] = (
+            load_thumbnail
+        )
+        self.thumbnail_size: tuple[int, int] = thumbnail_size
+        self.fg: str = fg
+        # Thumbnail, file name (one line) and some padding.
+        self.cell_size: tuple[int, int] = (
+            thumbnail_size[0] + 16,
+            thumbnail_size[1] + 30,
+        )
+        self.selected_path: str | None = None
+
+        self.canvas = tk.Canvas(
+            self,
+            bg=bg,
+            highlightthickness=0,
+            bd=0,
+            yscrollincrement=self.cell_size[1] // 4,
+        )
+        self.scrollbar = customtkinter.CTkScrollbar(self, command=self.canvas.yview)
+        # Every change of the view (scrollbar, mouse wheel, resizing) goes through here.
+        self.canvas.configure(yscrollcommand=self._on_view_changed)
+        self.canvas.grid(row=0, column=0, sticky="NEWS")
+        self.scrollbar.grid(row=0, column=1, sticky="NS")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", lambda _: self.refresh())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-4>", self._on_mouse_wheel)
+        self.canvas.bind("<Button-5>", self._on_mouse_wheel)
+        self.bind("<Destroy>", self._on_destroy)
+
+        self._columns: int = 1
+        # Drawn cells: index -> (image path, canvas items).
+        self._cells: dict[int, tuple[str, list[int]]] = {}
+        self._photos: OrderedDict[str, ImageTk.PhotoImage] = OrderedDict()
+        self._failed: set[str] = set()
+        self._pending: set[str] = set()
+        # Paths in visible cells. It's replaced (never changed in place), as workers read it.
+        self._wanted: frozenset[str] = frozenset()
+        self._decoded: queue.Queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="thumbnails"
+        )
+        self._poll_id: str = self.after(self.poll_interval, self._poll_decoded)
+
+    def refresh(self) -> None:
+        """
+        Redraws the visible cells. Must be called after "image_paths" changes.
+        """
+        self._columns = grid_columns(self.canvas.winfo_width(), self.cell_size[0])
+        rows: int = -(-len(self.image_paths) // self._columns)
+        for index in list(self._cells):
+            self._delete_cell(index)
+        self.canvas.delete("empty")
+        if not self.image_paths:
+            self.canvas.create_text(
+                8, 8, text="Empty", anchor="nw", fill=self.fg, tags="empty"
+            )
+        # This calls _on_view_changed, which draws the visible cells.
+        self.canvas.configure(
+            scrollregion=(
+                0,
+                0,
+                self._columns * self.cell_size[0],
+                rows * self.cell_size[1],
+            )
+        )
+        self._render()
+
+    def _on_view_changed(self, first: str, last: str) -> None:
+        self.scrollbar.set(first, last)
+        self._render()
+
+    def _render(self) -> None:
+        """
+        Draws the cells which became visible, deletes the ones which aren't anymore and asks the
+        pool for the missing thumbnails.
+        """
+        visible: range = visible_indices(
+            self.canvas.canvasy(0),
+            self.canvas.winfo_height(),
+            self.cell_size[1],
+            self._columns,
+            len(self.image_paths),
+        )
+        for index in list(self._cells):
+            if index not in visible:
+                self._delete_cell(index)
+
+        wanted: list[str] = []
+        for index in visible:
+            image_path: str = self.image_paths[index]
+            if index not in self._cells:
+                self._draw_cell(index, image_path)
+            if image_path not in self._photos and image_path not in self._failed:
+                wanted.append(image_path)
+
+        self._wanted = frozenset(wanted)
+        for image_path in wanted:
+            if image_path not in self._pending:
+                self._pending.add(image_path)
+                self._pool.submit(self._decode, image_path)
+
+    def _draw_cell(self, index: int, image_path: str) -> None:
+        left: int = (index % self._columns) * self.cell_size[0]
+        top: int = (index // self._columns) * self.cell_size[1]
+        center: int = left + self.cell_size[0] // 2
+        items: list[int] = [
+            self.canvas.create_rectangle(
+                left + 2,
+                top + 2,
+                left + self.cell_size[0] - 2,
+                top + self.cell_size[1] - 2,
+                outline="white" if image_path == self.selected_path else "",
+                width=2,
+            ),
+            self.canvas.create_image(
+                center,
+                top + 6 + self.thumbnail_size[1] // 2,
+                image=self._photo(image_path) or "",
+            ),
+            self.canvas.create_text(
+                center,
+                top + self.cell_size[1] - 14,
+                text=shortened(os.path.basename(image_path), self.cell_size[0] // 7),
+                fill=self.fg,
+            ),
+        ]
+        self._cells[index] = (image_path, items)
+
+    def _delete_cell(self, index: int) -> None:
+        _, items = self._cells.pop(index)
+        self.canvas.delete(*items)
+
+    def _photo(self, image_path: str) -> ImageTk.PhotoImage | None:
+        if (photo := self._photos.get(image_path)) is not None:
+            self._photos.move_to_end(image_path)
+        return photo
+
+    def _decode(self, image_path: str) -> None:
+        """
+        Runs in the pool: decodes a thumbnail, unless its cell isn't visible anymore.
+        """
+        img: Image.Image | None = None
+        failed: bool = False
+        if image_path in self._wanted:
+            try:
+                img = self.load_thumbnail(image_path, self.thumbnail_size)
+            except Exception:  # pylint: disable=broad-except
+                # E.g. the file was deleted or isn't a valid image: only its name is shown.
+                failed = True
+        self._decoded.put((image_path, img, failed))
+
+    def _poll_decoded(self) -> None:
+        """
+        Turns a few decoded thumbnails into PhotoImages and shows the ones still visible.
+        """
+        for _ in range(self.photos_per_poll):
+            try:
+                image_path, img, failed = self._decoded.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.discard(image_path)
+            if failed:
+                self._failed.add(image_path)
+            if img is None:
+                continue
+
+            photo = ImageTk.PhotoImage(img, master=self)
+            self._photos[image_path] = photo
+            if len(self._photos) > self.max_photos:
+                self._photos.popitem(last=False)
+            for cell_path, items in self._cells.values():
+                if cell_path == image_path:
+                    self.canvas.itemconfigure(items[1], image=photo)
+
+        # Skipped paths which became visible again are requested again.
+        if self._wanted.difference(self._photos, self._failed, self._pending):
+            self._render()
+        self._poll_id = self.after(self.poll_interval, self._poll_decoded)
+
+    def _index_at(self, x: int, y: int) -> int | None:
+        column: int = int(self.canvas.canvasx(x) // self.cell_size[0])
+        index: int = int(self.canvas.canvasy(y) // self.cell_size[1]) * self._columns
+        index += column
+        if column >= self._columns or not 0 <= index < len(self.image_paths):
+            return None
+        return index
+
+    def _on_click(self, event) -> None:
+        index: int | None = self._index_at(event.x, event.y)
+        self.selected_path = None if index is None else self.image_paths[index]
+        for image_path, items in self._cells.values():
+            self.canvas.itemconfigure(
+                items[0], outline="white" if image_path == self.selected_path else ""
+            )
+
+    def _on_mouse_wheel(self, event) -> None:
+        # Windows/macOS send "delta", X11 sends buttons 4 (up) and 5 (down).
+        if event.num == 4 or event.delta > 0:
+            self.canvas.yview_scroll(-2, "units")
+        else:
+            self.canvas.yview_scroll(2, "units")
+
+    def _on_destroy(self, event) -> None:
+        if event.widget is self:
+            self.after_cancel(self._poll_id)
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shortened(text: str, max_length: int) -> str:
+    """
+    Shortens "text" to at most "max_length" characters, replacing its middle with "..." (or, if
+    "max_length" is too small to keep both of its ends, cutting its end).
+    """
+    if len(text) <= max_length:
+        return text
+    if max_length < 5:
+        return text[: max(max_length, 0)]
+    head: int = (max_length - 3) // 2
+    return text[:head] + "..." + text[-(max_length - 3 - head) :]
@@ -2,22 +2,43 @@
 Main script for loading this app.
 Display loading screen -> Load app in the "background" -> Destroy loading screen and display main
 screen.
+
+If any command line arguments are passed in, images are processed headlessly instead (this never
+imports tkinter/customtkinter). Run "python project.py --help" for more info. Run
+"python project.py --startup-profile" to measure how long the app takes to start.
 """
 
+import argparse
+import contextlib
+import glob
+import importlib.util
 import io
+import itertools
 import os
+import sys
+import tempfile
 import threading
-from tkinter import messagebox
-from typing import Union, Callable
+import time
+from typing import TYPE_CHECKING, Iterable, Iterator, Union, Callable
 
 # If you use windows uncomment this:
 # from ctypes import windll
 
-import requests  # type: ignore[import]
-from PIL import Image, ImageTk  # type: ignore[import]
+# Only light modules are imported here, so the GUI shows up quickly. Heavy ones (requests, numpy,
+# rembg, torch, tkinter/customtkinter) are imported where they are first used.
+from PIL import Image  # type: ignore[import]
+
+from readiness import Readiness  # type: ignore[import]
+from result_cache import DEFAULT_CACHE_DIR, ResultCache  # type: ignore[import]
+from stage_recorder import (  # type: ignore[import]
+    JsonLinesRecorder,
+    NullRecorder,
+    StageTimings,
+)
+from thumbnail_cache import ThumbnailCache  # type: ignore[import]
 
-import main_window  # type: ignore[import]
-from loading_screen import LoadingScreen  # type: ignore[import]
+if TYPE_CHECKING:
+    from PIL import ImageTk  # type: ignore[import]
 
 
 def importer():
@@ -31,43 +52,852 @@ def importer():
     from rembg import bg  # type: ignore[import]
 
 
+# Sizes (in pixels, at the working resolution) used by band_matting: how far from the mask's edge
+# alpha is solved for, how much the sure foreground is eroded and how much the sure background is
+# eroded (i.e. how far the unknown region is dilated into it). Bands are solved in tiles.
+MATTING_BAND_WIDTH: int = 16
+MATTING_ERODE_SIZE: int = 10
+MATTING_DILATE_SIZE: int = 10
+MATTING_TILE_SIZE: int = 256
+# (band width, erode size, dilate size), as rm_bg and the functions it calls take them.
+MATTING_BAND_SIZES: tuple[int, int, int] = (
+    MATTING_BAND_WIDTH,
+    MATTING_ERODE_SIZE,
+    MATTING_DILATE_SIZE,
+)
+
+
+class ModelSession:
+    """
+    Owns the background removal model. It is loaded only once, even if many workers ask for it at
+    the same time, and is shared by every rm_bg call in this process. Warming it up runs a dummy
+    forward pass, so the first image is as fast as the following ones.
+    """
+
+    def __init__(self, model_name: str = "u2net_human_seg"):
+        self.model_name: str = model_name
+        self.model = None
+        self.is_warm: bool = False
+        self._lock = threading.Lock()
+        self._warm_up_lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Whether the model has already been loaded.
+        """
+        return self.model is not None
+
+    def load(self):
+        """
+        Loads the model (importing rembg if needed) if it hasn't been loaded yet and returns it.
+        """
+        if self.model is None:
+            with self._lock:
+                # Checking again: another thread might have loaded it while we waited.
+                if self.model is None:
+                    importer()
+                    # pylint: disable=undefined-variable
+                    self.model = bg.get_model(  # type: ignore[name-defined]
+                        self.model_name
+                    )
+        return self.model
+
+    def warm_up(self, cancel: threading.Event | None = None) -> bool:
+        """
+        Loads the model and runs a dummy forward pass through it (only once, even if many threads
+        ask for it at the same time). If "cancel" is set before the model is loaded or before the
+        forward pass, it stops there (a step which already started isn't interrupted). Returns
+        whether the model is warm.
+        """
+        # pylint: disable=import-outside-toplevel
+        import numpy as np  # type: ignore[import]
+
+        if cancel is not None and cancel.is_set():
+            return self.is_warm
+        model = self.load()
+        with self._warm_up_lock:
+            if self.is_warm or (cancel is not None and cancel.is_set()):
+                return self.is_warm
+            # Not all zeros, as rembg normalizes the input by its maximum value.
+            dummy_img = np.full((320, 320, 3), 128, dtype=np.uint8)
+            bg.detect.predict(  # type: ignore[name-defined]  # pylint: disable=E0602
+                model, dummy_img
+            )
+            self.is_warm = True
+        return True
+
+    def predict_mask(self, img: Image.Image) -> Image.Image:
+        """
+        Predicts the mask of a single image (at the network's output size) the same way rembg
+        does it.
+        """
+        # pylint: disable=import-outside-toplevel
+        import numpy as np  # type: ignore[import]
+
+        model = self.load()
+        return bg.detect.predict(  # type: ignore[name-defined]  # pylint: disable=E0602
+            model, np.array(img)
+        ).convert("L")
+
+    def predict_masks(self, images: list[Image.Image]) -> list[Image.Image]:
+        """
+        Predicts the masks of many images with a single forward pass through the model. Images
+        are resized to the network's input size and stacked into one tensor, then the predicted
+        masks are split back out (at the network's output size).
+        """
+        # pylint: disable=import-outside-toplevel
+        import torch  # type: ignore[import]
+
+        model = self.load()
+        device = next(model.parameters()).device
+        batch = torch.from_numpy(u2net_input_batch(images)).to(device)
+        with torch.no_grad():
+            # U2Net returns 7 side outputs, the first one is the fused (final) prediction.
+            predictions = model(batch)[0][:, 0, :, :]
+        return u2net_masks(predictions.cpu().numpy())
+
+    def cutout(
+        self,
+        img: Image.Image,
+        mask: Image.Image,
+        alpha_matting: bool | str = True,
+        band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+    ) -> tuple[Image.Image, Image.Image]:
+        """
+        Uses a predicted mask (of any size) to split an RGB image into its foreground (RGB) and
+        alpha ("L"), both with the size of the image. If "alpha_matting" is "band" (or True), the
+        alpha is refined around the mask's edges (see band_matting, "band_sizes" being its band
+        width, erode size and dilate size). If it's "full", rembg's alpha matting refines both of
+        them. This doesn't need the model to be loaded.
+        """
+        mode: str | None = matting_mode(alpha_matting)
+        if mode == "band":
+            try:
+                return img, band_matting(img, mask, *band_sizes)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        if mode == "full":
+            # Only imports rembg, if it wasn't imported yet.
+            importer()
+            try:
+                # pylint: disable=undefined-variable
+                cutout = bg.alpha_matting_cutout(  # type: ignore[name-defined]
+                    # rembg resizes the image it receives in place.
+                    img.copy(),
+                    mask,
+                    foreground_threshold=MATTING_FOREGROUND_THRESHOLD,
+                    background_threshold=MATTING_BACKGROUND_THRESHOLD,
+                    erode_structure_size=MATTING_ERODE_SIZE,
+                    base_size=1000,
+                )
+                return cutout.convert("RGB"), cutout.getchannel("A")
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+        if mask.size != img.size:
+            mask = mask.resize(img.size, Image.LANCZOS)
+        return img, mask
+
+
+# Alpha matting modes: "band" only solves around the edges of the predicted mask (see
+# band_matting) and "full" is rembg's, which solves the whole (downscaled) image.
+ALPHA_MATTING_MODES: tuple[str, str] = ("band", "full")
+
+# Mask values above/below which pixels are surely foreground/background (for alpha matting).
+MATTING_FOREGROUND_THRESHOLD: int = 240
+MATTING_BACKGROUND_THRESHOLD: int = 10
+
+
+def matting_mode(alpha_matting: bool | str) -> str | None:
+    """
+    Returns the alpha matting mode (one of ALPHA_MATTING_MODES) an "alpha_matting" argument stands
+    for, or None if it's False. True means "band". Raises a ValueError for anything else.
+    """
+    if isinstance(alpha_matting, bool):
+        return "band" if alpha_matting else None
+    if alpha_matting not in ALPHA_MATTING_MODES:
+        raise ValueError(
+            f"Expected alpha_matting to be a bool or one of {ALPHA_MATTING_MODES}."
+        )
+    return alpha_matting
+
+
+def box_sum(values, radius: int):
+    """
+    Sums a (height, width) array over (2 * radius + 1) square windows centered on each element,
+    with cumulative sums (so it costs the same for any radius). Edges are repeated.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    size: int = 2 * radius + 1
+    padded = np.pad(values, radius, mode="edge")
+    sums = np.cumsum(padded, axis=0)
+    sums = np.concatenate([np.zeros((1, sums.shape[1]), sums.dtype), sums])
+    sums = np.cumsum(sums[size:] - sums[:-size], axis=1)
+    sums = np.concatenate([np.zeros((sums.shape[0], 1), sums.dtype), sums], axis=1)
+    return sums[:, size:] - sums[:, :-size]
+
+
+def check_band_sizes(band_sizes: tuple[int, int, int]) -> None:
+    """
+    Raises a ValueError if the band width, erode size and dilate size (see band_trimap) in
+    "band_sizes" aren't non negative ints.
+    """
+    if not isinstance(band_sizes, tuple) or len(band_sizes) != 3:
+        raise ValueError("Expected band_sizes to be a tuple of 3 ints.")
+    for name, size in zip(("band_width", "erode_size", "dilate_size"), band_sizes):
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise ValueError(f"Expected {name} to be a non negative int.")
+
+
+def band_trimap(
+    mask: Image.Image,
+    band_width: int = MATTING_BAND_WIDTH,
+    erode_size: int = MATTING_ERODE_SIZE,
+    dilate_size: int = MATTING_DILATE_SIZE,
+):
+    """
+    Builds the trimap of a mask as a uint8 array: 255 for foreground, 0 for background and 128 for
+    unknown. Unknown pixels are the ones up to "band_width" pixels away from the mask's edge which
+    aren't surely foreground (above MATTING_FOREGROUND_THRESHOLD, eroded by "erode_size") nor
+    surely background (below MATTING_BACKGROUND_THRESHOLD, eroded by "dilate_size").
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    check_band_sizes((band_width, erode_size, dilate_size))
+
+    def dilate(binary, size: int):
+        return box_sum(binary.astype(np.int32), size // 2) > 0
+
+    def erode(binary, size: int):
+        return box_sum(binary.astype(np.int32), size // 2) == (2 * (size // 2) + 1) ** 2
+
+    mask_array = np.asarray(mask.convert("L"))
+    inside = mask_array >= 128
+    band = dilate(inside, 2 * band_width + 1) & ~erode(inside, 2 * band_width + 1)
+    sure_foreground = erode(mask_array > MATTING_FOREGROUND_THRESHOLD, erode_size)
+    sure_background = ~dilate(mask_array >= MATTING_BACKGROUND_THRESHOLD, dilate_size)
+
+    trimap = np.where(inside, 255, 0).astype(np.uint8)
+    trimap[band & ~sure_foreground & ~sure_background] = 128
+    return trimap
+
+
+def band_matting(
+    img: Image.Image,
+    mask: Image.Image,
+    band_width: int = MATTING_BAND_WIDTH,
+    erode_size: int = MATTING_ERODE_SIZE,
+    dilate_size: int = MATTING_DILATE_SIZE,
+    tile_size: int = MATTING_TILE_SIZE,
+) -> Image.Image:
+    """
+    Alpha matting solved only inside a narrow band around the edges of the predicted mask (see
+    band_trimap), so its cost depends on the length of the edges instead of the size of the image.
+    The band is cropped into tiles (with some context around them) and only the tiles with unknown
+    pixels go through rembg's closed form matting. Returns the alpha ("L") with the size of "img".
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    if not isinstance(tile_size, int) or isinstance(tile_size, bool) or tile_size <= 0:
+        raise ValueError("Expected tile_size to be a positive int.")
+
+    if mask.size != img.size:
+        mask = mask.resize(img.size, Image.LANCZOS)
+    trimap = band_trimap(mask, band_width, erode_size, dilate_size)
+    alpha = trimap.copy()
+    unknown = trimap == 128
+    if not unknown.any():
+        return Image.fromarray(alpha, "L")
+
+    # Only imports rembg, if it wasn't imported yet.
+    importer()
+    image = np.asarray(img.convert("RGB"))
+    height, width = unknown.shape
+    # Enough context for the unknown pixels near a tile's border to see known ones.
+    margin: int = band_width + max(erode_size, dilate_size)
+    unknown_rows = np.flatnonzero(unknown.any(axis=1))
+    unknown_columns = np.flatnonzero(unknown.any(axis=0))
+
+    for top in range(unknown_rows[0], unknown_rows[-1] + 1, tile_size):
+        for left in range(unknown_columns[0], unknown_columns[-1] + 1, tile_size):
+            rows = slice(top, min(top + tile_size, height))
+            columns = slice(left, min(left + tile_size, width))
+            if not (tile_unknown := unknown[rows, columns]).any():
+                continue
+            box_rows = slice(max(top - margin, 0), min(rows.stop + margin, height))
+            box_columns = slice(
+                max(left - margin, 0), min(columns.stop + margin, width)
+            )
+
+            # pylint: disable=undefined-variable
+            solved = bg.estimate_alpha_cf(  # type: ignore[name-defined]
+                image[box_rows, box_columns] / 255.0,
+                trimap[box_rows, box_columns] / 255.0,
+            )
+            solved = solved[
+                top - box_rows.start : rows.stop - box_rows.start,
+                left - box_columns.start : columns.stop - box_columns.start,
+            ]
+            tile_alpha = alpha[rows, columns]
+            tile_alpha[tile_unknown] = np.clip(
+                np.rint(solved[tile_unknown] * 255), 0, 255
+            )
+
+    return Image.fromarray(alpha, "L")
+
+
+model_session: ModelSession = ModelSession("u2net_human_seg")
+
+# Side of the (square) images U2Net expects as input.
+U2NET_INPUT_SIZE: int = 320
+
+# Longest side (in pixels) images are decoded at for predicting their masks (and alpha matting).
+# Only the final composite is done at full resolution.
+MAX_WORKING_SIZE: int = 2048
+
+
+def u2net_input_batch(images: list[Image.Image], input_size: int = U2NET_INPUT_SIZE):
+    """
+    Resizes images to the network's input size, normalizes them the same way rembg does and stacks
+    them into a single float32 array with shape (amount of images, 3, input_size, input_size).
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+    std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+    batch = np.empty((len(images), 3, input_size, input_size), dtype=np.float32)
+    for pos, img in enumerate(images):
+        resized = np.asarray(
+            img.convert("RGB").resize((input_size, input_size), Image.BILINEAR),
+            dtype=np.float32,
+        )
+        # rembg scales each image by its own maximum value (avoiding a division by zero here).
+        resized /= max(float(resized.max()), 1.0)
+        batch[pos] = ((resized - mean) / std).transpose(2, 0, 1)
+    return batch
+
+
+def u2net_masks(
+    predictions, sizes: list[tuple[int, int]] | None = None
+) -> list[Image.Image]:
+    """
+    Converts a (amount of images, height, width) array of predictions to 8 bit masks ("L" images),
+    resized to the given sizes (if any). Each prediction is min-max normalized on its own, as rembg
+    does.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    masks: list[Image.Image] = []
+    for pos, prediction in enumerate(predictions):
+        low, high = float(prediction.min()), float(prediction.max())
+        normalized = (prediction - low) / max(high - low, 1e-8)
+        mask = Image.fromarray((normalized * 255).astype(np.uint8), "L")
+        masks.append(mask if sizes is None else mask.resize(sizes[pos], Image.LANCZOS))
+    return masks
+
+
+# Stages of the app's startup (see preloader), in order. Only the first one is needed by the main
+# window, the others run in the background once it's shown.
+STARTUP_STAGES: tuple[str, str, str, str] = (
+    "Importing the interface",
+    "Importing rembg",
+    "Loading the model",
+    "Warming up the model",
+)
+
+
+def preloader(
+    readiness: Readiness | None = None, cancel: threading.Event | None = None
+) -> None:
+    """
+    Imports rembg and, if the model was already downloaded, loads and warms it up. This is meant
+    to run in a different thread as soon as the main window opens, while the user is still picking
+    images, so the first image is processed as fast as the following ones. Each step is reported
+    to "readiness" (as one of STARTUP_STAGES), and if one of them fails the following ones are
+    skipped (they are tried again, and the error is shown, when images are processed). Setting
+    "cancel" skips the steps which didn't start yet.
+    """
+    if readiness is None:
+        readiness = Readiness(STARTUP_STAGES[1:])
+
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    try:
+        if not cancelled():
+            with readiness.stage("Importing rembg"):
+                importer()
+        if not cancelled() and model_exists():
+            with readiness.stage("Loading the model"):
+                model_session.load()
+            if not cancelled():
+                with readiness.stage("Warming up the model"):
+                    model_session.warm_up(cancel)
+    except Exception:  # pylint: disable=broad-except
+        pass
+    finally:
+        readiness.skip(*STARTUP_STAGES[1:])
+
+
+def import_interface(readiness: Readiness) -> None:
+    """
+    Imports the main window's module (customtkinter is slow to import), reporting it to
+    "readiness". Meant to run in a different thread while the loading screen is up.
+    """
+    with readiness.stage("Importing the interface"):
+        # pylint: disable=import-outside-toplevel, unused-import
+        import main_window  # type: ignore[import]
+
+
 # If you use windows uncomment this:
 # windll.shcore.SetProcessDpiAwareness(1)
 
 
-def main() -> int:
+def main(argv: list[str] | None = None) -> int:
     """
-    This function will start the app.
+    This function will start the app. If any command line arguments are passed in, images are
+    processed headlessly instead (see run_cli), or, with "--startup-profile", the app's startup
+    time is measured (see startup_profile).
     """
-    # This will force loading screen to stay up until rembg is imported (it is a slow import).
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv == ["--startup-profile"]:
+        return startup_profile()
+    if argv:
+        return run_cli(argv)
+
+    # pylint: disable=import-outside-toplevel
+    from loading_screen import LoadingScreen  # type: ignore[import]
+
+    readiness = Readiness(STARTUP_STAGES)
+    threading.Thread(target=import_interface, args=(readiness,), daemon=True).start()
+    # rembg is imported (and the model loaded) by the main window once it's open (see preloader).
+
+    # Closed as soon as the interface is imported, however long the other stages take.
     loading_screen = LoadingScreen(
-        wait_for=[imp_th],
         load_img=load_img,
+        readiness=readiness,
+        required=STARTUP_STAGES[:1],
     )
+    loading_screen.after_idle(mark_startup, "loading screen")
     loading_screen.mainloop()
 
-    root = main_window.MainWindow(functions=functions)
+    import main_window  # type: ignore[import]
+
+    root = main_window.MainWindow(functions=functions, readiness=readiness)
+    root.after_idle(mark_startup, "main window", root)
     root.mainloop()
 
     return 0
 
 
+# Set (to anything) in the environment of the app started by startup_profile.
+STARTUP_PROFILE_ENV: str = "RM_BG_STARTUP_PROFILE"
+
+
+def mark_startup(window_name: str, window=None) -> None:
+    """
+    If the app was started by startup_profile, tells it when "window_name" was shown. The main
+    "window" is closed right after, as the profile is done.
+    """
+    if not os.environ.get(STARTUP_PROFILE_ENV):
+        return
+    print(f"{STARTUP_PROFILE_ENV} {window_name} {time.time():.6f}", flush=True)
+    if window is not None:
+        window.destroy()
+
+
+def parse_importtime(text: str) -> list[tuple[str, int, int, int]]:
+    """
+    Parses the report printed by "python -X importtime" into "(module, depth, self_us,
+    cumulative_us)" tuples, in the same order. Depth 0 modules are the ones imported by the script
+    itself (or by the interpreter), not by other modules. Other lines are ignored.
+    """
+    imports: list[tuple[str, int, int, int]] = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields: list[str] = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header ("self [us] | cumulative | imported package").
+            continue
+        name: str = fields[2].rstrip()
+        depth: int = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return imports
+
+
+def startup_profile(slowest: int = 15, timeout: float = 120) -> int:
+    """
+    Starts the app in a new interpreter (with "-X importtime"), which closes itself as soon as the
+    main window is shown, and prints how long it took for each window to show up and which imports
+    were the slowest (cumulative time of modules imported by the app, not by other modules).
+    Returns 1 if the main window wasn't shown.
+    """
+    # pylint: disable=import-outside-toplevel
+    import subprocess
+
+    start: float = time.time()
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__)],
+        env={**os.environ, STARTUP_PROFILE_ENV: "1"},
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+        check=False,
+    )
+
+    shown: dict[str, float] = {}
+    for line in child.stdout.splitlines():
+        if line.startswith(STARTUP_PROFILE_ENV):
+            window_name, _, timestamp = line[len(STARTUP_PROFILE_ENV) + 1 :].rpartition(
+                " "
+            )
+            shown[window_name] = (float(timestamp) - start) * 1000
+
+    imports = parse_importtime(child.stderr)
+    print("Startup profile:")
+    for window_name, milliseconds in shown.items():
+        print(f"    {window_name + ' shown after':>28} | {milliseconds:>8.1f}ms")
+    print(
+        f"    {'imports (total)':>28} | "
+        + f"{sum(self_us for _, _, self_us, _ in imports) / 1000:>8.1f}ms"
+    )
+    print("    Slowest imports (cumulative):")
+    top_level = sorted(
+        (module for module in imports if module[1] == 0),
+        key=lambda module: module[3],
+        reverse=True,
+    )
+    for name, _, _, cumulative_us in top_level[:slowest]:
+        print(f"    {name:>28} | {cumulative_us / 1000:>8.1f}ms")
+
+    if "main window" not in shown:
+        errors: list[str] = [
+            line for line in child.stderr.splitlines() if not line.startswith("import")
+        ]
+        print("The main window wasn't shown:", *errors[-5:], sep="\n", file=sys.stderr)
+        return 1
+    return 0
+
+
+def iter_image_paths(paths: Iterable[str], recursive: bool = True) -> Iterator[str]:
+    """
+    Lazily yields the image paths found in "paths", which can have files, folders and glob
+    patterns. Folders are walked through (recursively, if "recursive" is True) and anything that
+    isn't a JPG/PNG image, or is an output of this app ("_NO_BG"), is skipped. Files explicitly
+    passed in are always yielded, so the caller gets to report the invalid ones.
+    """
+    for path in paths:
+        if glob.has_magic(path):
+            for match in glob.iglob(path, recursive=recursive):
+                if os.path.isdir(match):
+                    yield from iter_image_paths([match], recursive)
+                elif _is_input_image(match):
+                    yield match
+        elif os.path.isdir(path):
+            for folder, sub_folders, file_names in os.walk(path):
+                if not recursive:
+                    sub_folders.clear()
+                sub_folders.sort()
+                for file_name in sorted(file_names):
+                    if _is_input_image(file_path := os.path.join(folder, file_name)):
+                        yield file_path
+        else:
+            yield path
+
+
+def _is_input_image(image_path: str) -> bool:
+    """
+    Whether a path is a JPG/PNG image which isn't an output of this app.
+    """
+    try:
+        dot_pos, _ = check_image_type(image_path)
+    except ValueError:
+        return False
+    return not image_path[:dot_pos].endswith("_NO_BG")
+
+
+def run_cli(argv: list[str]) -> int:
+    """
+    Removes the background of every image found in the paths given in the command line, without
+    any GUI. Paths are streamed to the worker pool lazily and progress/throughput is reported to
+    stderr. Returns 1 if any image failed (or none was found) and 0 otherwise.
+    """
+    # pylint: disable=import-outside-toplevel
+    from scheduler import BatchScheduler  # type: ignore[import]
+
+    parser = argparse.ArgumentParser(
+        prog="project.py",
+        description="Removes the background of images without opening the GUI.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Image files, folders and/or glob patterns."
+    )
+    parser.add_argument(
+        "--no-recursive",
+        dest="recursive",
+        action="store_false",
+        help="Don't look for images inside sub folders.",
+    )
+    parser.add_argument(
+        "--alpha-matting",
+        nargs="?",
+        choices=ALPHA_MATTING_MODES,
+        const="band",
+        default=False,
+        help="Refine edges with alpha matting. 'band' (the default) only solves around the"
+        + " edges, 'full' solves the whole image (much slower).",
+    )
+    parser.add_argument(
+        "--band-sizes",
+        nargs=3,
+        type=int,
+        metavar=("WIDTH", "ERODE", "DILATE"),
+        default=list(MATTING_BAND_SIZES),
+        help="Band width, erode size and dilate size (in pixels, at the working size) of 'band'"
+        + " alpha matting. Default: %(default)s.",
+    )
+    parser.add_argument("--backend", choices=BatchScheduler.backends, default="thread")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--max-working-size",
+        type=int,
+        default=MAX_WORKING_SIZE,
+        metavar="PIXELS",
+        help="Longest side images are decoded at for predicting masks, only the final composite"
+        + f" is done at full resolution (default: {MAX_WORKING_SIZE}, 0 for full resolution).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="Process every image, even the ones which were already processed.",
+    )
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=2048,
+        help="Maximum size of the results cache, in MB (default: 2048).",
+    )
+    parser.add_argument(
+        "--recomposite",
+        metavar="COLOR",
+        default=None,
+        help="Only create new outputs with this background color (e.g. '#00ff00', 'red' or"
+        + " 'transparent') from the cached masks, without running the model.",
+    )
+    parser.add_argument(
+        "--download-model",
+        action="store_true",
+        help="Download the model if it's missing.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Only process as many images at once as their estimated memory fits in this many MB"
+        + " (default: half of the computer's memory, 0 for no limit).",
+    )
+    parser.add_argument(
+        "--order",
+        choices=("fifo", "longest"),
+        default="fifo",
+        help="Process images in the order they are found (default, streamed to the workers) or"
+        + " biggest first (lists them all first, and reports the time it saved).",
+    )
+    parser.add_argument(
+        "--stage-log",
+        metavar="FILE",
+        default=None,
+        help="Append the time and memory of each stage of each image to FILE (JSON lines) and"
+        + " report their percentiles (only with the thread backend). Memory is only measured"
+        + " with --workers 1.",
+    )
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers <= 0:
+        parser.error("--workers must be positive.")
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive.")
+    if args.max_working_size < 0:
+        parser.error("--max-working-size can't be negative.")
+    if min(args.band_sizes) < 0:
+        parser.error("--band-sizes can't be negative.")
+    band_sizes: tuple[int, int, int] = tuple(args.band_sizes)  # type: ignore[assignment]
+    if args.memory_budget is not None and args.memory_budget < 0:
+        parser.error("--memory-budget can't be negative.")
+    memory_budget: int | None = (
+        default_memory_budget()
+        if args.memory_budget is None
+        else args.memory_budget * 1024**2 or None
+    )
+    if args.stage_log is not None and args.backend != "thread":
+        parser.error("--stage-log only works with the thread backend.")
+    max_working_size: int | None = args.max_working_size or None
+
+    fill_color: tuple[int, int, int] | None = None
+    if args.recomposite is not None and args.recomposite != "transparent":
+        # pylint: disable=import-outside-toplevel
+        from PIL import ImageColor  # type: ignore[import]
+
+        try:
+            fill_color = ImageColor.getrgb(args.recomposite)[:3]
+        except ValueError:
+            parser.error(f"Unknown color: {args.recomposite}")
+
+    # Checked before starting any worker, instead of each of them failing to load it.
+    verified, message = True, ""
+    if args.recomposite is None:
+        verified, message = (
+            verify_model() if model_exists() else (False, "Model not found.")
+        )
+    if not verified:
+        if not args.download_model:
+            print(
+                f"{message} Run again with --download-model to download it.",
+                file=sys.stderr,
+            )
+            return 1
+
+        def report_download(downloaded: int, total: int | None) -> None:
+            size: str = f"/{total / 1024**2:.1f}" if total else ""
+            print(
+                f"\rDownloaded {downloaded / 1024**2:.1f}{size}MB",
+                end="",
+                file=sys.stderr,
+            )
+
+        try:
+            # A model which exists but isn't verified is replaced once the new one is complete.
+            download_model(on_progress=report_download)
+        except Exception as error:  # pylint: disable=broad-except
+            # The download resumes from where it stopped when it's run again.
+            print(f"\nDownload failed: {error}", file=sys.stderr)
+            return 1
+        print(file=sys.stderr)
+
+        verified, message = verify_model()
+        if not verified:
+            print(message, file=sys.stderr)
+            return 1
+
+    start: float = time.perf_counter()
+    last_report: list[float] = [start]
+    counts: dict[str, int] = {"done": 0, "failed": 0}
+
+    def report_progress(image_path: object, exception: BaseException | None) -> None:
+        counts["done"] += 1
+        if exception is not None:
+            counts["failed"] += 1
+            print(f"\nFailed: {image_path}: {exception}", file=sys.stderr)
+
+        # Reporting at most once per second, so huge batches don't flood the terminal.
+        if (now := time.perf_counter()) - last_report[0] >= 1:
+            last_report[0] = now
+            print(
+                f"\r{counts['done']} images done ({counts['failed']} failed),"
+                + f" {counts['done'] / (now - start):.2f} images/s",
+                end="",
+                file=sys.stderr,
+            )
+
+    cache: ResultCache | None = None
+    if args.cache or args.recomposite is not None:
+        cache = ResultCache(
+            *([args.cache_dir] if args.cache_dir else []),
+            max_bytes=args.cache_size * 1024**2,
+        )
+
+    if args.recomposite is not None:
+        BatchScheduler(workers=args.workers, backend=args.backend).run(
+            recomposite,
+            iter_image_paths(args.paths, args.recursive),
+            fill_color,
+            args.alpha_matting,
+            cache,
+            max_working_size,
+            band_sizes,
+            on_done=report_progress,
+        )
+    else:
+        makespans: dict[str, float] | None = {} if args.order == "longest" else None
+        recorder: NullRecorder = (
+            NullRecorder()
+            if args.stage_log is None
+            # Memory is measured process wide, so it's only right for one worker.
+            else JsonLinesRecorder(args.stage_log, memory=args.workers == 1)
+        )
+        try:
+            rm_bg_batch(
+                iter_image_paths(args.paths, args.recursive),
+                args.alpha_matting,
+                backend=args.backend,
+                workers=args.workers,
+                batch_size=args.batch_size,
+                on_done=report_progress,
+                cache=cache,
+                max_working_size=max_working_size,
+                recorder=recorder,
+                memory_budget=memory_budget,
+                order=args.order,
+                makespans=makespans,
+                band_sizes=band_sizes,
+            )
+        finally:
+            recorder.close()
+        if report := recorder.report():
+            print(f"\n{report}", file=sys.stderr)
+        # Both orders are simulated from the same durations, so the difference can be negative.
+        if makespans and (saved := makespans["fifo"] - makespans["longest"]) > 0:
+            print(
+                f"\nProcessing the biggest images first saved about {saved:.1f}s compared with"
+                + " the order they were found in (simulated from the time each image took).",
+                file=sys.stderr,
+            )
+
+    elapsed: float = time.perf_counter() - start
+    print(
+        f"\r{counts['done']} images done ({counts['failed']} failed) in {elapsed:.1f}s,"
+        + f" {counts['done'] / elapsed:.2f} images/s",
+        file=sys.stderr,
+    )
+    if not counts["done"]:
+        print("No images were found.", file=sys.stderr)
+        return 1
+    return 1 if counts["failed"] else 0
+
+
 def load_img(
     image_path: str, size: Union[tuple[int, int], float | int | None] = None
-) -> ImageTk.PhotoImage:
+) -> "ImageTk.PhotoImage":
     """
     This should load images.
     The size parameter can be:
         A tuple of ints, for resizing;
         A float or int, for indicating a percentage to resize; or
         None, to keep original size.
+    Decoded (and resized) images are kept in the thumbnail cache, so loading the same image at the
+    same size again doesn't decode it again.
     """
+    # pylint: disable=import-outside-toplevel
+    from PIL import ImageTk  # type: ignore[import]
 
     # Reusing checks.
     check_image_type(image_path)
 
     if size is None:
-        return ImageTk.PhotoImage(Image.open(image_path))
+        return ImageTk.PhotoImage(thumbnail_cache.get(image_path))
 
     if (
         isinstance(size, tuple)
@@ -78,59 +908,1034 @@ def load_img(
     ):
         if size[0] <= 0 or size[1] <= 0:
             raise ValueError("Size should have positive values.")
-        return ImageTk.PhotoImage(Image.open(image_path).resize(size))
+        return ImageTk.PhotoImage(thumbnail_cache.get(image_path, size))
 
     if isinstance(size, (float, int)) and not isinstance(size, bool):
         if size <= 0:
             raise ValueError("Size should be a positive value.")
-        img = Image.open(image_path)
-        new_size = tuple(int(length * size) for length in img.size)
-        return ImageTk.PhotoImage(img.resize(new_size))
+        return ImageTk.PhotoImage(thumbnail_cache.get(image_path, size))
 
     raise ValueError(
         "Expected size to be either a tuple of ints, a float, int or None."
     )
 
 
+def load_thumbnail(image_path: str, box: tuple[int, int] = (96, 96)) -> Image.Image:
+    """
+    Loads an image scaled down to fit in "box" (keeping its aspect ratio, smaller images aren't
+    scaled up) through the thumbnail cache. It returns a PIL image, not a PhotoImage, so it can be
+    called from background threads (Tk objects must be created on the Tk thread).
+    """
+    check_image_type(image_path)
+    if box[0] <= 0 or box[1] <= 0:
+        raise ValueError("Box should have positive values.")
+
+    # Only the header is read here, the pixels are decoded (once) by the cache.
+    with Image.open(image_path) as img:
+        width, height = img.size
+    scale: float = min(box[0] / width, box[1] / height, 1)
+    return thumbnail_cache.get(
+        image_path, (max(round(width * scale), 1), max(round(height * scale), 1))
+    )
+
+
+# Decoded images shown by the GUI (see load_img and load_thumbnail).
+thumbnail_cache: ThumbnailCache = ThumbnailCache(64 * 1024**2)
+
+
 def rm_bg(
     image_path: str,
     # model_name: str = "u2net_human_seg",
-    alpha_matting: bool = True,
+    alpha_matting: bool | str = True,
+    cache: ResultCache | None = None,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    timings: dict[str, float] | None = None,
+    recorder: NullRecorder | None = None,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
 ) -> None:
     """
     This function will remove the background of a given image. It should receive a JPG image path.
     It will create and save a JPG image with white background.
+    If a cache is passed in and this image was already processed (with the same settings), the
+    cached result is used instead.
+    "alpha_matting" can be False, "band" (same as True) or "full" (see ModelSession.cutout). The
+    band width, erode size and dilate size of "band" matting are "band_sizes" (see band_trimap).
+    The mask is predicted (and alpha matting is done) on the image decoded at a reduced resolution,
+    with its longest side no bigger than "max_working_size" (None means full resolution). Only the
+    final alpha is upsampled to full resolution, for compositing.
+    If a "timings" dict is passed in, the seconds spent in each stage (decode, inference, cutout
+    or matting, upsample, composite, save and cache) are added to it.
+    If an enabled "recorder" is passed in (see stage_recorder), the wall time, CPU time and memory
+    of each stage (and of the whole call, "total") of this image are recorded by it.
     """
+    if recorder is not None and recorder.enabled:
+        image_timings: StageTimings = recorder.timings()
+        with timed(image_timings, "total"):
+            rm_bg(
+                image_path,
+                alpha_matting,
+                cache,
+                max_working_size,
+                image_timings,
+                band_sizes=band_sizes,
+            )
+        recorder.record(image_path, image_timings)
+        if timings is not None:
+            for stage, seconds in image_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        return
+
     input_img_path: str
     output_img_path: str
     input_img_path, output_img_path = process_img_path(image_path)
 
-    # Opening/reading image as bytes.
-    with open(input_img_path, "rb") as input_as_bytes:
-        input_img = input_as_bytes.read()
+    if cache is not None:
+        with timed(timings, "cache"):
+            cache_key: str = cache.key(
+                input_img_path,
+                cache_settings(
+                    output_img_path, alpha_matting, max_working_size, band_sizes
+                ),
+            )
+            if cache.restore(cache_key, output_img_path):
+                return
 
-    model_name: str = "u2net_human_seg"
-    # Removing background from image using u2net_human_seg.
-    output_as_bytes = bg.remove(  # type: ignore[name-defined]  # pylint: disable=undefined-variable
-        input_img,
+    # The image stays in memory (as a PIL image) from decoding until it's saved.
+    with timed(timings, "decode"):
+        img: Image.Image = open_rgb(input_img_path, max_working_size)
+    # Removing background from image using the shared (u2net_human_seg) model session (or its
+    # cached mask).
+    with timed(timings, "inference"):
+        mask: Image.Image = get_mask(input_img_path, img, cache, max_working_size)
+    img, working_img = open_full_resolution(input_img_path, img, timings)
+    output = composite(
+        img,
+        mask,
         alpha_matting=alpha_matting,
-        model_name=model_name,
+        timings=timings,
+        working_img=working_img,
+        band_sizes=band_sizes,
     )
-    # Converting the output as bytes to a PIL Image.
-    pil_img = Image.open(io.BytesIO(output_as_bytes))
+    with timed(timings, "save"):
+        # Saving the new image in the same folder with a similar name.
+        output.save(output_img_path)
 
-    # Tuple representing the new RGB background color (the image we get from rembg is a transparent
-    # PNG).
-    fill_color: tuple[int, int, int] = (255, 255, 255)
-    pil_img = pil_img.convert("RGBA")
-    if pil_img.mode in ("RGBA", "LA"):
-        # Removing transparency and making background white.
-        background = Image.new(pil_img.mode[:-1], pil_img.size, fill_color)
-        background.paste(pil_img, pil_img.split()[-1])  # omit transparency
-        pil_img = background
+    if cache is not None:
+        with timed(timings, "cache"):
+            cache.store(cache_key, output_img_path)
 
-    # Saving the new image in the same folder with a similar name.
-    pil_img.convert("RGB").save(output_img_path)
+
+@contextlib.contextmanager
+def timed(timings: dict[str, float] | None, stage: str) -> Iterator[None]:
+    """
+    Adds the time (in seconds) spent inside this context to "timings[stage]". Does nothing if
+    "timings" is None. StageTimings also measure the CPU time and memory of the stage.
+    """
+    if timings is None:
+        yield
+        return
+    if isinstance(timings, StageTimings):
+        with timings.measure(stage):
+            yield
+        return
+    start: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def open_rgb(image_path: str, max_size: int | None = None) -> Image.Image:
+    """
+    Decodes an image as RGB (without copying it if it already is RGB).
+    If "max_size" is passed in, the image is decoded at a reduced resolution, with its longest side
+    no bigger than "max_size". JPEGs are decoded straight at 1/2, 1/4 or 1/8 of their size (draft
+    mode), so the full resolution image is never in memory. Other images are reduced by an integer
+    factor right after decoding.
+    """
+    if max_size is not None and (
+        not isinstance(max_size, int) or isinstance(max_size, bool) or max_size <= 0
+    ):
+        raise ValueError("Expected max_size to be a positive int or None.")
+
+    img: Image.Image = Image.open(image_path)
+    if max_size is not None and (longest := max(img.size)) > max_size:
+        # Draft mode picks the smallest scale which still is at least as big as the requested size
+        # (it does nothing for other formats).
+        img.draft("RGB", tuple(-(-length * max_size // longest) for length in img.size))
+    img.load()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if max_size is not None and (factor := -(-max(img.size) // max_size)) > 1:
+        img = img.reduce(factor)
+    return img
+
+
+def open_full_resolution(
+    image_path: str,
+    img: Image.Image,
+    timings: dict[str, float] | None = None,
+) -> tuple[Image.Image, Image.Image | None]:
+    """
+    Given an image decoded by open_rgb (possibly at a reduced resolution), returns it at full
+    resolution and the reduced (working) one, or None if it already was at full resolution.
+    """
+    with Image.open(image_path) as header:
+        if header.size == img.size:
+            return img, None
+    with timed(timings, "decode"):
+        return open_rgb(image_path), img
+
+
+def composite(
+    img: Image.Image,
+    mask: Image.Image,
+    fill_color: tuple[int, int, int] | None = (255, 255, 255),
+    alpha_matting: bool | str = False,
+    timings: dict[str, float] | None = None,
+    working_img: Image.Image | None = None,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+) -> Image.Image:
+    """
+    Puts the foreground of an RGB image (given its predicted mask) over a "fill_color" background
+    (white by default). If "fill_color" is None, an RGBA image with a transparent background is
+    returned instead.
+    If a (smaller) "working_img" of the same image is passed in, alpha matting is done on it and
+    only the resulting alpha is upsampled (and refined) to the size of "img", whose pixels are the
+    foreground. This and images bigger than TILED_MIN_PIXELS go through composite_tiled.
+    "band_sizes" are passed to ModelSession.cutout.
+    """
+    refine: bool = False
+    if alpha_matting and working_img is not None and working_img.size != img.size:
+        with timed(timings, "matting"):
+            _, alpha = model_session.cutout(
+                working_img, mask, alpha_matting, band_sizes
+            )
+        foreground, refine = img, True
+    elif alpha_matting or img.width * img.height <= TILED_MIN_PIXELS:
+        with timed(timings, "matting" if alpha_matting else "cutout"):
+            foreground, alpha = model_session.cutout(
+                img, mask, alpha_matting, band_sizes
+            )
+    else:
+        # The mask is upsampled tile by tile.
+        foreground, alpha = img, mask
+
+    if refine or foreground.width * foreground.height > TILED_MIN_PIXELS:
+        return composite_tiled(foreground, alpha, fill_color, refine, timings=timings)
+
+    with timed(timings, "composite"):
+        if fill_color is None:
+            output = foreground.convert("RGBA")
+            output.putalpha(alpha)
+            return output
+        # The output is the only full frame allocated: the foreground is blended into it, in
+        # place and in a single pass (faster than blending numpy arrays, see benchmark.py).
+        output = Image.new("RGB", foreground.size, fill_color)
+        output.paste(foreground, (0, 0), alpha)
+        return output
+
+
+# Images with more pixels than this are refined and composited through memory-mapped files (see
+# composite_tiled), kept in TILED_BUFFER_DIR.
+TILED_MIN_PIXELS: int = 16 * 1024**2
+TILED_BUFFER_DIR: str = os.path.join(DEFAULT_CACHE_DIR, "tiles")
+
+# Side (in pixels) of the tiles used by composite_tiled and how much neighbouring tiles overlap
+# (their seams are blended over it).
+TILE_SIZE: int = 1024
+TILE_OVERLAP: int = 32
+
+# Window radius (in pixels), regularization and subsampling factor of the guided filter refining
+# upsampled alphas.
+GUIDED_FILTER_RADIUS: int = 8
+GUIDED_FILTER_EPS: float = 1e-4
+GUIDED_FILTER_SUBSAMPLE: int = 4
+
+
+def composite_tiled(
+    foreground: Image.Image,
+    alpha: Image.Image,
+    fill_color: tuple[int, int, int] | None = (255, 255, 255),
+    refine: bool = False,
+    tile_size: int = TILE_SIZE,
+    overlap: int = TILE_OVERLAP,
+    timings: dict[str, float] | None = None,
+    buffer_dir: str | None = None,
+) -> Image.Image:
+    """
+    Does the same as composite, given an alpha of any size (e.g. a predicted mask or an alpha
+    matted at the working resolution), but tile by tile:
+        1. The alpha is upsampled to the size of the foreground in overlapping tiles. If "refine"
+        is True, each tile is also refined by a guided filter (see guided_filter), using the
+        foreground as the guide, so the alpha follows its full resolution edges. Each tile fades in
+        over the parts of the previous tiles it overlaps, so there are no visible seams.
+        2. The foreground is blended over the background tile by tile.
+    Besides the foreground, only the full resolution alpha and the output are allocated, and they
+    are memory-mapped temporary files if the image has more than TILED_MIN_PIXELS. Their pages are
+    still part of the process' memory once they're touched, but they're backed by the files, so
+    they can be paged out to them instead of needing that much free memory. The files are created
+    in "buffer_dir" (TILED_BUFFER_DIR, in the app's cache folder, by default), not in the default
+    temporary folder, which is often in memory (tmpfs) where nothing can be paged out. Every other
+    buffer is proportional to "tile_size".
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    if not isinstance(tile_size, int) or isinstance(tile_size, bool) or tile_size <= 0:
+        raise ValueError("Expected tile_size to be a positive int.")
+    if (
+        not isinstance(overlap, int)
+        or isinstance(overlap, bool)
+        or not 0 <= overlap <= tile_size
+    ):
+        raise ValueError("Expected overlap to be an int between 0 and tile_size.")
+
+    width, height = foreground.size
+    channels: int = 3 if fill_color is not None else 4
+    on_disk: bool = width * height > TILED_MIN_PIXELS
+    if on_disk:
+        buffer_dir = buffer_dir or TILED_BUFFER_DIR
+        os.makedirs(buffer_dir, exist_ok=True)
+
+    def new_buffer(shape: tuple[int, ...]):
+        if not on_disk:
+            return np.empty(shape, dtype=np.uint8)
+        # Each call gets its own (already deleted) file, so concurrent calls never share one.
+        with tempfile.TemporaryFile(dir=buffer_dir) as file:
+            return np.memmap(file, dtype=np.uint8, mode="w+", shape=shape)
+
+    full_alpha = new_buffer((height, width))
+    # Extra context around each tile, so the guided filter is exact inside it. Its boxes start at
+    # multiples of the filter's subsampling factor, so every tile subsamples the same pixels.
+    margin: int = 0
+    step: int = 1
+    if refine:
+        margin = 2 * (GUIDED_FILTER_RADIUS + GUIDED_FILTER_SUBSAMPLE)
+        step = GUIDED_FILTER_SUBSAMPLE
+    scale_x, scale_y = alpha.width / width, alpha.height / height
+    ramp = (np.arange(overlap, dtype=np.float32) + 0.5) / max(overlap, 1)
+
+    with timed(timings, "upsample"):
+        for top in range(0, height, tile_size):
+            for left in range(0, width, tile_size):
+                right = min(left + tile_size + overlap, width)
+                bottom = min(top + tile_size + overlap, height)
+                box = (
+                    max(left - margin, 0) // step * step,
+                    max(top - margin, 0) // step * step,
+                    min(right + margin, width),
+                    min(bottom + margin, height),
+                )
+                tile = alpha.resize(
+                    (box[2] - box[0], box[3] - box[1]),
+                    Image.LANCZOS,
+                    box=(
+                        box[0] * scale_x,
+                        box[1] * scale_y,
+                        box[2] * scale_x,
+                        box[3] * scale_y,
+                    ),
+                )
+                tile_alpha = np.asarray(tile)
+                # A constant alpha stays constant, so only tiles with edges are refined.
+                if refine and tile_alpha.min() != tile_alpha.max():
+                    guide = np.asarray(foreground.crop(box).convert("L"), np.float32)
+                    refined = guided_filter(guide / 255, tile_alpha / 255)
+                    tile_alpha = np.clip(np.rint(refined * 255), 0, 255).astype(
+                        np.uint8
+                    )
+                tile_alpha = tile_alpha[
+                    top - box[1] : bottom - box[1], left - box[0] : right - box[0]
+                ]
+
+                # Seam blending: fading in over what the tiles above and to the left wrote
+                # (only those strips are blended, the rest is just copied).
+                target = full_alpha[top:bottom, left:right]
+                strip_rows: int = overlap if top > 0 else 0
+                strip_columns: int = overlap if left > 0 else 0
+                previous = (
+                    target.astype(np.float32) if strip_rows or strip_columns else None
+                )
+                target[...] = tile_alpha
+                if previous is not None:
+                    weight = np.ones(target.shape, dtype=np.float32)
+                    weight[:strip_rows] *= ramp[
+                        : min(strip_rows, target.shape[0]), None
+                    ]
+                    weight[:, :strip_columns] *= ramp[
+                        None, : min(strip_columns, target.shape[1])
+                    ]
+                    for strip in (
+                        np.s_[:strip_rows],
+                        np.s_[strip_rows:, :strip_columns],
+                    ):
+                        blended = tile_alpha[strip] * weight[strip]
+                        blended += previous[strip] * (1 - weight[strip])
+                        target[strip] = np.rint(blended)
+
+    output = new_buffer((height, width, channels))
+    with timed(timings, "composite"):
+        for top in range(0, height, tile_size):
+            for left in range(0, width, tile_size):
+                tile_box = (
+                    left,
+                    top,
+                    min(left + tile_size, width),
+                    min(top + tile_size, height),
+                )
+                tile_alpha = Image.fromarray(
+                    full_alpha[top : tile_box[3], left : tile_box[2]]
+                )
+                # Same as composite, but for a single tile.
+                if fill_color is None:
+                    tile_output = foreground.crop(tile_box).convert("RGBA")
+                    tile_output.putalpha(tile_alpha)
+                else:
+                    tile_output = Image.new("RGB", tile_alpha.size, fill_color)
+                    tile_output.paste(foreground.crop(tile_box), (0, 0), tile_alpha)
+                output[top : tile_box[3], left : tile_box[2]] = np.asarray(tile_output)
+
+    mode: str = "RGB" if fill_color is not None else "RGBA"
+    # No copy: the image reads straight from the output buffer.
+    return Image.frombuffer(mode, (width, height), output, "raw", mode, 0, 1)
+
+
+def guided_filter(
+    guide,
+    src,
+    radius: int = GUIDED_FILTER_RADIUS,
+    eps: float = GUIDED_FILTER_EPS,
+    subsample: int = GUIDED_FILTER_SUBSAMPLE,
+):
+    """
+    Edge-preserving smoothing of "src" (e.g. an upsampled alpha) following the edges of "guide"
+    (e.g. the grayscale image). Both are (height, width) float arrays with values from 0 to 1.
+    The filter's coefficients are computed "subsample" times smaller and upsampled back, which is
+    much faster and barely changes the result.
+    References: He et al., "Guided Image Filtering" (2010) and "Fast Guided Filter" (2015).
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np  # type: ignore[import]
+
+    height, width = guide.shape
+    # Repeating the last rows/columns, so the subsampling factor is exact.
+    padding = ((0, -height % subsample), (0, -width % subsample))
+    guide, src = np.pad(guide, padding, mode="edge"), np.pad(src, padding, mode="edge")
+    padded_size = (guide.shape[1], guide.shape[0])
+    small_size = (padded_size[0] // subsample, padded_size[1] // subsample)
+    radius = max(radius // subsample, 1)
+
+    def resize(values, size: tuple[int, int], resample: int):
+        resized = Image.fromarray(values.astype(np.float32), "F").resize(size, resample)
+        return np.asarray(resized, dtype=np.float64)
+
+    def box_mean(values):
+        return box_sum(values, radius) / (2 * radius + 1) ** 2
+
+    small_guide = resize(guide, small_size, Image.BOX)
+    small_src = resize(src, small_size, Image.BOX)
+    mean_guide = box_mean(small_guide)
+    mean_src = box_mean(small_src)
+    variance = box_mean(small_guide * small_guide) - mean_guide * mean_guide
+    covariance = box_mean(small_guide * small_src) - mean_guide * mean_src
+    scale = covariance / (variance + eps)
+    offset = mean_src - scale * mean_guide
+
+    output = resize(box_mean(scale), padded_size, Image.BILINEAR) * guide
+    output += resize(box_mean(offset), padded_size, Image.BILINEAR)
+    return output[:height, :width]
+
+
+def get_mask(
+    input_img_path: str,
+    img: Image.Image,
+    cache: ResultCache | None = None,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+) -> Image.Image:
+    """
+    Returns the predicted mask of an image ("img", decoded with open_rgb(input_img_path,
+    max_working_size)). If a cache is passed in, the mask is taken from it (or stored in it, as an
+    8 bit PNG), so the model only has to see each image once.
+    """
+    if cache is None:
+        return model_session.predict_mask(img)
+
+    mask_key: str = cache.key(input_img_path, mask_cache_settings(max_working_size))
+    if (mask_as_bytes := cache.load_data(mask_key)) is not None:
+        return Image.open(io.BytesIO(mask_as_bytes))
+
+    mask: Image.Image = model_session.predict_mask(img)
+    store_mask(cache, mask_key, mask)
+    return mask
+
+
+def store_mask(cache: ResultCache, mask_key: str, mask: Image.Image) -> None:
+    """
+    Stores a mask in the cache as an 8 bit PNG.
+    """
+    mask_as_bytes = io.BytesIO()
+    mask.save(mask_as_bytes, "PNG")
+    cache.store_data(mask_key, mask_as_bytes.getvalue())
+
+
+def mask_cache_settings(max_working_size: int | None = MAX_WORKING_SIZE) -> str:
+    """
+    Everything (other than the input image) that changes the predicted mask, as a string to be
+    used in cache keys.
+    """
+    return f"mask:{model_session.model_name}:max_working_size={max_working_size}"
+
+
+def recomposite(
+    image_path: str,
+    fill_color: tuple[int, int, int] | None = (255, 255, 255),
+    alpha_matting: bool | str = False,
+    cache: ResultCache | None = None,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+) -> str:
+    """
+    Creates a new output for an image which was already processed (with a cache), using its cached
+    mask instead of the model (and "band_sizes" for band matting, see rm_bg). The new background
+    is "fill_color", or transparent if it's None (then the output is always saved as a PNG).
+    Returns the path of the new output.
+    Raises a ValueError if there isn't a cached mask for this image (processed with the same
+    "max_working_size").
+    """
+    if cache is None:
+        cache = ResultCache()
+
+    input_img_path: str
+    output_img_path: str
+    input_img_path, output_img_path = process_img_path(image_path)
+
+    mask_as_bytes = cache.load_data(
+        cache.key(input_img_path, mask_cache_settings(max_working_size))
+    )
+    if mask_as_bytes is None:
+        raise ValueError("There isn't a cached mask for this image. Process it first.")
+
+    # Alpha matting is the only thing that needs the working (reduced) image.
+    working_img: Image.Image | None = None
+    if alpha_matting:
+        working_img = open_rgb(input_img_path, max_working_size)
+    output = composite(
+        open_rgb(input_img_path),
+        Image.open(io.BytesIO(mask_as_bytes)),
+        fill_color,
+        alpha_matting,
+        working_img=working_img,
+        band_sizes=band_sizes,
+    )
+    if fill_color is None:
+        output_img_path = output_img_path[: output_img_path.rfind(".")] + ".png"
+    output.save(output_img_path)
+    return output_img_path
+
+
+def cache_settings(
+    output_img_path: str,
+    alpha_matting: bool | str,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+) -> str:
+    """
+    Everything (other than the input image) that changes the result of rm_bg, as a string to be
+    used in cache keys.
+    """
+    settings: list[str] = [
+        model_session.model_name,
+        f"alpha_matting={matting_mode(alpha_matting)}",
+        f"max_working_size={max_working_size}",
+        output_img_path[output_img_path.rfind(".") + 1 :].lower(),
+    ]
+    # Only other band sizes are added, so results cached before they could be changed stay valid.
+    if matting_mode(alpha_matting) == "band" and band_sizes != MATTING_BAND_SIZES:
+        settings.append("band_sizes=" + ",".join(map(str, band_sizes)))
+    return ":".join(settings)
+
+
+def rm_bg_many(
+    image_paths: list[str],
+    # model_name: str = "u2net_human_seg",
+    alpha_matting: bool | str = True,
+    cache: ResultCache | None = None,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    recorder: NullRecorder | None = None,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+) -> list[tuple[str, BaseException]]:
+    """
+    This function does the same as rm_bg, but for many images at once: their masks are predicted
+    with a single forward pass through the model (see ModelSession.predict_masks). Only the images
+    which aren't in the cache (if one is passed in) go through the model. Images are kept in memory
+    at their working resolution and decoded at full resolution one at a time, for compositing.
+    Each image fails on its own: an image which can't be decoded is left out of the forward pass,
+    and one which can't be composited or saved doesn't stop the others.
+    If an enabled "recorder" is passed in, the stages of each image which didn't fail are recorded
+    (see rm_bg), with the forward pass split evenly between the images which went through it.
+    Returns a list of "(image_path, exception)" pairs for the images that failed.
+    """
+    failures: list[tuple[str, BaseException]] = []
+    all_timings: list[StageTimings | None] = [
+        recorder.timings() if recorder is not None and recorder.enabled else None
+        for _ in image_paths
+    ]
+    # The images left to do (not in the cache and decoded), with their own lists of paths, timings,
+    # cache keys and cached masks (None if they go through the model).
+    to_do: list[str] = []
+    processed_paths: list[tuple[str, str]] = []
+    image_timings: list[StageTimings | None] = []
+    cache_keys: list[str] = []
+    mask_keys: list[str] = []
+    images: list[Image.Image] = []
+    masks: list[Image.Image | None] = []
+    for image_path, timings in zip(image_paths, all_timings):
+        try:
+            input_img_path, output_img_path = process_img_path(image_path)
+            cache_key: str = ""
+            mask_key: str = ""
+            if cache is not None:
+                with timed(timings, "cache"):
+                    cache_key = cache.key(
+                        input_img_path,
+                        cache_settings(
+                            output_img_path, alpha_matting, max_working_size, band_sizes
+                        ),
+                    )
+                    if cache.restore(cache_key, output_img_path):
+                        continue
+            with timed(timings, "decode"):
+                img: Image.Image = open_rgb(input_img_path, max_working_size)
+            mask: Image.Image | None = None
+            if cache is not None:
+                with timed(timings, "inference"):
+                    mask_key = cache.key(
+                        input_img_path, mask_cache_settings(max_working_size)
+                    )
+                    if (mask_as_bytes := cache.load_data(mask_key)) is not None:
+                        mask = Image.open(io.BytesIO(mask_as_bytes))
+        except Exception as error:  # pylint: disable=broad-except
+            failures.append((image_path, error))
+            continue
+        to_do.append(image_path)
+        processed_paths.append((input_img_path, output_img_path))
+        image_timings.append(timings)
+        cache_keys.append(cache_key)
+        mask_keys.append(mask_key)
+        images.append(img)
+        masks.append(mask)
+
+    # Only the images without a cached mask go through the model.
+    to_predict: list[int] = [pos for pos, mask in enumerate(masks) if mask is None]
+    if to_predict:
+        batch_timings: StageTimings | None = (
+            recorder.timings() if recorder is not None and recorder.enabled else None
+        )
+        try:
+            with timed(batch_timings, "inference"):
+                predicted = model_session.predict_masks(
+                    [images[pos] for pos in to_predict]
+                )
+        except Exception as error:  # pylint: disable=broad-except
+            # Every image of the forward pass failed with it.
+            predicted = [None] * len(to_predict)
+            failures.extend((to_do[pos], error) for pos in to_predict)
+        for pos, mask in zip(to_predict, predicted):
+            masks[pos] = mask
+            if cache is not None and mask is not None:
+                with timed(image_timings[pos], "inference"):
+                    store_mask(cache, mask_keys[pos], mask)
+            if batch_timings is not None:
+                image_timings[pos].add(  # type: ignore[union-attr]
+                    batch_timings, 1 / len(to_predict)
+                )
+
+    for pos, (img, mask, (input_img_path, output_img_path)) in enumerate(
+        zip(images, masks, processed_paths)
+    ):
+        if mask is None:
+            continue
+        timings = image_timings[pos]
+        try:
+            img, working_img = open_full_resolution(input_img_path, img, timings)
+            output = composite(
+                img,
+                mask,
+                alpha_matting=alpha_matting,
+                timings=timings,
+                working_img=working_img,
+                band_sizes=band_sizes,
+            )
+            with timed(timings, "save"):
+                output.save(output_img_path)
+            if cache is not None:
+                with timed(timings, "cache"):
+                    cache.store(cache_keys[pos], output_img_path)
+        except Exception as error:  # pylint: disable=broad-except
+            failures.append((to_do[pos], error))
+
+    if recorder is not None and recorder.enabled:
+        failed: set[str] = {image_path for image_path, _ in failures}
+        for image_path, timings in zip(image_paths, all_timings):
+            if image_path in failed:
+                continue
+            # "total" is the sum of the stages, as images share the batch.
+            timings["total"] = sum(timings.values())  # type: ignore[union-attr]
+            timings.cpu["total"] = sum(timings.cpu.values())  # type: ignore[union-attr]
+            recorder.record(image_path, timings)  # type: ignore[arg-type]
+    return failures
+
+
+class ChunkError(Exception):
+    """
+    Raised by rm_bg_chunk when some images of a chunk failed. Its "failures" are the
+    "(image_path, exception)" pairs of those images (the other ones were processed).
+    """
+
+    def __init__(self, failures: list[tuple[str, BaseException]]):
+        super().__init__(failures)
+        self.failures: list[tuple[str, BaseException]] = failures
+
+
+def rm_bg_chunk(image_paths: list[str], *args) -> None:
+    """
+    Calls "rm_bg_many(image_paths, *args)" and raises a ChunkError if any of its images failed, so
+    a pool of workers (see scheduler.BatchScheduler) tells which ones did.
+    """
+    if failures := rm_bg_many(image_paths, *args):
+        raise ChunkError(failures)
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Lazily splits an iterable into lists of "size" items (the last one might be smaller).
+    """
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+# Rough memory used by rm_bg (see estimate_rm_bg_memory): a forward pass through the model, bytes
+# per pixel of alpha matting at the working resolution ("band" and "full", which rembg runs on at
+# most FULL_MATTING_MAX_PIXELS) and bytes per full resolution pixel of compositing (the image, its
+# alpha and the output). Each worker process also loads its own copy of the model (MODEL_BYTES, see
+# batch_memory_budget).
+INFERENCE_BYTES: int = 128 * 1024**2
+MATTING_BYTES_PER_PIXEL: dict[str, int] = {"band": 16, "full": 200}
+FULL_MATTING_MAX_PIXELS: int = 1000**2
+COMPOSITE_BYTES_PER_PIXEL: int = 7
+MODEL_BYTES: int = 256 * 1024**2
+
+
+def image_size(image_path: str) -> tuple[int, int]:
+    """
+    Width and height of an image, read from its header (its pixels aren't decoded). Images whose
+    header can't be read are (0, 0).
+    """
+    try:
+        with Image.open(image_path) as img:
+            return img.size
+    except (OSError, ValueError):
+        return 0, 0
+
+
+def estimate_rm_bg_memory(
+    image_path: str,
+    alpha_matting: bool | str = True,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    size: tuple[int, int] | None = None,
+) -> int:
+    """
+    Estimates the peak memory (in bytes) rm_bg needs for an image, from its dimensions ("size", or
+    read from its header, see image_size). It counts the working resolution image and its alpha
+    matting, a forward pass through the model and the full resolution image, alpha and output (see
+    composite and composite_tiled). Images whose header can't be read are estimated as 0 bytes
+    (rm_bg will fail on them right away).
+    """
+    width, height = image_size(image_path) if size is None else size
+    pixels: int = width * height
+    if not pixels:
+        return 0
+    working_pixels: int = pixels
+    if max_working_size is not None and max(width, height) > max_working_size:
+        working_pixels = int(pixels * (max_working_size / max(width, height)) ** 2)
+
+    estimate: int = INFERENCE_BYTES + 3 * working_pixels
+    mode: str | None = matting_mode(alpha_matting)
+    if mode == "band":
+        estimate += MATTING_BYTES_PER_PIXEL["band"] * working_pixels
+    if mode == "full":
+        estimate += MATTING_BYTES_PER_PIXEL["full"] * min(
+            working_pixels, FULL_MATTING_MAX_PIXELS
+        )
+
+    # Bigger images keep their alpha and output in memory-mapped files (see composite_tiled), but
+    # their pages are written to and stay resident until the kernel writes them back, so they're
+    # counted the same.
+    estimate += COMPOSITE_BYTES_PER_PIXEL * pixels
+    return estimate
+
+
+def batch_memory_budget(
+    memory_budget: int | None, backend: str = "thread", workers: int | None = None
+) -> int | None:
+    """
+    Part of "memory_budget" (see default_memory_budget) left for the images of a batch. With the
+    "process" backend, each of the "workers" processes (one per core if None) loads its own copy of
+    the model (MODEL_BYTES) whatever the images it's given, so those copies are taken out of it
+    (leaving at least 1 byte, so images still run one at a time). Threads share this process'
+    model, so the budget is left as it is.
+    """
+    if memory_budget is None or backend != "process":
+        return memory_budget
+    return max(1, memory_budget - (workers or os.cpu_count() or 1) * MODEL_BYTES)
+
+
+def default_memory_budget(fraction: float = 0.5) -> int | None:
+    """
+    Memory budget for batches: "fraction" of the computer's physical memory, or None (no budget)
+    if it can't be told (e.g. on Windows).
+    """
+    try:
+        total: int = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+    return int(total * fraction) if total > 0 else None
+
+
+# Environment variables limiting the threads of the native libraries under the model (OpenMP,
+# BLAS and onnxruntime's OpenMP builds). They're read when those libraries are loaded.
+THREAD_LIMIT_VARIABLES: tuple[str, ...] = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+)
+
+
+def threads_per_worker(workers: int | None = None) -> int:
+    """
+    Threads each of "workers" processes (defaults to the CPU count) should use for each operation,
+    so together they use every core once instead of each of them using all of them.
+    """
+    cpus: int = os.cpu_count() or 1
+    return max(1, cpus // (workers or cpus))
+
+
+def init_worker(threads: int | None = None) -> None:
+    """
+    Initializer for batch workers. It loads and warms up the model session once per worker process
+    (or once for all threads), so the jobs themselves don't pay for it.
+    If "threads" is passed in (process workers, see threads_per_worker), the model's runtime is
+    limited to that many threads per operation before it's loaded.
+    """
+    if threads is not None:
+        for variable in THREAD_LIMIT_VARIABLES:
+            os.environ[variable] = str(threads)
+        if importlib.util.find_spec("torch") is not None:
+            # pylint: disable=import-outside-toplevel
+            import torch  # type: ignore[import]
+
+            torch.set_num_threads(threads)
+    model_session.warm_up()
+
+
+def rm_bg_batch(
+    image_paths: Iterable[str],
+    alpha_matting: bool | str = True,
+    *,
+    backend: str = "thread",
+    workers: int | None = None,
+    max_in_flight: int | None = None,
+    batch_size: int = 1,
+    on_done: Callable[[object, BaseException | None], None] | None = None,
+    cache: ResultCache | None = None,
+    max_working_size: int | None = MAX_WORKING_SIZE,
+    recorder: NullRecorder | None = None,
+    memory_budget: int | None = None,
+    order: str = "fifo",
+    makespans: dict[str, float] | None = None,
+    band_sizes: tuple[int, int, int] = MATTING_BAND_SIZES,
+) -> list[tuple[object, BaseException]]:
+    """
+    This function will remove the background of every image in "image_paths" using a pool of
+    workers (see scheduler.BatchScheduler). The backend can be "thread" or "process".
+    If "batch_size" is bigger than 1, each job predicts the masks of that many images with a
+    single forward pass (see rm_bg_many), and its images still fail one by one.
+    If "on_done" is passed in, "on_done(image_path, exception)" is called as soon as each image is
+    done (exception being None if it didn't fail).
+    If a cache is passed in, images which were already processed aren't processed again.
+    Masks are predicted at "max_working_size" and band matting uses "band_sizes" (see rm_bg).
+    If an enabled "recorder" is passed in, the stages of each image are recorded by it (see rm_bg).
+    Recorders are shared by the workers, so this only works with the "thread" backend.
+    If a "memory_budget" (in bytes, see default_memory_budget) is passed in, images are only
+    submitted to the workers while their estimated memory (see estimate_rm_bg_memory) fits in it.
+    Images are processed in the given order ("fifo") or biggest first ("longest", by the pixel
+    count in their headers), so the last images to be processed are small ones and workers finish
+    at about the same time. Both need the whole list of images (not a lazy iterable).
+    If a "makespans" dict is passed in, it's filled with the seconds the batch took ("elapsed") and
+    how long it would take ("fifo" and "longest", see scheduler.makespan) with the time each job
+    actually took, processed in the given order and biggest first (ignoring the memory budget).
+    Returns a list of "(image_path, exception)" pairs for the images that failed.
+    """
+    if (
+        not isinstance(batch_size, int)
+        or isinstance(batch_size, bool)
+        or batch_size <= 0
+    ):
+        raise ValueError("Expected batch_size to be a positive int.")
+    matting_mode(alpha_matting)
+    check_band_sizes(band_sizes)
+    if backend != "thread" and recorder is not None and recorder.enabled:
+        raise ValueError("Stages can only be recorded with the thread backend.")
+    if order not in ("fifo", "longest"):
+        raise ValueError('Expected order to be "fifo" or "longest".')
+    # pylint: disable=import-outside-toplevel
+    from scheduler import BatchScheduler, longest_first  # type: ignore[import]
+
+    # Sizes read from the images' headers, shared by the ordering and the memory estimates.
+    sizes: dict[str, tuple[int, int]] = {}
+
+    def pixels(image_path: str) -> int:
+        if image_path not in sizes:
+            sizes[image_path] = image_size(image_path)
+        return sizes[image_path][0] * sizes[image_path][1]
+
+    ordered_paths: Iterable[str] = image_paths
+    if order == "longest" or makespans is not None:
+        image_paths = list(image_paths)
+        ordered_paths = (
+            longest_first(image_paths, pixels) if order == "longest" else image_paths
+        )
+
+    initializer: Callable | None = init_worker
+    initargs: tuple = ()
+    if backend == "thread":
+        # Threads share this process' modules, so initializing it once here is enough.
+        init_worker()
+        initializer = None
+    else:
+        # Otherwise each process would use every core for each operation (N processes x N threads).
+        initargs = (threads_per_worker(workers),)
+
+    def memory_estimate(item: object) -> int:
+        # A chunk's images are in memory (at their working resolution) at the same time.
+        return sum(
+            estimate_rm_bg_memory(
+                image_path, alpha_matting, max_working_size, sizes.get(image_path)
+            )
+            for image_path in (item if isinstance(item, list) else [item])
+        )
+
+    scheduler = BatchScheduler(
+        workers=workers,
+        max_in_flight=max_in_flight,
+        backend=backend,
+        initializer=initializer,
+        initargs=initargs,
+        memory_budget=batch_memory_budget(memory_budget, backend, workers),
+        memory_estimate=memory_estimate,
+    )
+    durations: list[tuple[object, float]] | None = None if makespans is None else []
+    start: float = time.perf_counter()
+    if batch_size == 1:
+        failures: list[tuple[object, BaseException]] = scheduler.run(
+            rm_bg,
+            ordered_paths,
+            alpha_matting,
+            cache,
+            max_working_size,
+            None,
+            recorder,
+            band_sizes,
+            on_done=on_done,
+            durations=durations,
+        )
+    else:
+
+        def chunk_failures(
+            chunk: object, exception: BaseException | None
+        ) -> list[tuple[str, BaseException]]:
+            if exception is None:
+                return []
+            if isinstance(exception, ChunkError):
+                return exception.failures
+            # Otherwise the whole job failed (e.g. its worker process died), so every image did.
+            return [(image_path, exception) for image_path in chunk]  # type: ignore[attr-defined]
+
+        def on_chunk_done(chunk: object, exception: BaseException | None) -> None:
+            if on_done is not None:
+                failed: dict[str, BaseException] = dict(
+                    chunk_failures(chunk, exception)
+                )
+                for image_path in chunk:  # type: ignore[attr-defined]
+                    on_done(image_path, failed.get(image_path))
+
+        failures = [
+            failure
+            for chunk, exception in scheduler.run(
+                rm_bg_chunk,
+                chunked(ordered_paths, batch_size),
+                alpha_matting,
+                cache,
+                max_working_size,
+                recorder,
+                band_sizes,
+                on_done=on_chunk_done,
+                durations=durations,
+            )
+            for failure in chunk_failures(chunk, exception)
+        ]
+
+    if makespans is not None:
+        makespans["elapsed"] = time.perf_counter() - start
+        makespans.update(
+            batch_makespans(
+                image_paths,  # type: ignore[arg-type]
+                durations,  # type: ignore[arg-type]
+                scheduler.workers,
+                batch_size,
+                pixels,
+            )
+        )
+    return failures
+
+
+def batch_makespans(
+    image_paths: list[str],
+    durations: list[tuple[object, float]],
+    workers: int,
+    batch_size: int,
+    cost: Callable[[str], float],
+) -> dict[str, float]:
+    """
+    Given the seconds each job of a batch took ("durations", see BatchScheduler.run), returns how
+    long the batch would take (see scheduler.makespan) with its images in the given order ("fifo")
+    and biggest first ("longest", by "cost", e.g. their pixel count) in chunks of "batch_size". A
+    chunk's seconds are split evenly between its images and failed images count as 0 seconds.
+    """
+    # pylint: disable=import-outside-toplevel
+    from scheduler import longest_first, makespan  # type: ignore[import]
+
+    seconds: dict[str, float] = {}
+    for item, duration in durations:
+        chunk: list = item if isinstance(item, list) else [item]
+        for image_path in chunk:
+            seconds[image_path] = duration / len(chunk)
+
+    def simulate(ordered_paths: list[str]) -> float:
+        return makespan(
+            (
+                sum(seconds.get(image_path, 0.0) for image_path in chunk)
+                for chunk in chunked(ordered_paths, batch_size)
+            ),
+            workers,
+        )
+
+    return {
+        "fifo": simulate(image_paths),
+        "longest": simulate(longest_first(image_paths, cost)),
+    }
 
 
 def check_image_type(image_path: str) -> tuple[int, str]:
@@ -186,12 +1991,39 @@ def model_exists(
     return os.path.exists(model_path)
 
 
+def verify_model(
+    model_path: str = os.path.expanduser(
+        os.path.join("~", ".u2net", "u2net_human_seg.pth")
+    ),
+    sha256: str | None = None,
+) -> tuple[bool, str]:
+    """
+    Checks the model's integrity (not only that it exists, see model_check.verify_file) against
+    "sha256" (defaults to MODEL_SHA256) or the digest saved when it was downloaded. Returns whether
+    it's verified and a message saying why. It's hashed only the first time (or after it changes).
+    """
+    # pylint: disable=import-outside-toplevel
+    import model_check  # type: ignore[import]
+
+    return model_check.verify_file(model_path, sha256 or MODEL_SHA256)
+
+
+# Where the model is downloaded from (a google drive file, see download_model).
+MODEL_URL: str = "https://docs.google.com/uc?export=download"
+# SHA-256 the downloaded model must match. Upstream doesn't publish it, so it isn't pinned: set it
+# (e.g. to the digest saved in "~/.u2net/u2net_human_seg.pth.sha256") to verify every download.
+MODEL_SHA256: str | None = None
+
+
 def download_model(
     model_path: str = os.path.expanduser(
         os.path.join("~", ".u2net", "u2net_human_seg.pth")
     ),
     file_id_to_dowload_model_from: str = "1-Yg0cxgrNhHP-016FPdp902BR-kSsA4P",
-    parent_window=None,
+    *,
+    on_progress: Callable[[int, int | None], None] | None = None,
+    cancel: threading.Event | None = None,
+    sha256: str | None = None,
 ) -> None:
     """
     Expects a "model_path" to check if the file exists.
@@ -199,88 +2031,52 @@ def download_model(
     If the file doesn't exist it will download from "file_id_to_dowload_model_from" and save it.
     The file ID is a google drive ID.
 
-    If a parent_window is passed in, it will open a message box over it with more info.
+    The download is done in parallel chunks, resumes from a previous (interrupted or cancelled)
+    one and the model is only moved to "model_path" once it's complete (and matches "sha256", which
+    defaults to MODEL_SHA256, if there's one), see model_download.download. This blocks until it's
+    done, so the GUI calls it from another thread, with "on_progress(downloaded_bytes,
+    total_bytes)" reporting to it.
+    Raises model_download.DownloadError if it fails.
     """
+    # pylint: disable=import-outside-toplevel
+    import model_download  # type: ignore[import]
 
-    def model_from_google_drive(file_id: str, destination: str) -> None:
-        """
-        Expects a (google drive) file ID and a destination to save it.
-        Reference: https://stackoverflow.com/a/39225039
-        """
-        url: str = "https://docs.google.com/uc?export=download"
-
-        session = requests.Session()
-        response = session.get(url, params={"id": file_id}, stream=True)
-        response = session.get(url, params={"id": file_id, "confirm": "t"}, stream=True)
-
-        chunk_size: int = 32768
-        with open(destination, "wb") as file:
-            for chunk in response.iter_content(chunk_size):
-                if chunk:  # filters out keep-alive new chunks
-                    file.write(chunk)
-
-    if model_exists(model_path):
-        message: str = "Model has already been downloaded."
-        if parent_window is not None:
-            messagebox.showinfo(
-                parent=parent_window,
-                title="Done!",
-                message=message,
-            )
-        else:
-            print(message)
+    sha256 = sha256 or MODEL_SHA256
+    # A broken model is downloaded again (and replaced once the new one is complete).
+    if model_exists(model_path) and verify_model(model_path, sha256)[0]:
+        print("Model has already been downloaded.")
         return
 
-    model_path = model_path.replace("\\", "/")
-    pos: int = model_path.rfind("/")
-    folder_path: str = model_path[:pos]
-
-    if not os.path.exists(folder_path):
-        os.mkdir(folder_path)
-
-    download_model_thread = threading.Thread(
-        target=model_from_google_drive,
-        args=(file_id_to_dowload_model_from, model_path),
-    )
-    download_model_thread.start()
-
-    message = (
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    print(
         "Downloading can take a few minutes depending on your internet connection."
         + " Please be patient!"
     )
-    if parent_window is not None:
-        messagebox.showinfo(
-            parent=parent_window,
-            title="Download has started.",
-            message=message
-            + " The program will purposefully stop responding until download is complete. "
-            + "Another pop up message will show up when it's done.",
-        )
-    else:
-        print(message)
-
-    download_model_thread.join()
-
-    message = "Download finished successfully!"
-    if parent_window is not None:
-        messagebox.showinfo(
-            parent=parent_window,
-            title="Done.",
-            message=message,
-        )
-    else:
-        print(message)
+    model_download.download(
+        MODEL_URL,
+        model_path,
+        # Reference: https://stackoverflow.com/a/39225039
+        params={"id": file_id_to_dowload_model_from, "confirm": "t"},
+        sha256=sha256,
+        on_progress=on_progress,
+        cancel=cancel,
+    )
+    print("Download finished successfully!")
 
 
 functions: dict[str, Callable] = {
     "load_img": load_img,
+    "load_thumbnail": load_thumbnail,
     "rm_bg": rm_bg,
     "model_exists": model_exists,
+    "verify_model": verify_model,
+    "default_memory_budget": default_memory_budget,
     "download_model": download_model,
+    "rm_bg_batch": rm_bg_batch,
+    "preloader": preloader,
+    "result_cache": ResultCache,
 }
 
 
 if __name__ == "__main__":
-    imp_th = threading.Thread(target=importer)
-    imp_th.start()
     raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""
+This module implements the tracking of the app's loading stages, which run in background threads.
+"""
+
+import contextlib
+import threading
+from typing import Iterable, Iterator
+
+# States of a stage. A stage is finished once it's done, skipped or failed.
+PENDING: str = "pending"
+RUNNING: str = "running"
+DONE: str = "done"
+SKIPPED: str = "skipped"
+FAILED: str = "failed"
+FINISHED: tuple[str, str, str] = (DONE, SKIPPED, FAILED)
+
+
+class Readiness:
+    """
+    Ordered stages of loading (e.g. "Importing rembg", "Loading the model") and their states.
+    Background threads report their progress through it, while the GUI polls it (it never
+    blocks) to show which stage is running and to know when what it needs is ready. Waiting for
+    stages (see wait) is also possible from other threads.
+    """
+
+    def __init__(self, stages: Iterable[str]):
+        self.stages: tuple[str, ...] = tuple(stages)
+        if not self.stages or len(set(self.stages)) != len(self.stages):
+            raise ValueError("Expected at least one stage and no repeated stages.")
+
+        self._states: dict[str, str] = dict.fromkeys(self.stages, PENDING)
+        self._errors: dict[str, BaseException] = {}
+        self._changed = threading.Condition()
+
+    def state(self, stage: str) -> str:
+        """
+        State of "stage": "pending", "running", "done", "skipped" or "failed".
+        """
+        return self._states[stage]
+
+    def error(self, stage: str) -> BaseException | None:
+        """
+        Exception which made "stage" fail (None if it didn't fail).
+        """
+        return self._errors.get(stage)
+
+    def start(self, stage: str) -> None:
+        """
+        Marks "stage" as running.
+        """
+        self._set(stage, RUNNING)
+
+    def finish(self, stage: str) -> None:
+        """
+        Marks "stage" as done.
+        """
+        self._set(stage, DONE)
+
+    def fail(self, stage: str, error: BaseException) -> None:
+        """
+        Marks "stage" as failed because of "error".
+        """
+        self._set(stage, FAILED, error)
+
+    def skip(self, *stages: str) -> None:
+        """
+        Marks the given stages which didn't start yet as skipped (e.g. the model can't be loaded
+        because it wasn't downloaded yet).
+        """
+        with self._changed:
+            for stage in stages:
+                if self._states[stage] == PENDING:
+                    self._states[stage] = SKIPPED
+            self._changed.notify_all()
+
+    @contextlib.contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """
+        Marks "stage" as running while the "with" block runs, then as done (or as failed, if it
+        raises, in which case the exception is raised again).
+        """
+        self.start(stage)
+        try:
+            yield
+        except BaseException as error:
+            self.fail(stage, error)
+            raise
+        self.finish(stage)
+
+    def is_ready(self, stages: Iterable[str] | None = None) -> bool:
+        """
+        Whether every one of "stages" (defaults to all of them) is finished.
+        """
+        return all(
+            self._states[stage] in FINISHED
+            for stage in (self.stages if stages is None else stages)
+        )
+
+    def progress(self) -> float:
+        """
+        Fraction (from 0 to 1) of finished stages.
+        """
+        return sum(state in FINISHED for state in self._states.values()) / len(
+            self.stages
+        )
+
+    def current(self) -> str | None:
+        """
+        First stage (in order) which isn't finished, or None if all of them are.
+        """
+        for stage in self.stages:
+            if self._states[stage] not in FINISHED:
+                return stage
+        return None
+
+    def wait(
+        self, stages: Iterable[str] | None = None, timeout: float | None = None
+    ) -> bool:
+        """
+        Blocks until every one of "stages" (defaults to all of them) is finished or "timeout"
+        seconds passed. Returns whether they are finished. Never call it from the Tk thread.
+        """
+        stages = tuple(self.stages if stages is None else stages)
+        with self._changed:
+            return self._changed.wait_for(lambda: self.is_ready(stages), timeout)
+
+    def _set(self, stage: str, state: str, error: BaseException | None = None) -> None:
+        with self._changed:
+            if stage not in self._states:
+                raise ValueError(f"Unknown stage: {stage}")
+            if error is not None:
+                self._errors[stage] = error
+            self._states[stage] = state
+            self._changed.notify_all()
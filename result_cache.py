@@ -0,0 +1,227 @@
+"""
+This module implements the on disk cache of background removal results.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable
+
+DEFAULT_CACHE_DIR: str = os.path.expanduser(os.path.join("~", ".cache", "rm_bg"))
+
+
+class ResultCache:
+    """
+    Persistent cache of rm_bg outputs (and predicted masks), so unchanged images are never
+    processed twice.
+
+    Results are keyed by a (blake2b) hash of the input file's bytes plus the settings used to
+    process it (model name, alpha matting, output type...). Files are only hashed when their size
+    or modification time changed since the last time they were seen, so re-runs over big folders
+    mostly cost a "stat" per image. Other data, like predicted masks, can be stored as bytes
+    (see store_data/load_data) under keys with other settings. The cache is capped at "max_bytes":
+    the least recently used results are evicted first.
+
+    It can be shared by threads and processes: only its settings are pickled and each thread opens
+    its own connection to the (sqlite) index.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = 2 * 1024**3,
+    ):
+        if (
+            not isinstance(max_bytes, int)
+            or isinstance(max_bytes, bool)
+            or max_bytes <= 0
+        ):
+            raise ValueError("Expected max_bytes to be a positive int.")
+
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict:
+        return {"cache_dir": self.cache_dir, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)  # type: ignore[misc]  # pylint: disable=unnecessary-dunder-call
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        """
+        The sqlite connection of the current thread (it's created on first use).
+        """
+        if getattr(self._local, "connection", None) is None:
+            os.makedirs(os.path.join(self.cache_dir, "results"), exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.cache_dir, "index.sqlite3"),
+                timeout=60,
+                isolation_level=None,
+            )
+            connection.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY, size INTEGER, last_used REAL
+                );
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, value TEXT
+                );
+                CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+                """)
+            self._local.connection = connection
+        return self._local.connection
+
+    def _result_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "results", key[:2], key)
+
+    def _remembered(self, table_key: str, path: str) -> str | None:
+        """
+        Returns the value remembered for a file if it didn't change since (or None).
+        """
+        stat = os.stat(path)
+        row = self._connection.execute(
+            "SELECT value FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (table_key + os.path.abspath(path), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _remember(self, table_key: str, path: str, value: str) -> None:
+        """
+        Remembers a value for a file, as long as its size and modification time don't change.
+        """
+        stat = os.stat(path)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (table_key + os.path.abspath(path), stat.st_size, stat.st_mtime_ns, value),
+        )
+
+    def key(self, input_path: str, settings: str) -> str:
+        """
+        Returns the cache key of an input image processed with the given settings.
+        """
+        if (digest := self._remembered("input:", input_path)) is None:
+            hasher = hashlib.blake2b(digest_size=20)
+            with open(input_path, "rb") as file:
+                while chunk := file.read(1024 * 1024):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self._remember("input:", input_path, digest)
+
+        return hashlib.blake2b(
+            f"{digest}:{settings}".encode(), digest_size=20
+        ).hexdigest()
+
+    def _touch(self, key: str) -> bool:
+        """
+        Marks the entry stored under "key" as used right now. Returns False if there isn't one.
+        """
+        return (
+            self._connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            ).rowcount
+            > 0
+        )
+
+    def restore(self, key: str, output_path: str) -> bool:
+        """
+        Copies the result stored under "key" to "output_path". Returns False if there isn't one.
+        If "output_path" already is that result (it didn't change since), nothing is copied.
+        """
+        if not self._touch(key):
+            return False
+
+        if (
+            os.path.exists(output_path)
+            and self._remembered("output:", output_path) == key
+        ):
+            return True
+        try:
+            shutil.copyfile(self._result_path(key), output_path)
+        except FileNotFoundError:
+            # Evicted (by someone else) in the meantime.
+            return False
+        self._remember("output:", output_path, key)
+        return True
+
+    def load_data(self, key: str) -> bytes | None:
+        """
+        Returns the data stored under "key" (see store_data), or None if there isn't any.
+        """
+        if not self._touch(key):
+            return None
+        try:
+            with open(self._result_path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _store(self, key: str, write: Callable[[str], None]) -> None:
+        """
+        Calls "write(path)" to create the entry of "key" and evicts the least recently used
+        entries if the cache gets bigger than "max_bytes".
+        """
+        result_path: str = self._result_path(key)
+        os.makedirs(os.path.dirname(result_path), exist_ok=True)
+
+        # Writing to a temporary file first, so no one ever sees a partial entry.
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(result_path))
+        os.close(file_descriptor)
+        write(temp_path)
+        os.replace(temp_path, result_path)
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+            (key, os.path.getsize(result_path), time.time()),
+        )
+        self.evict()
+
+    def store(self, key: str, output_path: str) -> None:
+        """
+        Stores a copy of the result saved at "output_path" under "key".
+        """
+        self._store(key, lambda temp_path: shutil.copyfile(output_path, temp_path))
+        self._remember("output:", output_path, key)
+
+    def store_data(self, key: str, data: bytes) -> None:
+        """
+        Stores "data" (e.g. an encoded mask) under "key".
+        """
+
+        def write(temp_path: str) -> None:
+            with open(temp_path, "wb") as file:
+                file.write(data)
+
+        self._store(key, write)
+
+    def size(self) -> int:
+        """
+        Total size (in bytes) of the stored results.
+        """
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+    def evict(self) -> None:
+        """
+        Deletes the least recently used results until the cache fits in "max_bytes".
+        """
+        total: int = self.size()
+        while total > self.max_bytes:
+            row = self._connection.execute(
+                "SELECT key, size FROM results ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            key, size = row
+            self._connection.execute("DELETE FROM results WHERE key = ?", (key,))
+            try:
+                os.remove(self._result_path(key))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,215 @@
+"""
+This module implements the batch scheduler used for removing the background of many images.
+"""
+
+import functools
+import heapq
+import multiprocessing
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Callable, Iterable, Iterator
+
+
+class BatchScheduler:
+    """
+    Runs a function over a (possibly huge) amount of items using a fixed amount of workers.
+
+    Items are pulled lazily from the given iterable and at most "max_in_flight" of them are
+    submitted to the executor at any given time. Only "workers" of them run at once, so peak
+    memory depends on the amount of workers and not on the size of the batch.
+
+    The backend can be either "thread" or "process". Threads share the already imported modules,
+    while processes escape the GIL for the pure python/PIL parts of the work. If an "initializer"
+    is passed in, each worker calls "initializer(*initargs)" once before running any job (useful
+    for importing rembg and loading the model only once per process).
+
+    If a "memory_budget" (in bytes) is passed in, "memory_estimate(item)" estimates how much memory
+    each job needs and jobs are only submitted while the estimates of the jobs in flight (running
+    or queued) fit in the budget. Small jobs fill every worker, while big ones run with fewer
+    others (a job bigger than the whole budget runs alone). Items are still submitted in order.
+
+    Every job goes through a single queue shared by the workers: a worker takes the next job as
+    soon as it's free, so none of them sits idle while there's work left. Submitting the longest
+    jobs first (see longest_first) keeps a big job from being the last one, running alone.
+    """
+
+    backends: tuple[str, str] = ("thread", "process")
+
+    def __init__(
+        self,
+        *,
+        workers: int | None = None,
+        max_in_flight: int | None = None,
+        backend: str = "thread",
+        initializer: Callable | None = None,
+        initargs: tuple = (),
+        memory_budget: int | None = None,
+        memory_estimate: Callable[[object], int] | None = None,
+    ):
+        if backend not in self.backends:
+            raise ValueError(f"Expected backend to be one of {self.backends}.")
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if not isinstance(workers, int) or isinstance(workers, bool) or workers <= 0:
+            raise ValueError("Expected workers to be a positive int or None.")
+
+        if max_in_flight is None:
+            max_in_flight = 2 * workers
+        if (
+            not isinstance(max_in_flight, int)
+            or isinstance(max_in_flight, bool)
+            or max_in_flight < workers
+        ):
+            raise ValueError(
+                "Expected max_in_flight to be an int bigger or equal to workers, or None."
+            )
+
+        if memory_budget is not None and (
+            not isinstance(memory_budget, int)
+            or isinstance(memory_budget, bool)
+            or memory_budget <= 0
+        ):
+            raise ValueError("Expected memory_budget to be a positive int or None.")
+        if memory_budget is not None and memory_estimate is None:
+            raise ValueError("Expected a memory_estimate to go with the memory_budget.")
+
+        self.workers: int = workers
+        self.max_in_flight: int = max_in_flight
+        self.backend: str = backend
+        self.initializer: Callable | None = initializer
+        self.initargs: tuple = initargs
+        self.memory_budget: int | None = memory_budget
+        self.memory_estimate: Callable[[object], int] | None = memory_estimate
+
+    def _make_executor(self) -> Executor:
+        """
+        Creates the executor the jobs will be submitted to.
+        """
+        if self.backend == "process":
+            # "spawn" behaves the same on every OS and doesn't fork the (threaded) Tk process.
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.workers,
+            initializer=self.initializer,
+            initargs=self.initargs,
+        )
+
+    def imap(
+        self, function: Callable, items: Iterable, *args
+    ) -> Iterator[tuple[object, Future]]:
+        """
+        Calls "function(item, *args)" for every item and yields "(item, future)" pairs as soon as
+        each job is done (not necessarily in the same order as "items").
+        """
+        with self._make_executor() as executor:
+            in_flight: dict[Future, object] = {}
+            # Estimated memory of each job in flight (only with a memory budget).
+            estimates: dict[Future, int] = {}
+            items_iterator: Iterator = iter(items)
+            exhausted: object = object()
+
+            def wait_for_any() -> Iterator[tuple[object, Future]]:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    estimates.pop(future, None)
+                    yield in_flight.pop(future), future
+
+            while True:
+                # Making room before pulling the next item, so the iterable is consumed lazily.
+                while len(in_flight) >= self.max_in_flight:
+                    yield from wait_for_any()
+
+                if (item := next(items_iterator, exhausted)) is exhausted:
+                    break
+
+                estimate: int = 0
+                if self.memory_budget is not None:
+                    estimate = self.memory_estimate(item)  # type: ignore[misc]
+                    while (
+                        in_flight
+                        and sum(estimates.values()) + estimate > self.memory_budget
+                    ):
+                        yield from wait_for_any()
+
+                future = executor.submit(function, item, *args)
+                in_flight[future] = item
+                if self.memory_budget is not None:
+                    estimates[future] = estimate
+
+            while in_flight:
+                yield from wait_for_any()
+
+    def run(
+        self,
+        function: Callable,
+        items: Iterable,
+        *args,
+        on_done: Callable[[object, BaseException | None], None] | None = None,
+        durations: list[tuple[object, float]] | None = None,
+    ) -> list[tuple[object, BaseException]]:
+        """
+        Calls "function(item, *args)" for every item and waits for all of them to finish.
+        If "on_done" is passed in, "on_done(item, exception)" is called as soon as each job is done
+        (exception being None if it didn't fail).
+        If a "durations" list is passed in, "(item, seconds)" pairs are appended to it for the jobs
+        that didn't fail (seconds spent in the worker, not waiting in the queue).
+        Returns a list of "(item, exception)" pairs for the jobs that failed.
+        """
+        if durations is not None:
+            # Module level functions can be pickled, so this works with processes too.
+            function = functools.partial(timed_call, function)
+
+        failures: list[tuple[object, BaseException]] = []
+        for item, future in self.imap(function, items, *args):
+            if (exception := future.exception()) is not None:
+                failures.append((item, exception))
+            elif durations is not None:
+                durations.append((item, future.result()))
+            if on_done is not None:
+                on_done(item, exception)
+        return failures
+
+
+def timed_call(function: Callable, item: object, *args) -> float:
+    """
+    Calls "function(item, *args)" and returns how many seconds it took (instead of its result).
+    """
+    start: float = time.perf_counter()
+    function(item, *args)
+    return time.perf_counter() - start
+
+
+def longest_first(items: Iterable, cost: Callable[[object], float]) -> list:
+    """
+    Sorts the items from the most to the least costly (keeping the order of items which cost the
+    same), so a pool of workers doesn't end up waiting for a big job which started last.
+    """
+    return sorted(items, key=cost, reverse=True)
+
+
+def makespan(durations: Iterable[float], workers: int) -> float:
+    """
+    Seconds a batch of jobs, taking "durations" seconds each, would take when submitted in this
+    order to "workers" workers which take the next job as soon as they are free.
+    """
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers <= 0:
+        raise ValueError("Expected workers to be a positive int.")
+
+    free_at: list[float] = [0.0] * workers
+    for duration in durations:
+        heapq.heapreplace(free_at, free_at[0] + duration)
+    return max(free_at)
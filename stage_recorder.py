@@ -0,0 +1,289 @@
+"""
+This module implements the recorders of how long (and how much memory) each stage of rm_bg takes
+for each image.
+"""
+
+import contextlib
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:  # Windows.
+    resource = None  # type: ignore[assignment]
+
+# Percentiles reported by AggregateRecorder.summary.
+PERCENTILES: tuple[int, ...] = (50, 95, 99)
+
+
+class StageTimings(dict):
+    """
+    Seconds (wall time) spent in each stage of processing one image, like the "timings" dicts rm_bg
+    fills, plus the CPU seconds of each stage ("cpu") and, if "memory" is True, the process' highest
+    resident memory once the stage ended in bytes ("max_rss", see max_rss) and, if tracemalloc is
+    tracing, the stage's peak allocation in bytes ("peak"). Stages are measured through measure (or
+    project.timed) and can be nested.
+    Only allocations traced by tracemalloc count towards "peak" (python objects and numpy arrays,
+    not PIL's image buffers), so it's recorded as "python_heap_peak"; "max_rss" counts everything.
+    Both are process wide: other threads' allocations are counted too, and a stage starting in
+    another thread resets the peak of this one, so they're only reliable when a single thread
+    measures stages at a time.
+    """
+
+    def __init__(self, memory: bool = False):
+        super().__init__()
+        self.cpu: dict[str, float] = {}
+        self.peak: dict[str, int] = {}
+        self.max_rss: dict[str, int] = {}
+        self.memory: bool = memory
+        # [memory traced when the stage started, highest peak seen] of each open stage.
+        self._open: list[list[int]] = []
+
+    @contextlib.contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        """
+        Adds the wall and CPU (of this thread) time spent inside this context to "stage", and keeps
+        its peak allocation and the highest resident memory after it.
+        """
+        tracing: bool = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # Resetting the peak hides it from the stages this one is nested in.
+            for frame in self._open:
+                frame[1] = max(frame[1], peak)
+            tracemalloc.reset_peak()
+            self._open.append([current, current])
+        start_cpu: float = time.thread_time()
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[stage] = self.get(stage, 0.0) + time.perf_counter() - start
+            self.cpu[stage] = self.cpu.get(stage, 0.0) + time.thread_time() - start_cpu
+            if tracing:
+                start_memory, peak = self._open.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1]) - start_memory
+                self.peak[stage] = max(self.peak.get(stage, 0), peak)
+            if self.memory and (rss := max_rss()) is not None:
+                self.max_rss[stage] = max(self.max_rss.get(stage, 0), rss)
+
+    def add(self, other: "StageTimings", share: float = 1.0) -> None:
+        """
+        Adds "share" of the times of "other" (e.g. an image's share of a batch's inference) to
+        these ones. Memory isn't shared: the whole peak (and resident memory) is kept.
+        """
+        for stage, seconds in other.items():
+            self[stage] = self.get(stage, 0.0) + seconds * share
+            self.cpu[stage] = self.cpu.get(stage, 0.0) + other.cpu[stage] * share
+        for stage, peak in other.peak.items():
+            self.peak[stage] = max(self.peak.get(stage, 0), peak)
+        for stage, rss in other.max_rss.items():
+            self.max_rss[stage] = max(self.max_rss.get(stage, 0), rss)
+
+
+def max_rss() -> int | None:
+    """
+    Highest resident memory (in bytes) this process has had so far, or None if it can't be told
+    (on Windows). Unlike tracemalloc, it counts every allocation (e.g. PIL's image buffers), but it
+    only grows: a stage shows up in it when it pushes the process' memory higher than ever.
+    """
+    if resource is None:
+        return None
+    rss: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class NullRecorder:
+    """
+    Recorder which records nothing (the default). rm_bg doesn't even measure its stages when it's
+    given a disabled recorder, so it costs nothing.
+    """
+
+    enabled: bool = False
+    memory: bool = False
+
+    def timings(self) -> StageTimings:
+        """
+        New (empty) timings for one image.
+        """
+        return StageTimings(self.memory)
+
+    def record(self, image_path: str, timings: StageTimings) -> None:
+        """
+        Records the timings of the stages of one image.
+        """
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Percentiles of each stage (see AggregateRecorder.summary).
+        """
+        return {}
+
+    def report(self) -> str:
+        """
+        Human readable summary, one line per stage (empty if nothing was recorded).
+        """
+        return format_summary(self.summary())
+
+    def close(self) -> None:
+        """
+        Releases what the recorder holds (e.g. files and memory tracing).
+        """
+
+
+class AggregateRecorder(NullRecorder):
+    """
+    Keeps the timings of every image in memory, to report percentiles per stage. If "memory" is
+    True, tracemalloc starts tracing (it slows python allocations down) until the recorder is
+    closed. It can be shared by many worker threads, not processes, but the peaks are only
+    reliable with a single one (see StageTimings).
+    """
+
+    enabled: bool = True
+
+    def __init__(self, memory: bool = True):
+        self.memory: bool = memory
+        self.images: int = 0
+        self._stages: dict[str, dict[str, list[float]]] = {}
+        self._lock = threading.Lock()
+        self._started_tracing: bool = memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def record(self, image_path: str, timings: StageTimings) -> None:
+        with self._lock:
+            self.images += 1
+            for stage, seconds in timings.items():
+                values = self._stages.setdefault(
+                    stage,
+                    {"wall": [], "cpu": [], "python_heap_peak": [], "max_rss": []},
+                )
+                values["wall"].append(seconds)
+                values["cpu"].append(timings.cpu.get(stage, 0.0))
+                if stage in timings.peak:
+                    values["python_heap_peak"].append(timings.peak[stage])
+                if stage in timings.max_rss:
+                    values["max_rss"].append(timings.max_rss[stage])
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Percentiles (PERCENTILES) of the wall seconds, CPU seconds, peak python allocation and
+        highest resident memory (bytes) of each stage, e.g. {"decode": {"count": 10, "wall": {"p50":
+        0.1, "p95": ...}, "cpu": {...}, "python_heap_peak": {...}, "max_rss": {...}}}. The memory
+        ones are left out if memory wasn't measured.
+        """
+        with self._lock:
+            stages: dict[str, dict[str, list[float]]] = {
+                stage: {name: list(values) for name, values in metrics.items()}
+                for stage, metrics in self._stages.items()
+            }
+
+        summary: dict[str, dict] = {}
+        for stage, metrics in stages.items():
+            summary[stage] = {"count": len(metrics["wall"])}
+            for name, values in metrics.items():
+                if values:
+                    values.sort()
+                    summary[stage][name] = {
+                        f"p{rank}": percentile(values, rank) for rank in PERCENTILES
+                    }
+        return summary
+
+    def close(self) -> None:
+        if self._started_tracing:
+            self._started_tracing = False
+            tracemalloc.stop()
+
+
+class JsonLinesRecorder(AggregateRecorder):
+    """
+    Aggregates the timings (see AggregateRecorder) and also appends them to "file_path", one JSON
+    line per image: {"image": path, "stages": {"decode": {"wall": s, "cpu": s, "python_heap_peak":
+    bytes, "max_rss": bytes}}} (see StageTimings for what the memory ones count).
+    """
+
+    def __init__(self, file_path: str, memory: bool = True):
+        super().__init__(memory)
+        self.file_path: str = file_path
+        # pylint: disable=consider-using-with
+        self._file = open(file_path, "a", encoding="utf-8")
+
+    def record(self, image_path: str, timings: StageTimings) -> None:
+        super().record(image_path, timings)
+        line: str = json.dumps(
+            {
+                "image": image_path,
+                "stages": {
+                    stage: {
+                        "wall": seconds,
+                        "cpu": timings.cpu.get(stage, 0.0),
+                        **(
+                            {"python_heap_peak": timings.peak[stage]}
+                            if stage in timings.peak
+                            else {}
+                        ),
+                        **(
+                            {"max_rss": timings.max_rss[stage]}
+                            if stage in timings.max_rss
+                            else {}
+                        ),
+                    }
+                    for stage, seconds in timings.items()
+                },
+            }
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+        super().close()
+
+
+def percentile(sorted_values: list[float], rank: float) -> float:
+    """
+    "rank" percentile (from 0 to 100) of sorted values, interpolating between the closest ones.
+    """
+    if not sorted_values:
+        raise ValueError("Expected at least one value.")
+    if not 0 <= rank <= 100:
+        raise ValueError("Expected rank to be between 0 and 100.")
+
+    position: float = (len(sorted_values) - 1) * rank / 100
+    lower: int = int(position)
+    upper: int = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (
+        position - lower
+    )
+
+
+def format_summary(summary: dict[str, dict]) -> str:
+    """
+    Formats a summary (see AggregateRecorder.summary) as one line per stage, e.g.
+    "decode: 0.12s / 0.20s / 0.31s (p50/p95/p99), python heap peak 12.0MB (p99), max RSS 300.0MB
+    (p99)".
+    """
+    ranks: str = "/".join(f"p{rank}" for rank in PERCENTILES)
+    lines: list[str] = []
+    for stage, metrics in summary.items():
+        line: str = (
+            f"{stage}: "
+            + " / ".join(f"{seconds:.2f}s" for seconds in metrics["wall"].values())
+            + f" ({ranks})"
+        )
+        rank: str = f"p{PERCENTILES[-1]}"
+        for name, label in (
+            ("python_heap_peak", "python heap peak"),
+            ("max_rss", "max RSS"),
+        ):
+            if name in metrics:
+                line += f", {label} {metrics[name][rank] / 1024**2:.1f}MB ({rank})"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,204 @@
+"""
+This module will run various tests on the benchmark suite from "benchmark.py" (on tiny synthetic
+images, with the model stubbed).
+    1. benchmark.write_corpus(...)
+    2. benchmark.model_or_stub(...)
+    3. benchmark.run_suite(...)
+    4. benchmark.compare(...)
+    5. benchmark.composite_array(...)
+"""
+
+import importlib.util
+import os
+import numpy as np
+import pytest
+from PIL import Image  # type: ignore[import]
+import benchmark
+import project
+
+
+@pytest.mark.parametrize("megapixels", [[0.01], [0.01, 0.05]])
+def test_write_corpus(tmp_path, megapixels: list[float]) -> None:
+    """
+    Asserting every size is saved in every format, and reused when it's already there.
+    """
+    corpus: dict[str, str] = benchmark.write_corpus(str(tmp_path), megapixels)
+
+    assert sorted(corpus) == sorted(
+        f"{file_type}/{size:g}MP"
+        for size in megapixels
+        for file_type in benchmark.SUITE_FORMATS
+    )
+    for name, image_path in corpus.items():
+        with Image.open(image_path) as img:
+            assert img.format == ("JPEG" if name.startswith("jpg") else "PNG")
+            assert img.width * img.height == pytest.approx(
+                float(name.split("/")[1][:-2]) * 1e6, rel=0.05
+            )
+
+    modified: dict[str, int] = {
+        image_path: os.stat(image_path).st_mtime_ns for image_path in corpus.values()
+    }
+    assert benchmark.write_corpus(str(tmp_path), megapixels) == corpus
+    assert all(
+        os.stat(image_path).st_mtime_ns == mtime
+        for image_path, mtime in modified.items()
+    )
+
+
+def test_model_or_stub() -> None:
+    """
+    Asserting the model session is only replaced inside the context.
+    """
+    model_session = project.model_session
+
+    with benchmark.model_or_stub(True) as stubbed:
+        assert stubbed
+        assert project.model_session is not model_session
+        assert project.model_session.predict_mask(Image.new("RGB", (8, 8))).mode == "L"
+        assert project.model_session.warm_up()
+
+    assert project.model_session is model_session
+
+
+def test_run_suite(tmp_path) -> None:
+    """
+    Asserting the suite times every benchmark on every image and reports where it ran.
+    """
+    results: dict = benchmark.run_suite(
+        [0.01], repeats=1, paths_amount=100, corpus_dir=str(tmp_path), stub=True
+    )
+
+    assert results["environment"]["model"] == "stub"
+    for name in ("jpg/0.01MP", "png/0.01MP"):
+        assert f"rm_bg/{name}/total" in results["results"]
+        assert f"rm_bg/{name}/save" in results["results"]
+        for mode in ("None", "320x240", "0.25"):
+            assert f"load_img/{name}/{mode}/cold" in results["results"]
+            assert f"load_img/{name}/{mode}/cached" in results["results"]
+    # Without rembg, the matting stage is skipped rather than mismeasured.
+    has_rembg: bool = importlib.util.find_spec("rembg") is not None
+    assert bool(results["environment"]["skipped"]) != has_rembg
+    assert ("rm_bg/jpg/0.01MP/matting" in results["results"]) == has_rembg
+    assert "paths/check_image_type" in results["results"]
+    assert "paths/process_img_path" in results["results"]
+    assert all(seconds >= 0 for seconds in results["results"].values())
+
+
+@pytest.mark.parametrize(
+    "baseline, current, expected",
+    [
+        ({"a": 1.0}, {"a": 1.0}, []),
+        ({"a": 1.0}, {"a": 1.05}, []),
+        ({"a": 1.0}, {"a": 0.5}, []),
+        ({"a": 1.0}, {"a": 1.5}, [("a", 1.0, 1.5)]),
+        (
+            {"a": 1.0, "b": 0.1},
+            {"a": 1.5, "b": 0.3},
+            [("b", 0.1, 0.3), ("a", 1.0, 1.5)],
+        ),
+        # Too small to be more than noise.
+        ({"a": 0.0001}, {"a": 0.0005}, []),
+        # Only benchmarks in both runs are compared.
+        ({"a": 1.0}, {"b": 2.0}, []),
+    ],
+)
+def test_compare(
+    baseline: dict[str, float],
+    current: dict[str, float],
+    expected: list[tuple[str, float, float]],
+) -> None:
+    """
+    Asserting only benchmarks which got slower than the threshold are flagged, worst first.
+    """
+    assert (
+        benchmark.compare({"results": baseline}, {"results": current}, 0.1) == expected
+    )
+
+
+@pytest.mark.parametrize("threshold", [-0.1, "0.1", None])
+def test_compare_value_errors(threshold) -> None:
+    """
+    Asserting ValueErrors are raised for wrong thresholds.
+    """
+    with pytest.raises(ValueError):
+        benchmark.compare({"results": {}}, {"results": {}}, threshold)
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (7, 13), (130, 70), (64, 1)])
+@pytest.mark.parametrize("fill_color", [(255, 255, 255), (0, 0, 0), (10, 200, 255)])
+@pytest.mark.parametrize("premultiplied", [False, True])
+def test_composite_array(
+    shape: tuple[int, int], fill_color, premultiplied: bool
+) -> None:
+    """
+    Asserting the vectorized compositing matches the (rounded) floating point formula.
+    """
+    rng = np.random.default_rng(0)
+    foreground = rng.integers(0, 256, (*shape, 3), dtype=np.uint8)
+    alpha = rng.integers(0, 256, shape, dtype=np.uint8)
+    expected = np.round(
+        foreground * (alpha[..., None] / 255)
+        + np.array(fill_color) * (1 - alpha[..., None] / 255)
+    )
+    if premultiplied:
+        foreground = np.round(foreground * (alpha[..., None] / 255)).astype(np.uint8)
+
+    out = np.empty((*shape, 3), dtype=np.uint8)
+    output = benchmark.composite_array(
+        foreground, alpha, fill_color, premultiplied, out
+    )
+
+    assert output is out
+    # Premultiplying rounds the foreground, so it can be off by one.
+    assert np.abs(output.astype(int) - expected).max() <= int(premultiplied)
+
+
+@pytest.mark.parametrize("premultiplied", [False, True])
+def test_composite_array_transparent(premultiplied: bool) -> None:
+    """
+    Asserting a straight alpha RGBA array is returned when there isn't a fill color.
+    """
+    foreground = np.full((4, 4, 3), 200, dtype=np.uint8)
+    alpha = np.full((4, 4), 255, dtype=np.uint8)
+    alpha[0, 0] = 0
+
+    output = benchmark.composite_array(foreground, alpha, None, premultiplied)
+
+    assert output.shape == (4, 4, 4)
+    assert (output[..., 3] == alpha).all()
+    assert (output[1:, :, :3] == 200).all()
+
+
+@pytest.mark.parametrize(
+    "out_shape, out_dtype",
+    [((4, 4, 4), np.uint8), ((4, 3, 3), np.uint8), ((4, 4, 3), float)],
+)
+def test_composite_array_out_value_errors(out_shape, out_dtype) -> None:
+    """
+    Asserting ValueErrors are raised for output buffers of the wrong shape or type.
+    """
+    with pytest.raises(ValueError):
+        benchmark.composite_array(
+            np.zeros((4, 4, 3), dtype=np.uint8),
+            np.zeros((4, 4), dtype=np.uint8),
+            out=np.empty(out_shape, dtype=out_dtype),
+        )
+
+
+@pytest.mark.parametrize("fill_color", [(255, 255, 255), (10, 200, 255)])
+def test_composite_matches_composite_array(fill_color) -> None:
+    """
+    Asserting PIL's in place compositing (project.composite) gives the same result as the
+    vectorized baseline.
+    """
+    rng = np.random.default_rng(1)
+    img = project.Image.fromarray(rng.integers(0, 256, (50, 40, 3), dtype=np.uint8))
+    mask = project.Image.fromarray(rng.integers(0, 256, (50, 40), dtype=np.uint8))
+
+    output = project.composite(img, mask, fill_color)
+
+    assert (
+        np.asarray(output)
+        == benchmark.composite_array(np.asarray(img), np.asarray(mask), fill_color)
+    ).all()
@@ -0,0 +1,84 @@
+"""
+This module will run various tests on the selection of images from "image_selection.py".
+    1. image_selection.ImageSelection(...) and image_selection.ImageSelection.add(...)
+    2. image_selection.ImageSelection.discard(...) and image_selection.ImageSelection.clear(...)
+    3. image_selection.ImageSelection(...) with many images
+"""
+
+import os
+import pytest
+import image_selection
+
+
+@pytest.mark.parametrize(
+    "image_paths, expected, ignored",
+    [
+        ([], [], []),
+        (["/a/1.jpg", "/b/1.jpg"], ["/a/1.jpg", "/b/1.jpg"], []),
+        (["/a/1.jpg", "/a/2.jpg", "/a/1.jpg"], ["/a/1.jpg", "/a/2.jpg"], ["/a/1.jpg"]),
+        (["/a/1.jpg", "/a/../a/1.jpg"], ["/a/1.jpg"], ["/a/../a/1.jpg"]),
+        (["/b/2.png", "/a/1.jpg"], ["/b/2.png", "/a/1.jpg"], []),
+    ],
+)
+def test_image_selection_add(image_paths: list[str], expected, ignored) -> None:
+    """
+    Asserting images are kept in order and the same file is never selected twice (even if two
+    folders have images with the same name).
+    """
+    selection = image_selection.ImageSelection()
+    assert selection.extend(image_paths) == ignored
+    assert list(selection) == expected
+    assert [selection[pos] for pos in range(len(selection))] == expected
+    assert all(image_path in selection for image_path in image_paths)
+    assert "/c/1.jpg" not in selection and None not in selection
+
+
+def test_image_selection_relative_paths(tmp_path, monkeypatch) -> None:
+    """
+    Asserting relative and absolute paths to the same file are the same entry.
+    """
+    monkeypatch.chdir(tmp_path)
+    selection = image_selection.ImageSelection(["photo.jpg"])
+    assert not selection.add(os.path.join(tmp_path, "photo.jpg"))
+    assert list(selection) == ["photo.jpg"]
+
+
+def test_image_selection_discard() -> None:
+    """
+    Asserting removed images are gone from every view of the selection.
+    """
+    selection = image_selection.ImageSelection(["/a/1.jpg", "/b/1.jpg", "/a/2.jpg"])
+    assert selection[2] == "/a/2.jpg"
+    assert selection.discard("/b/1.jpg")
+    assert not selection.discard("/b/1.jpg")
+    assert "/b/1.jpg" not in selection
+    assert list(selection) == ["/a/1.jpg", "/a/2.jpg"]
+    assert selection[1] == "/a/2.jpg"
+    with pytest.raises(IndexError):
+        selection[2]  # pylint: disable=pointless-statement
+
+    assert selection.add("/b/1.jpg")
+    assert selection[-1] == "/b/1.jpg"
+
+    selection.clear()
+    assert len(selection) == 0 and not list(selection)
+    assert selection.add("/a/1.jpg") and selection[0] == "/a/1.jpg"
+
+
+@pytest.mark.parametrize("amount", [20_000, 100_000])
+def test_image_selection_many_images(amount: int) -> None:
+    """
+    Asserting big selections keep working (each operation doesn't go through every image).
+    """
+    image_paths: list[str] = [
+        f"/folder{pos % 7}/IMG_{pos:06d}.jpg" for pos in range(amount)
+    ]
+    selection = image_selection.ImageSelection(image_paths)
+    assert selection.extend(image_paths[:10]) == image_paths[:10]
+    assert len(selection) == amount
+
+    for image_path in image_paths[::2]:
+        assert selection.discard(image_path)
+    assert len(selection) == amount // 2
+    assert selection[0] == image_paths[1] and selection[-1] == image_paths[-1]
+    assert list(selection)[100:110] == image_paths[201:221:2]
@@ -0,0 +1,265 @@
+"""
+This module will run various tests on the integrity check from "model_check.py".
+    1. model_check.file_sha256(...)
+    2. model_check.cached_sha256(...)
+    3. model_check.verify_file(...) and model_check.zip_is_intact(...)
+    4. project.verify_model(...) and project.download_model(...)
+"""
+
+import hashlib
+import io
+import os
+import zipfile
+import pytest
+import model_check
+import project
+
+
+@pytest.mark.parametrize("size", [0, 1, 1000, 65_536, 300_001])
+@pytest.mark.parametrize("chunk_size", [1024, 65_536, 16 * 1024**2])
+def test_file_sha256(tmp_path, size: int, chunk_size: int) -> None:
+    """
+    Asserting model_check.file_sha256 matches hashlib, whatever the file and chunk sizes.
+    """
+    data: bytes = os.urandom(size)
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(data)
+
+    assert (
+        model_check.file_sha256(str(file_path), chunk_size)
+        == hashlib.sha256(data).hexdigest()
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1, 1.5, "1024", None, True])
+def test_file_sha256_value_errors(tmp_path, chunk_size) -> None:
+    """
+    Asserting ValueErrors are raised for chunk sizes which aren't positive ints.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"model")
+
+    with pytest.raises(ValueError):
+        model_check.file_sha256(str(file_path), chunk_size)
+
+
+def count_hashes(monkeypatch) -> list[str]:
+    """
+    Makes model_check.file_sha256 keep the path of every file it hashes in the returned list.
+    """
+    hashed: list[str] = []
+    file_sha256 = model_check.file_sha256
+
+    def counting_file_sha256(file_path: str, *args) -> str:
+        hashed.append(file_path)
+        return file_sha256(file_path, *args)
+
+    monkeypatch.setattr(model_check, "file_sha256", counting_file_sha256)
+    return hashed
+
+
+def test_cached_sha256(tmp_path, monkeypatch) -> None:
+    """
+    Asserting model_check.cached_sha256 only hashes a file again after it changes.
+    """
+    hashed: list[str] = count_hashes(monkeypatch)
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"first model")
+
+    for _ in range(3):
+        assert (
+            model_check.cached_sha256(str(file_path))
+            == hashlib.sha256(b"first model").hexdigest()
+        )
+    assert len(hashed) == 1
+
+    # Same size, different modification time.
+    file_path.write_bytes(b"other model")
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert (
+        model_check.cached_sha256(str(file_path))
+        == hashlib.sha256(b"other model").hexdigest()
+    )
+    assert len(hashed) == 2
+
+
+@pytest.mark.parametrize("cache", ["", "{", "[]", '{"size": 1}', "null"])
+def test_cached_sha256_broken_cache(tmp_path, cache: str) -> None:
+    """
+    Asserting model_check.cached_sha256 hashes the file again if its cache is broken.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"model")
+    (tmp_path / "model.pth.verified.json").write_text(cache, encoding="utf-8")
+
+    assert (
+        model_check.cached_sha256(str(file_path))
+        == hashlib.sha256(b"model").hexdigest()
+    )
+
+
+def test_remember_sha256(tmp_path, monkeypatch) -> None:
+    """
+    Asserting a digest remembered by model_check.remember_sha256 isn't computed again.
+    """
+    hashed: list[str] = count_hashes(monkeypatch)
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"model")
+
+    model_check.remember_sha256(str(file_path), "0" * 64)
+
+    assert model_check.cached_sha256(str(file_path)) == "0" * 64
+    assert not hashed
+
+
+@pytest.mark.parametrize("upper", [False, True])
+def test_verify_file_sha256(tmp_path, upper: bool) -> None:
+    """
+    Asserting model_check.verify_file compares the file with the given SHA-256.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"model")
+    digest: str = hashlib.sha256(b"model").hexdigest()
+
+    verified: bool = model_check.verify_file(
+        str(file_path), digest.upper() if upper else digest
+    )[0]
+    assert verified
+    assert not model_check.verify_file(str(file_path), "0" * 64)[0]
+
+
+def test_verify_file_sidecar(tmp_path) -> None:
+    """
+    Asserting model_check.verify_file compares the file with its saved digest (as saved by
+    model_download.download) and notices when the file gets corrupted.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(b"model")
+    (tmp_path / "model.pth.sha256").write_text(
+        f"{hashlib.sha256(b'model').hexdigest()}  model.pth\n", encoding="utf-8"
+    )
+
+    assert model_check.verify_file(str(file_path)) == (
+        True,
+        f"{file_path} was verified.",
+    )
+
+    # Corrupting a byte (the size stays the same).
+    file_path.write_bytes(b"mode!")
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    verified, message = model_check.verify_file(str(file_path))
+    assert not verified
+    assert "corrupted" in message
+
+
+def zip_bytes() -> bytes:
+    """
+    A small zip file, like the models saved by recent versions of torch (which don't compress).
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as file:
+        file.writestr("archive/data.pkl", b"model" + os.urandom(5000))
+    return buffer.getvalue()
+
+
+def test_verify_file_trust_on_first_use(tmp_path) -> None:
+    """
+    Asserting model_check.verify_file accepts intact zip files without a known digest and saves
+    their digest to compare with from then on.
+    """
+    data: bytes = zip_bytes()
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(data)
+
+    assert model_check.verify_file(str(file_path))[0]
+    assert (tmp_path / "model.pth.sha256").read_text(encoding="utf-8").split()[
+        0
+    ] == hashlib.sha256(data).hexdigest()
+
+    file_path.write_bytes(data + b"!")
+    assert not model_check.verify_file(str(file_path))[0]
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # A legacy torch file (a pickle), which might as well be truncated.
+        b"\x80\x02\x8a\nl\xfc\x9cF\xf9 j\xa8P\x19.",
+        # A zip file with a corrupted byte inside its contents.
+        zip_bytes().replace(b"model", b"mode!", 1),
+    ],
+)
+def test_verify_file_unverifiable(tmp_path, data: bytes) -> None:
+    """
+    Asserting model_check.verify_file doesn't verify (nor save the digest of) files without a known
+    digest which can't be checked.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(data)
+
+    assert not model_check.verify_file(str(file_path))[0]
+    assert not (tmp_path / "model.pth.sha256").exists()
+    assert not (tmp_path / "model.pth.verified.json").exists()
+
+
+@pytest.mark.parametrize("size", [0, 4, 100, -1])
+def test_verify_file_truncated(tmp_path, size: int) -> None:
+    """
+    Asserting model_check.verify_file rejects empty and truncated files.
+    """
+    file_path = tmp_path / "model.pth"
+    file_path.write_bytes(zip_bytes()[:size])
+
+    verified, message = model_check.verify_file(str(file_path))
+    assert not verified
+    assert "empty" in message or "truncated" in message
+    assert not (tmp_path / "model.pth.sha256").exists()
+
+
+def test_verify_file_missing(tmp_path) -> None:
+    """
+    Asserting model_check.verify_file rejects files which don't exist.
+    """
+    file_path = tmp_path / "model.pth"
+
+    assert model_check.verify_file(str(file_path)) == (
+        False,
+        f"{file_path} wasn't found.",
+    )
+
+
+def test_verify_model(tmp_path) -> None:
+    """
+    Asserting project.verify_model checks the model against the given SHA-256.
+    """
+    file_path = tmp_path / "u2net_human_seg.pth"
+    file_path.write_bytes(b"model")
+
+    assert project.verify_model(str(file_path), hashlib.sha256(b"model").hexdigest())[0]
+    assert not project.verify_model(str(file_path), "0" * 64)[0]
+    assert not project.verify_model(str(tmp_path / "missing.pth"))[0]
+
+
+def test_model_sha256_is_read_when_called(tmp_path, monkeypatch) -> None:
+    """
+    Asserting project.verify_model and project.download_model both use the current MODEL_SHA256.
+    """
+    # pylint: disable=import-outside-toplevel
+    import model_download
+
+    downloads: list[str | None] = []
+    monkeypatch.setattr(
+        model_download,
+        "download",
+        lambda url, destination, **kwargs: downloads.append(kwargs["sha256"]),
+    )
+    monkeypatch.setattr(project, "MODEL_SHA256", "0" * 64)
+    file_path = tmp_path / "u2net_human_seg.pth"
+    file_path.write_bytes(b"model")
+
+    assert not project.verify_model(str(file_path))[0]
+    # The existing model doesn't match, so it's downloaded again.
+    project.download_model(str(file_path))
+    assert downloads == ["0" * 64]
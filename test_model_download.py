@@ -0,0 +1,225 @@
+"""
+This module will run various tests on the downloader from "model_download.py", against a local
+HTTP server.
+    1. model_download.download(...) with and without byte ranges
+    2. model_download.download(...) checking the SHA-256
+    3. model_download.download(...) resuming interrupted downloads
+"""
+
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+import model_download
+
+PAYLOAD: bytes = os.urandom(300_000)
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    """
+    Serves PAYLOAD at "/model.pth", supporting byte ranges (unless "ranges" is False). Requests
+    for ranges starting at any offset in "failing" fail with a 500. The requested ranges are kept
+    in "requested".
+    """
+    settings = SimpleNamespace(ranges=True, failing=set(), requested=[])
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        """
+        Minimal HTTP handler for GET requests, with byte ranges.
+        """
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """
+            Sends the whole payload or the requested range of it.
+            """
+            byte_range: str | None = self.headers.get("Range")
+            if not settings.ranges or byte_range is None:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(PAYLOAD)))
+                self.end_headers()
+                self.wfile.write(PAYLOAD)
+                return
+
+            start, end = (int(pos) for pos in byte_range[len("bytes=") :].split("-"))
+            with lock:
+                settings.requested.append((start, end))
+            if start in settings.failing:
+                self.send_error(500)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+            self.send_header("Content-Length", str(end + 1 - start))
+            self.end_headers()
+            self.wfile.write(PAYLOAD[start : end + 1])
+
+        def log_message(self, *_args) -> None:
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    settings.url = f"http://127.0.0.1:{httpd.server_address[1]}/model.pth"
+    yield settings
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize(
+    "ranges, workers, chunk_size",
+    [
+        (True, 1, 100_000),
+        (True, 4, 64 * 1024),
+        (True, 8, 7_000),
+        (True, 2, 10**6),
+        (False, 4, 64 * 1024),
+    ],
+)
+def test_download(
+    tmp_path, server: SimpleNamespace, ranges: bool, workers: int, chunk_size: int
+) -> None:
+    """
+    Asserting files are downloaded whole (in parallel chunks, if ranges are supported), their
+    digest is saved next to them and no partial file is left behind.
+    """
+    server.ranges = ranges
+    destination: str = str(tmp_path / "model.pth")
+    reported: list[tuple[int, int | None]] = []
+    lock = threading.Lock()
+
+    def on_progress(downloaded: int, total: int | None) -> None:
+        with lock:
+            reported.append((downloaded, total))
+
+    digest: str = model_download.download(
+        server.url,
+        destination,
+        workers=workers,
+        chunk_size=chunk_size,
+        on_progress=on_progress,
+    )
+
+    with open(destination, "rb") as file:
+        assert file.read() == PAYLOAD
+    assert digest == hashlib.sha256(PAYLOAD).hexdigest()
+    with open(destination + ".sha256", encoding="utf-8") as file:
+        assert file.read() == f"{digest}  model.pth\n"
+    assert sorted(os.listdir(tmp_path)) == [
+        "model.pth",
+        "model.pth.sha256",
+        "model.pth.verified.json",
+    ]
+    assert max(reported) == (len(PAYLOAD), len(PAYLOAD))
+    if ranges:
+        # The first byte (which tells the size) plus one request per chunk.
+        assert len(server.requested) == 1 + -(-len(PAYLOAD) // chunk_size)
+
+
+@pytest.mark.parametrize("uppercase", [False, True])
+def test_download_checks_sha256(tmp_path, server: SimpleNamespace, uppercase) -> None:
+    """
+    Asserting files are only kept if they match their expected SHA-256.
+    """
+    destination: str = str(tmp_path / "model.pth")
+    digest: str = hashlib.sha256(PAYLOAD).hexdigest()
+    assert (
+        model_download.download(
+            server.url, destination, sha256=digest.upper() if uppercase else digest
+        )
+        == digest
+    )
+
+    os.remove(destination)
+    with pytest.raises(model_download.DownloadError):
+        model_download.download(server.url, destination, sha256="0" * 64)
+    assert not any(name.startswith("model.pth.part") for name in os.listdir(tmp_path))
+    assert not os.path.exists(destination)
+
+
+def test_download_resumes(tmp_path, server: SimpleNamespace) -> None:
+    """
+    Asserting an interrupted download keeps its finished chunks and only downloads the missing
+    ones when it's resumed.
+    """
+    destination: str = str(tmp_path / "model.pth")
+    chunk_size: int = 50_000
+    server.failing = {100_000, 250_000}
+    with pytest.raises(model_download.DownloadError):
+        model_download.download(
+            server.url, destination, workers=2, chunk_size=chunk_size, retries=1
+        )
+    assert not os.path.exists(destination)
+    assert os.path.getsize(destination + ".part") == len(PAYLOAD)
+
+    server.failing = set()
+    server.requested.clear()
+    reported: list[int] = []
+    model_download.download(
+        server.url,
+        destination,
+        workers=2,
+        chunk_size=chunk_size,
+        on_progress=lambda downloaded, _total: reported.append(downloaded),
+    )
+
+    with open(destination, "rb") as file:
+        assert file.read() == PAYLOAD
+    assert sorted(server.requested) == [
+        (0, 0),
+        (100_000, 149_999),
+        (250_000, 299_999),
+    ]
+    # Finished chunks count as downloaded from the start.
+    assert reported[0] == len(PAYLOAD) - 2 * chunk_size
+    assert max(reported) == len(PAYLOAD)
+
+
+def test_download_cancel(tmp_path, server: SimpleNamespace) -> None:
+    """
+    Asserting cancelled downloads stop (and can be resumed later).
+    """
+    destination: str = str(tmp_path / "model.pth")
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(model_download.DownloadError):
+        model_download.download(
+            server.url, destination, chunk_size=50_000, cancel=cancel
+        )
+    assert not os.path.exists(destination)
+
+    model_download.download(server.url, destination, chunk_size=50_000)
+    with open(destination, "rb") as file:
+        assert file.read() == PAYLOAD
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"workers": 0},
+        {"workers": 1.5},
+        {"chunk_size": 0},
+        {"chunk_size": True},
+        {"retries": -1},
+    ],
+)
+def test_download_value_errors(tmp_path, kwargs: dict) -> None:
+    """
+    Asserting ValueErrors are raised for wrong arguments (before anything is downloaded).
+    """
+    with pytest.raises(ValueError):
+        model_download.download(
+            "http://127.0.0.1:9/model.pth", str(tmp_path / "model.pth"), **kwargs
+        )
+
+
+def test_download_unreachable_server(tmp_path) -> None:
+    """
+    Asserting network errors are raised as DownloadErrors.
+    """
+    with pytest.raises(model_download.DownloadError):
+        model_download.download(
+            "http://127.0.0.1:9/model.pth", str(tmp_path / "model.pth"), timeout=5
+        )
@@ -0,0 +1,88 @@
+"""
+This module will run various tests on the helpers of the preview grid from "preview_grid.py" (the
+grid itself needs a display).
+    1. preview_grid.grid_columns(...)
+    2. preview_grid.visible_indices(...)
+    3. preview_grid.shortened(...)
+"""
+
+import pytest
+import preview_grid
+
+
+@pytest.mark.parametrize(
+    "width, cell_width, expected",
+    [(400, 96, 4), (95, 96, 1), (1, 96, 1), (96, 96, 1), (960, 96, 10)],
+)
+def test_grid_columns(width: int, cell_width: int, expected: int) -> None:
+    """
+    Asserting the right amount of columns fits in the grid.
+    """
+    assert preview_grid.grid_columns(width, cell_width) == expected
+
+
+@pytest.mark.parametrize(
+    "top, height, cell_height, columns, count, expected",
+    [
+        (0, 250, 110, 4, 5000, range(0, 12)),
+        (0, 220, 110, 4, 5000, range(0, 8)),
+        (55, 220, 110, 4, 5000, range(0, 12)),
+        (110 * 1000, 250, 110, 4, 5000, range(4000, 4012)),
+        (110 * 1249, 250, 110, 4, 5000, range(4996, 5000)),
+        (0, 250, 110, 4, 6, range(0, 6)),
+        (0, 250, 110, 4, 0, range(0, 0)),
+        (0, 1, 110, 1, 5000, range(0, 1)),
+    ],
+)
+def test_visible_indices(
+    top: float, height: int, cell_height: int, columns: int, count: int, expected
+) -> None:
+    """
+    Asserting only the cells in visible rows are drawn.
+    """
+    assert (
+        preview_grid.visible_indices(top, height, cell_height, columns, count)
+        == expected
+    )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [(400, 0), (400, -1)],
+)
+def test_grid_columns_value_errors(args) -> None:
+    """
+    Asserting ValueErrors are raised for wrong cell sizes.
+    """
+    with pytest.raises(ValueError):
+        preview_grid.grid_columns(*args)
+
+
+@pytest.mark.parametrize("cell_height, columns", [(0, 4), (110, 0), (-1, 4)])
+def test_visible_indices_value_errors(cell_height: int, columns: int) -> None:
+    """
+    Asserting ValueErrors are raised for wrong grid sizes.
+    """
+    with pytest.raises(ValueError):
+        preview_grid.visible_indices(0, 250, cell_height, columns, 10)
+
+
+@pytest.mark.parametrize(
+    "text, max_length, expected",
+    [
+        ("IMG_0001.jpg", 13, "IMG_0001.jpg"),
+        ("IMG_0001.jpg", 12, "IMG_0001.jpg"),
+        ("a_very_long_file_name.jpg", 13, "a_ver...e.jpg"),
+        ("a_very_long_file_name.jpg", 6, "a...pg"),
+        ("a_very_long_file_name.jpg", 5, "a...g"),
+        ("a_very_long_file_name.jpg", 4, "a_ve"),
+        ("a_very_long_file_name.jpg", 1, "a"),
+        ("a_very_long_file_name.jpg", 0, ""),
+    ],
+)
+def test_shortened(text: str, max_length: int, expected: str) -> None:
+    """
+    Asserting long file names are shortened in the middle, and never beyond "max_length".
+    """
+    assert preview_grid.shortened(text, max_length) == expected
+    assert len(expected) <= max_length
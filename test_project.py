@@ -1,15 +1,71 @@
 """
-This module will run various tests on 4 functions from "project.py".
+This module will run various tests on functions and classes from "project.py".
     1. project.model_exists(...)
     2. project.process_img_path(...)
     3. project.check_image_type(...)
-    4. project.load_img(...)
+    4. project.load_img(...) and project.load_thumbnail(...)
+    5. project.ModelSession(...) and project.preloader(...)
+    6. project.u2net_input_batch(...), project.u2net_masks(...) and project.chunked(...)
+    7. project.iter_image_paths(...) and project.run_cli(...)
+    7.1. Lazy imports, project.parse_importtime(...) and project.startup_profile(...)
+    7.2. project.estimate_rm_bg_memory(...), project.batch_memory_budget(...) and
+    project.rm_bg_batch(...) with a memory budget
+    7.3. project.rm_bg_batch(...) ordered biggest first and project.batch_makespans(...)
+    8. project.rm_bg(...), project.get_mask(...) and project.recomposite(...) with a cache, and
+    stage recorders
+    8.1. project.open_rgb(...) and project.rm_bg(...) at a reduced working resolution
+    9. project.composite(...)
+    9.1. project.composite_tiled(...) and project.guided_filter(...)
+    10. project.matting_mode(...), project.band_trimap(...) and project.band_matting(...)
 """
 
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
 from multiprocessing.pool import ThreadPool
 from tkinter import Tk
+from types import SimpleNamespace
+import numpy as np
 import pytest
+import model_check
 import project
+import stage_recorder
+
+
+@pytest.fixture(name="fake_bg")
+def fixture_fake_bg(monkeypatch) -> SimpleNamespace:
+    """
+    Replaces rembg's "bg" module by a fake one that counts how many times the model is loaded and
+    predicted with, so model session tests don't need rembg nor the model.
+    """
+    calls: dict[str, int] = {"get_model": 0, "predict": 0}
+
+    def get_model(model_name: str) -> str:
+        calls["get_model"] += 1
+        # Giving other threads a chance to race for the model.
+        time.sleep(0.01)
+        return f"model:{model_name}"
+
+    def predict(_model, _item) -> None:
+        calls["predict"] += 1
+
+    def naive_cutout(img, mask):
+        empty = project.Image.new("RGBA", img.size, 0)
+        return project.Image.composite(img, empty, mask.resize(img.size))
+
+    fake = SimpleNamespace(
+        calls=calls,
+        get_model=get_model,
+        detect=SimpleNamespace(predict=predict),
+        naive_cutout=naive_cutout,
+    )
+    monkeypatch.setattr(project, "importer", lambda: None)
+    monkeypatch.setattr(project, "bg", fake, raising=False)
+    return fake
 
 
 @pytest.mark.parametrize(
@@ -387,3 +443,1424 @@ def test_load_img(image_path: str, size) -> None:
         return
 
     assert img_tk_size == (int(img_pil_size[0] * size), int(img_pil_size[1] * size))
+
+
+@pytest.mark.parametrize(
+    "image_size, box, expected_size",
+    [
+        ((400, 300), (96, 96), (96, 72)),
+        ((300, 400), (96, 96), (72, 96)),
+        ((400, 300), (50, 100), (50, 38)),
+        ((40, 30), (96, 96), (40, 30)),
+        ((1000, 1), (96, 96), (96, 1)),
+    ],
+)
+def test_load_thumbnail(tmp_path, image_size, box, expected_size) -> None:
+    """
+    Asserting thumbnails fit in their box and keep their aspect ratio.
+    """
+    image_path: str = str(tmp_path / "photo.jpg")
+    project.Image.new("RGB", image_size, "red").save(image_path)
+    assert project.load_thumbnail(image_path, box).size == expected_size
+
+
+@pytest.mark.parametrize(
+    "image_path, box",
+    [
+        ("./images/cs50cat.gif", (96, 96)),
+        ("./images/cs50cat.png", (0, 96)),
+        ("./images/cs50cat.png", (96, -1)),
+    ],
+)
+def test_load_thumbnail_value_errors(image_path: str, box) -> None:
+    """
+    Asserting ValueErrors are raised for wrong paths and boxes.
+    """
+    with pytest.raises(ValueError):
+        project.load_thumbnail(image_path, box)
+
+
+@pytest.mark.parametrize("threads_amount", [1, 2, 8, 32])
+def test_model_session_loads_once(
+    fake_bg: SimpleNamespace, threads_amount: int
+) -> None:
+    """
+    Asserting the model is loaded only once, even when many threads ask for it at once.
+    """
+    session = project.ModelSession("u2net_human_seg")
+    assert not session.is_loaded
+
+    models: list = []
+    threads = [
+        threading.Thread(target=lambda: models.append(session.load()))
+        for _ in range(threads_amount)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert session.is_loaded
+    assert fake_bg.calls["get_model"] == 1
+    assert models == ["model:u2net_human_seg"] * threads_amount
+
+
+def test_model_session_warm_up(fake_bg: SimpleNamespace) -> None:
+    """
+    Asserting warming up loads the model and runs a single dummy forward pass.
+    """
+    session = project.ModelSession("u2net_human_seg")
+    session.warm_up()
+    session.warm_up()
+
+    assert session.is_warm
+    assert fake_bg.calls == {"get_model": 1, "predict": 1}
+
+
+@pytest.mark.parametrize("threads_amount", [2, 8])
+def test_model_session_warm_up_once(
+    fake_bg: SimpleNamespace, threads_amount: int
+) -> None:
+    """
+    Asserting many threads warming up the model at once run a single dummy forward pass.
+    """
+    session = project.ModelSession("u2net_human_seg")
+    with ThreadPool(threads_amount) as pool:
+        assert all(pool.map(lambda _: session.warm_up(), range(threads_amount)))
+    assert fake_bg.calls == {"get_model": 1, "predict": 1}
+
+
+def test_model_session_warm_up_cancel(fake_bg: SimpleNamespace) -> None:
+    """
+    Asserting a cancelled warm up doesn't load the model, and the model can still be warmed up
+    later.
+    """
+    session = project.ModelSession("u2net_human_seg")
+    cancel = threading.Event()
+    cancel.set()
+    assert not session.warm_up(cancel)
+    assert not session.is_loaded and fake_bg.calls == {"get_model": 0, "predict": 0}
+
+    assert session.warm_up()
+    assert session.warm_up(cancel)
+    assert fake_bg.calls == {"get_model": 1, "predict": 1}
+
+
+@pytest.mark.parametrize(
+    "model_downloaded, broken_model, expected_states",
+    [
+        (True, False, ["done", "done", "done"]),
+        (False, False, ["done", "skipped", "skipped"]),
+        (True, True, ["done", "failed", "skipped"]),
+    ],
+)
+def test_preloader_stages(
+    monkeypatch,
+    fake_bg: SimpleNamespace,
+    model_downloaded: bool,
+    broken_model: bool,
+    expected_states: list[str],
+) -> None:
+    """
+    Asserting the preloader reports each stage, skipping the ones it can't (or couldn't) do.
+    """
+    if broken_model:
+
+        def get_model(_model_name: str) -> None:
+            raise RuntimeError("Broken model.")
+
+        monkeypatch.setattr(fake_bg, "get_model", get_model)
+    monkeypatch.setattr(project, "model_exists", lambda: model_downloaded)
+    monkeypatch.setattr(project, "model_session", project.ModelSession())
+
+    readiness = project.Readiness(project.STARTUP_STAGES)
+    project.preloader(readiness)
+
+    assert [readiness.state(stage) for stage in project.STARTUP_STAGES[1:]] == (
+        expected_states
+    )
+    assert readiness.state(project.STARTUP_STAGES[0]) == "pending"
+    assert readiness.is_ready(project.STARTUP_STAGES[1:])
+    assert project.model_session.is_warm == (expected_states[-1] == "done")
+
+
+def test_preloader_cancel(monkeypatch, fake_bg: SimpleNamespace) -> None:
+    """
+    Asserting a cancelled preloader skips every stage which didn't start yet.
+    """
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "model_session", project.ModelSession())
+    cancel = threading.Event()
+    cancel.set()
+
+    readiness = project.Readiness(project.STARTUP_STAGES)
+    project.preloader(readiness, cancel)
+
+    assert [readiness.state(stage) for stage in project.STARTUP_STAGES[1:]] == [
+        "skipped"
+    ] * 3
+    assert fake_bg.calls == {"get_model": 0, "predict": 0}
+
+
+@pytest.mark.parametrize(
+    "sizes",
+    [[(1, 1)], [(640, 480)], [(100, 200), (320, 320), (1000, 10)], [(5, 5)] * 16],
+)
+def test_u2net_input_batch(sizes: list[tuple[int, int]]) -> None:
+    """
+    Asserting images of any size are stacked into a single normalized batch.
+    """
+    images = [project.Image.new("RGB", size, (255, 128, 0)) for size in sizes]
+    batch = project.u2net_input_batch(images)
+
+    assert batch.shape == (len(sizes), 3, 320, 320)
+    assert batch.dtype == np.float32
+    # Every image is scaled by its own maximum, so (255, 128, 0) becomes (1, ~0.5, 0).
+    expected = (np.array([1, 128 / 255, 0]) - [0.485, 0.456, 0.406]) / [
+        0.229,
+        0.224,
+        0.225,
+    ]
+    assert np.allclose(batch[:, :, 0, 0], expected, atol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "sizes", [[(320, 320)], [(640, 480), (10, 20)], [(1, 1), (2, 2), (3, 3)]]
+)
+def test_u2net_masks(sizes: list[tuple[int, int]]) -> None:
+    """
+    Asserting each prediction is normalized on its own and resized to its image's size.
+    """
+    predictions = np.stack(
+        [
+            np.linspace(pos, 10 * (pos + 1), 320 * 320).reshape(320, 320)
+            for pos in range(len(sizes))
+        ]
+    ).astype(np.float32)
+    masks = project.u2net_masks(predictions, sizes)
+
+    assert [mask.size for mask in masks] == sizes
+    assert all(mask.mode == "L" for mask in masks)
+    # Without resizing, every mask should span the whole 8 bit range.
+    unresized_masks = project.u2net_masks(predictions, [(320, 320)] * len(sizes))
+    assert all(mask.getextrema() == (0, 255) for mask in unresized_masks)
+
+
+@pytest.mark.parametrize(
+    "items, size, output",
+    [
+        ([], 3, []),
+        ([1, 2, 3], 1, [[1], [2], [3]]),
+        ([1, 2, 3], 2, [[1, 2], [3]]),
+        ([1, 2, 3], 3, [[1, 2, 3]]),
+        ([1, 2, 3], 8, [[1, 2, 3]]),
+        (range(7), 3, [[0, 1, 2], [3, 4, 5], [6]]),
+    ],
+)
+def test_chunked(items, size: int, output: list[list]) -> None:
+    """
+    Asserting iterables are split into chunks of the expected size.
+    """
+    assert list(project.chunked(iter(items), size)) == output
+
+
+@pytest.mark.parametrize("batch_size", [0, -1, 1.5, "4", None, True])
+def test_rm_bg_batch_batch_size_value_errors(batch_size) -> None:
+    """
+    Asserting ValueErrors are raised for wrong batch sizes.
+    """
+    with pytest.raises(ValueError):
+        project.rm_bg_batch(["my_image.jpg"], batch_size=batch_size)
+
+
+@pytest.mark.parametrize("band_sizes", [(8, 3), (-1, 3, 3), [8, 3, 3], (8, 3, 2.5)])
+def test_rm_bg_batch_band_sizes_value_errors(band_sizes) -> None:
+    """
+    Asserting ValueErrors are raised for wrong band sizes, before any image is processed (band
+    matting falls back to the plain mask when it fails).
+    """
+    with pytest.raises(ValueError):
+        project.rm_bg_batch(["my_image.jpg"], band_sizes=band_sizes)
+
+
+@pytest.fixture(name="image_tree")
+def fixture_image_tree(tmp_path) -> str:
+    """
+    Creates a folder with images (and other files) in it and in a sub folder.
+    """
+    for relative_path in [
+        "a.jpg",
+        "b.PNG",
+        "b_NO_BG.PNG",
+        "notes.txt",
+        "sub/c.jpeg",
+        "sub/c_NO_BG.jpeg",
+        "sub/deeper/d.png",
+        "sub/deeper/e.gif",
+    ]:
+        (tmp_path / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative_path).write_bytes(b"")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize(
+    "paths, recursive, expected",
+    [
+        (["."], True, ["a.jpg", "b.PNG", "sub/c.jpeg", "sub/deeper/d.png"]),
+        (["."], False, ["a.jpg", "b.PNG"]),
+        (["sub"], True, ["sub/c.jpeg", "sub/deeper/d.png"]),
+        (["*.jpg"], True, ["a.jpg"]),
+        (["**/*.png"], True, ["sub/deeper/d.png"]),
+        (["s*"], False, ["sub/c.jpeg"]),
+        (["a.jpg", "notes.txt"], True, ["a.jpg", "notes.txt"]),
+        (["a.jpg", "sub/deeper"], True, ["a.jpg", "sub/deeper/d.png"]),
+        (["*.gif"], True, []),
+    ],
+)
+def test_iter_image_paths(
+    image_tree: str, monkeypatch, paths: list[str], recursive: bool, expected: list[str]
+) -> None:
+    """
+    Asserting files, folders and globs are expanded into image paths.
+    """
+    monkeypatch.chdir(image_tree)
+    found = project.iter_image_paths(paths, recursive)
+
+    # It should be a lazy iterator, not a list.
+    assert iter(found) is found
+    assert sorted(os.path.normpath(path) for path in found) == sorted(
+        os.path.normpath(path) for path in expected
+    )
+
+
+@pytest.mark.parametrize(
+    "argv, failing, expected_exit_code",
+    [
+        (["."], set(), 0),
+        (["a.jpg", "sub"], set(), 0),
+        (["."], {"a.jpg"}, 1),
+        (["notes.txt"], set(), 1),
+        (["*.gif"], set(), 1),
+    ],
+)
+def test_run_cli_exit_codes(
+    image_tree: str,
+    monkeypatch,
+    argv: list[str],
+    failing: set[str],
+    expected_exit_code: int,
+) -> None:
+    """
+    Asserting the CLI processes every image and exits with 1 when any image fails.
+    """
+    processed: list[str] = []
+
+    def fake_rm_bg(
+        image_path: str,
+        _alpha_matting: bool,
+        _cache,
+        _max_working_size,
+        _timings,
+        _recorder,
+        _band_sizes,
+    ) -> None:
+        project.process_img_path(image_path)
+        if os.path.basename(image_path) in failing:
+            raise OSError("Broken image.")
+        processed.append(image_path)
+
+    monkeypatch.chdir(image_tree)
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "verify_model", lambda: (True, "Verified."))
+    monkeypatch.setattr(project, "init_worker", lambda: None)
+    monkeypatch.setattr(project, "rm_bg", fake_rm_bg)
+
+    assert (
+        project.run_cli(argv + ["--workers", "2", "--no-cache"]) == expected_exit_code
+    )
+    assert not set(map(os.path.basename, processed)) & failing
+
+
+@pytest.mark.parametrize(
+    "option, value",
+    [
+        ("--workers", "0"),
+        ("--workers", "-2"),
+        ("--batch-size", "0"),
+        ("--batch-size", "-1"),
+        ("--max-working-size", "-1"),
+        ("--memory-budget", "-1"),
+    ],
+)
+def test_run_cli_argument_errors(monkeypatch, capsys, option: str, value: str) -> None:
+    """
+    Asserting the CLI rejects wrong amounts with a usage error (exit code 2), before doing anything
+    else, instead of a traceback.
+    """
+
+    def fake_rm_bg_batch(*_args, **_kwargs) -> None:
+        raise AssertionError("No image should be processed.")
+
+    monkeypatch.setattr(project, "rm_bg_batch", fake_rm_bg_batch)
+
+    with pytest.raises(SystemExit) as error:
+        project.run_cli([".", option, value, "--no-cache"])
+
+    assert error.value.code == 2
+    assert option in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "argv, band_sizes",
+    [([], project.MATTING_BAND_SIZES), (["--band-sizes", "8", "4", "2"], (8, 4, 2))],
+)
+def test_run_cli_band_sizes(
+    image_tree: str, monkeypatch, argv: list[str], band_sizes: tuple[int, int, int]
+) -> None:
+    """
+    Asserting --band-sizes reaches rm_bg_batch (as a tuple).
+    """
+    kwargs: dict = {}
+
+    def fake_rm_bg_batch(image_paths, _alpha_matting, **options) -> list:
+        kwargs.update(options)
+        for image_path in image_paths:
+            options["on_done"](image_path, None)
+        return []
+
+    monkeypatch.chdir(image_tree)
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "verify_model", lambda: (True, "Verified."))
+    monkeypatch.setattr(project, "rm_bg_batch", fake_rm_bg_batch)
+
+    assert project.run_cli([".", "--alpha-matting", "--no-cache", *argv]) == 0
+    assert kwargs["band_sizes"] == band_sizes
+
+
+def test_run_cli_band_sizes_error(capsys) -> None:
+    """
+    Asserting negative band sizes are rejected with a usage error.
+    """
+    with pytest.raises(SystemExit) as error:
+        project.run_cli([".", "--band-sizes", "8", "-1", "2", "--no-cache"])
+
+    assert error.value.code == 2
+    assert "--band-sizes" in capsys.readouterr().err
+
+
+def test_run_cli_unverified_model(image_tree: str, monkeypatch, capsys) -> None:
+    """
+    Asserting the CLI exits with 1, before processing any image, when the model isn't verified.
+    """
+
+    def fake_rm_bg(*_args) -> None:
+        raise AssertionError("No image should be processed.")
+
+    monkeypatch.chdir(image_tree)
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "verify_model", lambda: (False, "Model is corrupted."))
+    monkeypatch.setattr(project, "rm_bg", fake_rm_bg)
+
+    assert project.run_cli([".", "--workers", "2", "--no-cache"]) == 1
+    assert "Model is corrupted." in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("download", [False, True])
+def test_run_cli_unverifiable_model(
+    image_tree: str, tmp_path, monkeypatch, capsys, download: bool
+) -> None:
+    """
+    Asserting a model which exists but can't be verified (e.g. a legacy torch file) is downloaded
+    again with --download-model, instead of the CLI failing every time.
+    """
+    model_path = tmp_path / "u2net_human_seg.pth"
+    model_path.write_bytes(os.urandom(1000))
+    downloads: list[int] = []
+
+    def fake_download_model(**_kwargs) -> None:
+        downloads.append(1)
+        with zipfile.ZipFile(model_path, "w") as file:
+            file.writestr("archive/data.pkl", b"model")
+
+    monkeypatch.chdir(image_tree)
+    monkeypatch.setattr(project, "model_exists", model_path.exists)
+    monkeypatch.setattr(
+        project,
+        "verify_model",
+        lambda: model_check.verify_file(str(model_path)),
+    )
+    monkeypatch.setattr(project, "download_model", fake_download_model)
+    monkeypatch.setattr(project, "init_worker", lambda: None)
+    monkeypatch.setattr(project, "rm_bg", lambda *_args, **_kwargs: None)
+
+    argv: list[str] = [".", "--no-cache"] + (["--download-model"] if download else [])
+    assert project.run_cli(argv) == (0 if download else 1)
+    assert downloads == ([1] if download else [])
+    if not download:
+        assert "--download-model" in capsys.readouterr().err
+
+
+def test_project_import_skips_tkinter() -> None:
+    """
+    Asserting importing project (which is what the CLI does) doesn't import tkinter at all.
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, project; print([m for m in sys.modules if 'tkinter' in m])",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(project.__file__)),
+    )
+    assert output.stdout.strip() == "[]"
+
+
+@pytest.mark.parametrize(
+    "module", ["requests", "numpy", "rembg", "scheduler", "multiprocessing"]
+)
+def test_project_import_is_lazy(module: str) -> None:
+    """
+    Asserting importing project doesn't import heavy modules, which are imported on first use.
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, project; print({module!r} in sys.modules)",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(project.__file__)),
+    )
+    assert output.stdout.strip() == "False"
+
+
+IMPORTTIME_OUTPUT: str = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | io
+import time:        50 |         50 |       PIL._version
+import time:       200 |        250 |     PIL
+import time:      1000 |       1250 |   PIL.Image
+import time:       500 |       1750 | project
+Traceback (most recent call last):
+"""
+
+
+def test_parse_importtime() -> None:
+    """
+    Asserting "-X importtime" reports are parsed (and anything else is ignored).
+    """
+    assert project.parse_importtime(IMPORTTIME_OUTPUT) == [
+        ("_io", 1, 120, 120),
+        ("io", 0, 300, 420),
+        ("PIL._version", 3, 50, 50),
+        ("PIL", 2, 200, 250),
+        ("PIL.Image", 1, 1000, 1250),
+        ("project", 0, 500, 1750),
+    ]
+
+
+@pytest.mark.parametrize(
+    "windows_shown, expected_exit_code",
+    [(["loading screen", "main window"], 0), (["loading screen"], 1), ([], 1)],
+)
+def test_startup_profile(
+    monkeypatch, capsys, windows_shown: list[str], expected_exit_code: int
+) -> None:
+    """
+    Asserting the startup profile reports when windows were shown and the slowest imports.
+    """
+
+    def fake_run(args: list[str], **kwargs) -> SimpleNamespace:
+        assert args[1:3] == ["-X", "importtime"]
+        assert kwargs["env"][project.STARTUP_PROFILE_ENV]
+        return SimpleNamespace(
+            stdout="".join(
+                f"{project.STARTUP_PROFILE_ENV} {window_name} {time.time() + 0.1}\n"
+                for window_name in windows_shown
+            ),
+            stderr=IMPORTTIME_OUTPUT,
+        )
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    assert project.startup_profile() == expected_exit_code
+
+    report: str = capsys.readouterr().out
+    for window_name in windows_shown:
+        assert f"{window_name} shown after" in report
+    assert report.index("project") < report.index(" io ")
+    assert "PIL.Image" not in report
+
+
+def test_rm_bg_uses_cache(tmp_path, monkeypatch) -> None:
+    """
+    Asserting rm_bg restores cached results without going through the model.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (4, 4)).save(input_path)
+    _, output_path = project.process_img_path(input_path)
+
+    cache = project.ResultCache(str(tmp_path / "cache"))
+    key: str = cache.key(input_path, project.cache_settings(output_path, False))
+    project.Image.new("RGB", (4, 4), (255, 255, 255)).save(output_path)
+    cache.store(key, output_path)
+    project.os.remove(output_path)
+
+    def fail(*_args, **_kwargs) -> None:
+        raise AssertionError("The model shouldn't be used.")
+
+    monkeypatch.setattr(project.model_session, "predict_mask", fail)
+    project.rm_bg(input_path, False, cache)
+    assert project.Image.open(output_path).getpixel((0, 0)) == (255, 255, 255)
+
+
+@pytest.fixture(name="half_mask")
+def fixture_half_mask(monkeypatch, fake_bg: SimpleNamespace) -> list[int]:
+    """
+    Makes the model predict masks which keep the left half of images. Returns a list with the
+    amount of predictions made.
+    """
+    predictions: list[int] = [0]
+
+    def predict_mask(_img) -> project.Image.Image:
+        predictions[0] += 1
+        mask = project.Image.new("L", (320, 320), 0)
+        mask.paste(255, (0, 0, 160, 320))
+        return mask
+
+    monkeypatch.setattr(project.model_session, "predict_mask", predict_mask)
+    assert fake_bg
+    return predictions
+
+
+def test_get_mask_uses_cache(tmp_path, half_mask: list[int]) -> None:
+    """
+    Asserting masks are predicted only once per image content when a cache is used.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (8, 8), (10, 20, 30)).save(input_path)
+    cache = project.ResultCache(str(tmp_path / "cache"))
+    img = project.Image.open(input_path).convert("RGB")
+
+    first = project.get_mask(input_path, img, cache)
+    second = project.get_mask(input_path, img, cache)
+
+    assert half_mask[0] == 1
+    assert first.mode == second.mode == "L"
+    assert first.tobytes() == second.tobytes()
+
+
+@pytest.mark.parametrize(
+    "fill_color, output_name, expected_right_pixel",
+    [
+        ((255, 255, 255), "photo_NO_BG.jpg", (255, 255, 255)),
+        ((0, 255, 0), "photo_NO_BG.jpg", (0, 255, 0)),
+        (None, "photo_NO_BG.png", 0),
+    ],
+)
+def test_recomposite(
+    tmp_path,
+    half_mask: list[int],
+    fill_color,
+    output_name: str,
+    expected_right_pixel: tuple,
+) -> None:
+    """
+    Asserting new outputs are created from cached masks without running the model again.
+    """
+    input_path: str = str(tmp_path / "photo.jpg")
+    project.Image.new("RGB", (64, 64), (200, 0, 0)).save(input_path, quality=100)
+    cache = project.ResultCache(str(tmp_path / "cache"))
+
+    project.rm_bg(input_path, False, cache)
+    output_path = project.recomposite(input_path, fill_color, cache=cache)
+
+    assert half_mask[0] == 1
+    assert output_path == str(tmp_path / output_name)
+    output = project.Image.open(output_path)
+    right_pixel = output.getpixel((60, 32))
+    if fill_color is None:
+        # Only the alpha matters for transparent pixels.
+        assert output.mode == "RGBA" and right_pixel[3] == expected_right_pixel
+    else:
+        # JPG compression doesn't keep colors exact.
+        assert all(abs(a - b) <= 8 for a, b in zip(right_pixel, expected_right_pixel))
+    assert output.getpixel((4, 32))[0] > 180
+
+
+def test_recomposite_without_cached_mask(tmp_path) -> None:
+    """
+    Asserting a ValueError is raised for images that were never processed.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (8, 8)).save(input_path)
+    with pytest.raises(ValueError):
+        project.recomposite(input_path, cache=project.ResultCache(str(tmp_path / "c")))
+
+
+def test_rm_bg_timings(tmp_path, half_mask: list[int]) -> None:
+    """
+    Asserting rm_bg reports how long each stage took.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (32, 32), (10, 20, 30)).save(input_path)
+    timings: dict[str, float] = {}
+
+    project.rm_bg(input_path, False, timings=timings)
+
+    assert half_mask[0] == 1
+    assert set(timings) == {"decode", "inference", "cutout", "composite", "save"}
+    assert all(seconds >= 0 for seconds in timings.values())
+    output = project.Image.open(str(tmp_path / "photo_NO_BG.png"))
+    assert output.mode == "RGB"
+    assert output.getpixel((4, 16)) == (10, 20, 30)
+    assert output.getpixel((28, 16)) == (255, 255, 255)
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_rm_bg_recorder(
+    tmp_path, monkeypatch, half_mask: list[int], batch_size: int
+) -> None:
+    """
+    Asserting the stages of each image are recorded, both one image at a time and in batches.
+    """
+    monkeypatch.setattr(
+        project.model_session,
+        "predict_masks",
+        lambda images: [project.model_session.predict_mask(img) for img in images],
+    )
+    image_paths: list[str] = []
+    for name in ("a.png", "b.jpg", "c.png"):
+        image_paths.append(str(tmp_path / name))
+        project.Image.new("RGB", (32, 32), (10, 20, 30)).save(image_paths[-1])
+    recorder = stage_recorder.JsonLinesRecorder(str(tmp_path / "stages.jsonl"))
+
+    assert not project.rm_bg_batch(
+        image_paths, False, workers=2, batch_size=batch_size, recorder=recorder
+    )
+    recorder.close()
+
+    assert half_mask[0] == 3
+    assert recorder.images == 3
+    summary: dict = recorder.summary()
+    for stage in ("decode", "inference", "cutout", "composite", "save", "total"):
+        assert summary[stage]["count"] == 3
+        assert set(summary[stage]["wall"]) == {"p50", "p95", "p99"}
+    with open(tmp_path / "stages.jsonl", encoding="utf-8") as file:
+        lines: list[dict] = [json.loads(line) for line in file]
+    assert sorted(line["image"] for line in lines) == sorted(image_paths)
+    assert all("python_heap_peak" in line["stages"]["decode"] for line in lines)
+
+
+def test_rm_bg_many_failures(tmp_path, monkeypatch, half_mask: list[int]) -> None:
+    """
+    Asserting an image which can't be decoded (or saved) fails on its own: it's left out of the
+    forward pass and the other images of the batch are still processed.
+    """
+    batches: list[int] = []
+
+    def predict_masks(images: list) -> list:
+        batches.append(len(images))
+        return [project.model_session.predict_mask(img) for img in images]
+
+    monkeypatch.setattr(project.model_session, "predict_masks", predict_masks)
+    image_paths: list[str] = [
+        str(tmp_path / name) for name in ("a.png", "b.png", "c.png")
+    ]
+    project.Image.new("RGB", (32, 32), (10, 20, 30)).save(image_paths[0])
+    (tmp_path / "b.png").write_bytes(b"not an image")
+    project.Image.new("RGB", (32, 32), (10, 20, 30)).save(image_paths[2])
+    # Its output can't be saved: there's a folder in its way.
+    (tmp_path / "c_NO_BG.png").mkdir()
+
+    failures = project.rm_bg_many(image_paths, False)
+
+    assert [image_path for image_path, _ in failures] == image_paths[1:]
+    assert batches == [2]
+    assert (tmp_path / "a_NO_BG.png").is_file()
+
+
+def test_rm_bg_many_inference_failure(tmp_path, monkeypatch) -> None:
+    """
+    Asserting the images of a failed forward pass fail with its exception.
+    """
+
+    def predict_masks(_images: list) -> list:
+        raise RuntimeError("Out of memory.")
+
+    monkeypatch.setattr(project.model_session, "predict_masks", predict_masks)
+    image_paths: list[str] = [str(tmp_path / name) for name in ("a.png", "b.png")]
+    for image_path in image_paths:
+        project.Image.new("RGB", (32, 32)).save(image_path)
+
+    failures = project.rm_bg_many(image_paths, False)
+
+    assert [image_path for image_path, _ in failures] == image_paths
+    assert all(isinstance(error, RuntimeError) for _, error in failures)
+    assert not (tmp_path / "a_NO_BG.png").exists()
+
+
+def test_rm_bg_batch_chunk_failures(
+    tmp_path, monkeypatch, half_mask: list[int]
+) -> None:
+    """
+    Asserting a corrupt image only fails itself, not the rest of its chunk.
+    """
+    monkeypatch.setattr(
+        project.model_session,
+        "predict_masks",
+        lambda images: [project.model_session.predict_mask(img) for img in images],
+    )
+    image_paths: list[str] = [str(tmp_path / f"{name}.png") for name in "abcd"]
+    for image_path in image_paths:
+        project.Image.new("RGB", (32, 32), (10, 20, 30)).save(image_path)
+    (tmp_path / "b.png").write_bytes(b"not an image")
+    done: dict[str, BaseException | None] = {}
+
+    failures = project.rm_bg_batch(
+        image_paths,
+        False,
+        workers=2,
+        batch_size=2,
+        on_done=lambda image_path, exception: done.update({image_path: exception}),
+    )
+
+    assert [image_path for image_path, _ in failures] == [image_paths[1]]
+    assert half_mask[0] == 3
+    assert set(done) == set(image_paths)
+    assert [done[image_path] is None for image_path in image_paths] == [
+        True,
+        False,
+        True,
+        True,
+    ]
+
+
+@pytest.mark.parametrize("workers, traced", [(1, True), (2, False)])
+def test_run_cli_stage_log_peaks(
+    tmp_path, monkeypatch, half_mask: list[int], workers: int, traced: bool
+) -> None:
+    """
+    Asserting the CLI only traces peak memory with a single worker (its peak is shared by all of
+    the threads).
+    """
+    for name in ("a.png", "b.png"):
+        project.Image.new("RGB", (32, 32), (10, 20, 30)).save(tmp_path / name)
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "verify_model", lambda: (True, "Verified."))
+    stage_log: str = str(tmp_path / "stages.jsonl")
+
+    assert (
+        project.run_cli(
+            [
+                str(tmp_path),
+                "--no-cache",
+                "--workers",
+                str(workers),
+                "--stage-log",
+                stage_log,
+            ]
+        )
+        == 0
+    )
+
+    assert half_mask[0] == 2
+    with open(stage_log, encoding="utf-8") as file:
+        lines: list[dict] = [json.loads(line) for line in file]
+    assert len(lines) == 2
+    assert all(
+        ("python_heap_peak" in line["stages"]["decode"]) == traced for line in lines
+    ), lines
+
+
+def test_rm_bg_null_recorder(tmp_path, half_mask: list[int]) -> None:
+    """
+    Asserting a disabled recorder doesn't change what rm_bg reports.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (32, 32), (10, 20, 30)).save(input_path)
+    timings: dict[str, float] = {}
+
+    project.rm_bg(
+        input_path, False, timings=timings, recorder=stage_recorder.NullRecorder()
+    )
+
+    assert half_mask[0] == 1
+    assert set(timings) == {"decode", "inference", "cutout", "composite", "save"}
+
+
+@pytest.mark.parametrize("alpha_matting", [False, "band", "full"])
+def test_estimate_rm_bg_memory(tmp_path, alpha_matting) -> None:
+    """
+    Asserting memory estimates grow with the image's size, only reading its header.
+    """
+    estimates: list[int] = []
+    # (Bigger images than these are composited through memory-mapped files.)
+    for size in [(100, 100), (1000, 750), (2000, 1500), (4000, 3000)]:
+        image_path: str = str(tmp_path / f"{size[0]}.png")
+        project.Image.new("RGB", size).save(image_path)
+        estimates.append(project.estimate_rm_bg_memory(image_path, alpha_matting))
+
+    assert estimates == sorted(estimates)
+    assert estimates[0] >= project.INFERENCE_BYTES
+    # At least the full resolution image is in memory.
+    assert estimates[-1] - estimates[0] >= 3 * (4000 * 3000 - 100 * 100)
+
+
+def test_estimate_rm_bg_memory_matting(tmp_path) -> None:
+    """
+    Asserting alpha matting is estimated to need more memory, and unreadable images nothing.
+    """
+    image_path: str = str(tmp_path / "photo.jpg")
+    project.Image.new("RGB", (4000, 3000)).save(image_path)
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+
+    assert (
+        project.estimate_rm_bg_memory(image_path, False)
+        < project.estimate_rm_bg_memory(image_path, "band")
+        < project.estimate_rm_bg_memory(image_path, "full")
+    )
+    assert project.estimate_rm_bg_memory(str(tmp_path / "broken.jpg")) == 0
+    assert project.estimate_rm_bg_memory(str(tmp_path / "missing.jpg")) == 0
+
+
+def test_estimate_rm_bg_memory_tiled() -> None:
+    """
+    Asserting images composited through memory-mapped files (more than TILED_MIN_PIXELS) still
+    count their alpha and output, whose pages are resident once they're written.
+    """
+    size: tuple[int, int] = (5000, 4000)
+    assert size[0] * size[1] > project.TILED_MIN_PIXELS
+
+    estimate: int = project.estimate_rm_bg_memory("huge.jpg", False, size=size)
+
+    # The image, its alpha and the output, besides the working resolution image and the model.
+    assert estimate >= project.INFERENCE_BYTES + (3 + 1 + 3) * size[0] * size[1]
+
+
+def test_batch_memory_budget() -> None:
+    """
+    Asserting the model copy of each worker process is taken out of the memory budget.
+    """
+    budget: int = 4 * 1024**3
+
+    assert project.batch_memory_budget(None, "process", 4) is None
+    assert project.batch_memory_budget(budget, "thread", 4) == budget
+    assert (
+        project.batch_memory_budget(budget, "process", 4)
+        == budget - 4 * project.MODEL_BYTES
+    )
+    # Images still run (one at a time) if the model copies don't fit in it.
+    assert project.batch_memory_budget(budget, "process", 64) == 1
+
+
+def test_default_memory_budget() -> None:
+    """
+    Asserting the default memory budget is a fraction of the computer's memory (if it's known).
+    """
+    half: int | None = project.default_memory_budget()
+    if half is not None:
+        assert half > 0
+        assert project.default_memory_budget(0.25) == pytest.approx(half / 2, abs=1)
+
+
+def test_rm_bg_batch_memory_budget(tmp_path, half_mask: list[int]) -> None:
+    """
+    Asserting every image is processed under a memory budget smaller than any of them.
+    """
+    image_paths: list[str] = []
+    for name in ("a.png", "b.jpg", "c.png"):
+        image_paths.append(str(tmp_path / name))
+        project.Image.new("RGB", (32, 32), (10, 20, 30)).save(image_paths[-1])
+
+    assert not project.rm_bg_batch(image_paths, False, workers=2, memory_budget=1)
+    assert half_mask[0] == 3
+    assert all(
+        os.path.exists(image_path.replace(".", "_NO_BG.")) for image_path in image_paths
+    )
+
+
+@pytest.mark.parametrize("order", ["fifo", "longest"])
+def test_rm_bg_batch_order(tmp_path, half_mask: list[int], order: str) -> None:
+    """
+    Asserting images are processed in the given order or biggest first, and the time biggest
+    first saves is reported.
+    """
+    image_paths: list[str] = []
+    for width in (8, 64, 16, 32):
+        image_paths.append(str(tmp_path / f"{width}.png"))
+        project.Image.new("RGB", (width, width)).save(image_paths[-1])
+    done: list[object] = []
+    makespans: dict[str, float] = {}
+
+    assert not project.rm_bg_batch(
+        image_paths,
+        False,
+        workers=1,
+        max_in_flight=1,
+        on_done=lambda image_path, _: done.append(image_path),
+        order=order,
+        makespans=makespans,
+    )
+
+    assert half_mask[0] == 4
+    assert done == (
+        image_paths if order == "fifo" else [image_paths[i] for i in (1, 3, 2, 0)]
+    )
+    assert set(makespans) == {"elapsed", "fifo", "longest"}
+    # With a single worker, the order doesn't change the total.
+    assert makespans["fifo"] == pytest.approx(makespans["longest"])
+    assert makespans["fifo"] <= makespans["elapsed"]
+
+
+@pytest.mark.parametrize("batch_size", [1, 2])
+def test_batch_makespans(batch_size: int) -> None:
+    """
+    Asserting biggest first is simulated to finish sooner when the biggest image comes last.
+    """
+    image_paths: list[str] = ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "big.jpg"]
+    seconds: dict[str, float] = {"a.jpg": 1, "b.jpg": 1, "c.jpg": 1, "d.jpg": 1}
+    seconds["big.jpg"] = 4
+    durations: list[tuple[object, float]] = [
+        (chunk if batch_size > 1 else chunk[0], sum(map(seconds.get, chunk)))
+        for chunk in project.chunked(image_paths, batch_size)
+    ]
+
+    makespans = project.batch_makespans(
+        image_paths, durations, 2, batch_size, seconds.get
+    )
+
+    assert makespans["longest"] < makespans["fifo"]
+    if batch_size == 1:
+        assert makespans == {"fifo": 6, "longest": 4}
+
+
+@pytest.mark.parametrize("fifo, longest, reported", [(6, 4, True), (4, 5.2, False)])
+def test_run_cli_reports_time_saved(
+    image_tree: str,
+    monkeypatch,
+    capsys,
+    fifo: float,
+    longest: float,
+    reported: bool,
+) -> None:
+    """
+    Asserting the CLI only reports the (simulated) time saved by biggest first when there's any.
+    """
+
+    def fake_rm_bg_batch(image_paths, *_args, on_done, makespans, **_kwargs) -> list:
+        for image_path in image_paths:
+            on_done(image_path, None)
+        makespans.update(elapsed=7.0, fifo=fifo, longest=longest)
+        return []
+
+    monkeypatch.chdir(image_tree)
+    monkeypatch.setattr(project, "model_exists", lambda: True)
+    monkeypatch.setattr(project, "verify_model", lambda: (True, "Verified."))
+    monkeypatch.setattr(project, "rm_bg_batch", fake_rm_bg_batch)
+
+    assert project.run_cli([".", "--order", "longest"]) == 0
+
+    stderr: str = capsys.readouterr().err
+    assert ("saved about 2.0s" in stderr and "simulated" in stderr) == reported
+    assert "saved about -" not in stderr
+
+
+def test_rm_bg_batch_order_value_error() -> None:
+    """
+    Asserting a ValueError is raised for unknown orders.
+    """
+    with pytest.raises(ValueError):
+        project.rm_bg_batch([], order="random")
+
+
+def test_rm_bg_batch_recorder_value_error() -> None:
+    """
+    Asserting a ValueError is raised when recording stages of worker processes.
+    """
+    with pytest.raises(ValueError):
+        project.rm_bg_batch(
+            [],
+            backend="process",
+            recorder=stage_recorder.AggregateRecorder(memory=False),
+        )
+
+
+@pytest.mark.parametrize(
+    "cpus, workers, expected",
+    [(8, 8, 1), (8, 4, 2), (8, 3, 2), (8, None, 1), (8, 16, 1), (None, 2, 1)],
+)
+def test_threads_per_worker(monkeypatch, cpus, workers, expected: int) -> None:
+    """
+    Asserting process workers split the cores between them (at least one thread each).
+    """
+    monkeypatch.setattr(project.os, "cpu_count", lambda: cpus)
+    assert project.threads_per_worker(workers) == expected
+
+
+def test_init_worker_limits_threads(monkeypatch) -> None:
+    """
+    Asserting process workers limit the model's runtime threads before warming it up.
+    """
+    calls: list[tuple[str, object]] = []
+    fake_torch = SimpleNamespace(
+        set_num_threads=lambda threads: calls.append(("torch", threads))
+    )
+    monkeypatch.setitem(sys.modules, "torch", fake_torch)
+    monkeypatch.setattr(
+        project.importlib.util, "find_spec", lambda name: SimpleNamespace(name=name)
+    )
+    monkeypatch.setattr(
+        project.model_session,
+        "warm_up",
+        lambda: calls.append(("warm_up", os.environ["OMP_NUM_THREADS"])),
+    )
+    for variable in project.THREAD_LIMIT_VARIABLES:
+        monkeypatch.setenv(variable, "64")
+
+    project.init_worker(3)
+
+    assert calls == [("torch", 3), ("warm_up", "3")]
+    assert all(
+        os.environ[variable] == "3" for variable in project.THREAD_LIMIT_VARIABLES
+    )
+
+
+@pytest.mark.parametrize("max_size", [0, -1, 1.5, "100", True])
+def test_open_rgb_value_errors(tmp_path, max_size) -> None:
+    """
+    Asserting ValueErrors are raised for wrong working sizes.
+    """
+    input_path: str = str(tmp_path / "photo.png")
+    project.Image.new("RGB", (8, 8)).save(input_path)
+    with pytest.raises(ValueError):
+        project.open_rgb(input_path, max_size)
+
+
+@pytest.mark.parametrize(
+    "file_name, mode, size, max_size, expected_size",
+    [
+        ("photo.jpg", "RGB", (1600, 1200), None, (1600, 1200)),
+        ("photo.jpg", "RGB", (1600, 1200), 2000, (1600, 1200)),
+        ("photo.jpg", "RGB", (1600, 1200), 800, (800, 600)),
+        ("photo.jpg", "L", (1600, 1200), 500, (400, 300)),
+        ("photo.png", "RGB", (1600, 1200), 800, (800, 600)),
+        ("photo.png", "RGBA", (1200, 1600), 700, (400, 534)),
+        ("photo.png", "P", (1000, 10), 999, (500, 5)),
+    ],
+)
+def test_open_rgb_max_size(
+    tmp_path, file_name: str, mode: str, size, max_size, expected_size
+) -> None:
+    """
+    Asserting images are decoded as RGB with their longest side no bigger than "max_size".
+    """
+    input_path: str = str(tmp_path / file_name)
+    project.Image.new(mode, size).save(input_path)
+
+    img = project.open_rgb(input_path, max_size)
+
+    assert img.mode == "RGB"
+    assert img.size == expected_size
+
+
+@pytest.mark.parametrize("alpha_matting", [False, True])
+def test_rm_bg_max_working_size(
+    tmp_path, monkeypatch, fake_bg: SimpleNamespace, alpha_matting: bool
+) -> None:
+    """
+    Asserting masks are predicted from the reduced image, while the output keeps the full
+    resolution.
+    """
+    input_path: str = str(tmp_path / "photo.jpg")
+    project.Image.new("RGB", (1600, 800), (200, 0, 0)).save(input_path, quality=100)
+    predicted_sizes: list[tuple[int, int]] = []
+
+    def predict_mask(img) -> project.Image.Image:
+        predicted_sizes.append(img.size)
+        mask = project.Image.new("L", (320, 320), 0)
+        mask.paste(255, (0, 0, 160, 320))
+        return mask
+
+    monkeypatch.setattr(project.model_session, "predict_mask", predict_mask)
+    timings: dict[str, float] = {}
+    project.rm_bg(input_path, alpha_matting, max_working_size=400, timings=timings)
+
+    assert fake_bg and predicted_sizes == [(400, 200)]
+    assert ("upsample" in timings) == alpha_matting
+    output = project.Image.open(str(tmp_path / "photo_NO_BG.jpg"))
+    assert output.size == (1600, 800)
+    assert all(
+        abs(a - b) <= 8 for a, b in zip(output.getpixel((100, 400)), (200, 0, 0))
+    )
+    assert all(value >= 247 for value in output.getpixel((1500, 400)))
+
+
+@pytest.mark.parametrize(
+    "tile_size, overlap", [(0, 0), (-8, 0), (8, 9), (8, -1), (8.5, 2), (8, True)]
+)
+def test_composite_tiled_value_errors(tile_size, overlap) -> None:
+    """
+    Asserting ValueErrors are raised for wrong tile sizes and overlaps.
+    """
+    img = project.Image.new("RGB", (16, 16))
+    with pytest.raises(ValueError):
+        project.composite_tiled(
+            img, img.convert("L"), tile_size=tile_size, overlap=overlap
+        )
+
+
+@pytest.mark.parametrize("fill_color", [(255, 255, 255), (10, 200, 255), None])
+@pytest.mark.parametrize("tile_size, overlap", [(32, 8), (50, 0), (64, 64), (1000, 32)])
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_composite_tiled_matches_composite(
+    tmp_path, monkeypatch, fill_color, tile_size: int, overlap: int, on_disk: bool
+) -> None:
+    """
+    Asserting compositing tile by tile (in memory or through memory-mapped files) gives the same
+    result as compositing the whole image at once.
+    """
+    rng = np.random.default_rng(2)
+    img = project.Image.fromarray(rng.integers(0, 256, (150, 210, 3), dtype=np.uint8))
+    mask = project.Image.fromarray(rng.integers(0, 256, (40, 30), dtype=np.uint8))
+    expected = np.asarray(project.composite(img, mask, fill_color), dtype=int)
+
+    monkeypatch.setattr(project, "TILED_MIN_PIXELS", -1 if on_disk else 10**9)
+    monkeypatch.setattr(project, "TILED_BUFFER_DIR", str(tmp_path))
+    output = project.composite_tiled(img, mask, fill_color, False, tile_size, overlap)
+
+    assert output.mode == ("RGB" if fill_color else "RGBA")
+    assert output.size == img.size
+    # The mask is upsampled tile by tile, which can round differently.
+    assert np.abs(np.asarray(output, dtype=int) - expected).max() <= 1
+
+
+@pytest.mark.parametrize("tile_size, overlap", [(37, 0), (50, 10), (64, 16)])
+def test_composite_tiled_refine_has_no_seams(tile_size: int, overlap: int) -> None:
+    """
+    Asserting the refined alpha doesn't depend on the tiles it was computed in.
+    """
+    rng = np.random.default_rng(3)
+    img = project.Image.fromarray(rng.integers(0, 256, (150, 210, 3), dtype=np.uint8))
+    mask = project.Image.fromarray(rng.integers(0, 256, (40, 30), dtype=np.uint8))
+
+    whole = project.composite_tiled(img, mask, None, True, tile_size=10000)
+    tiled = project.composite_tiled(img, mask, None, True, tile_size, overlap)
+
+    assert (
+        np.abs(np.asarray(whole, dtype=int) - np.asarray(tiled, dtype=int)).max() <= 1
+    )
+
+
+def test_composite_tiled_concurrently(tmp_path, monkeypatch) -> None:
+    """
+    Asserting images composited at the same time (through memory-mapped files) don't interfere.
+    """
+    monkeypatch.setattr(project, "TILED_MIN_PIXELS", -1)
+    monkeypatch.setattr(project, "TILED_BUFFER_DIR", str(tmp_path))
+    rng = np.random.default_rng(4)
+    jobs = [
+        (
+            project.Image.fromarray(rng.integers(0, 256, (90, 120, 3), dtype=np.uint8)),
+            project.Image.fromarray(rng.integers(0, 256, (20, 20), dtype=np.uint8)),
+        )
+        for _ in range(8)
+    ]
+
+    def job(pos: int) -> bytes:
+        img, mask = jobs[pos]
+        return project.composite_tiled(img, mask, refine=True, tile_size=32).tobytes()
+
+    with ThreadPool(4) as pool:
+        outputs = pool.map(job, range(len(jobs)))
+
+    assert outputs == [job(pos) for pos in range(len(jobs))]
+
+
+@pytest.mark.parametrize("buffer_dir", [None, "given"])
+def test_composite_tiled_buffer_dir(tmp_path, monkeypatch, buffer_dir) -> None:
+    """
+    Asserting the memory-mapped buffers are created in "buffer_dir" (or TILED_BUFFER_DIR), never in
+    the default temporary folder.
+    """
+    folders: list[str | None] = []
+    temporary_file = project.tempfile.TemporaryFile
+
+    def recording_temporary_file(*args, **kwargs):
+        folders.append(kwargs.get("dir"))
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(project, "TILED_MIN_PIXELS", -1)
+    monkeypatch.setattr(project, "TILED_BUFFER_DIR", str(tmp_path / "default"))
+    monkeypatch.setattr(project.tempfile, "TemporaryFile", recording_temporary_file)
+    expected_dir: str = str(tmp_path / (buffer_dir or "default"))
+
+    project.composite_tiled(
+        project.Image.new("RGB", (40, 30)),
+        project.Image.new("L", (8, 8), 255),
+        buffer_dir=expected_dir if buffer_dir else None,
+    )
+
+    assert folders == [expected_dir, expected_dir]
+    assert os.path.isdir(expected_dir)
+
+
+def test_guided_filter_follows_guide_edges() -> None:
+    """
+    Asserting a blurry alpha gets a sharp edge where the guide has one, and constants stay
+    constant.
+    """
+    guide = np.zeros((96, 96))
+    guide[:, 48:] = 1
+    blurry = np.clip((np.arange(96) - 42) / 12, 0, 1)[None, :].repeat(96, axis=0)
+
+    refined = project.guided_filter(guide, blurry)
+
+    assert (refined[:, 48] - refined[:, 47] > 0.5).all()
+    assert np.abs(refined - guide).max() < 0.5
+    assert np.allclose(project.guided_filter(guide, np.full((96, 96), 0.5)), 0.5)
+
+
+@pytest.mark.parametrize(
+    "alpha_matting, mode",
+    [(False, None), (True, "band"), ("band", "band"), ("full", "full")],
+)
+def test_matting_mode(alpha_matting, mode) -> None:
+    """
+    Asserting alpha matting arguments are normalized to their modes.
+    """
+    assert project.matting_mode(alpha_matting) == mode
+
+
+@pytest.mark.parametrize("alpha_matting", ["", "Band", "fast", None, 0, 1])
+def test_matting_mode_value_errors(alpha_matting) -> None:
+    """
+    Asserting ValueErrors are raised for unknown alpha matting modes.
+    """
+    with pytest.raises(ValueError):
+        project.matting_mode(alpha_matting)
+
+
+@pytest.fixture(name="square_mask")
+def fixture_square_mask() -> project.Image.Image:
+    """
+    A 200x160 mask of a square (from 50 to 150 on both axes) with a 4 pixels wide soft edge.
+    """
+    mask = np.zeros((160, 200), dtype=np.uint8)
+    mask[50:150, 50:150] = 255
+    for step in range(4):
+        value = 64 * (step + 1) - 1
+        mask[46 + step, 46 + step : 154 - step] = value
+        mask[153 - step, 46 + step : 154 - step] = value
+        mask[46 + step : 154 - step, 46 + step] = value
+        mask[46 + step : 154 - step, 153 - step] = value
+    return project.Image.fromarray(mask, "L")
+
+
+@pytest.mark.parametrize("band_width", [0, 2, 8, 20])
+def test_band_trimap(square_mask: project.Image.Image, band_width: int) -> None:
+    """
+    Asserting only pixels close to the mask's edge are unknown and the rest follows the mask.
+    """
+    trimap = project.band_trimap(square_mask, band_width, 3, 3)
+    mask = np.asarray(square_mask)
+    unknown = trimap == 128
+
+    assert set(np.unique(trimap)) <= {0, 128, 255}
+    assert (trimap[~unknown] == np.where(mask >= 128, 255, 0)[~unknown]).all()
+    rows, columns = np.nonzero(unknown)
+    # Distance of each unknown pixel to the edge (mask >= 128 from 48 to 151 on both axes).
+    distances = np.maximum(np.abs(rows - 99.5), np.abs(columns - 99.5)) - 52
+    assert (np.abs(distances) <= band_width + 0.5).all()
+    assert unknown.any() == (band_width > 0)
+
+
+@pytest.mark.parametrize(
+    "band_width, erode_size, dilate_size",
+    [(-1, 3, 3), (8, -1, 3), (8, 3, 2.5), ("8", 3, 3), (8, True, 3)],
+)
+def test_band_trimap_value_errors(
+    square_mask: project.Image.Image, band_width, erode_size, dilate_size
+) -> None:
+    """
+    Asserting ValueErrors are raised for wrong band, erosion and dilation sizes.
+    """
+    with pytest.raises(ValueError):
+        project.band_trimap(square_mask, band_width, erode_size, dilate_size)
+
+
+@pytest.mark.parametrize("tile_size", [16, 37, 10000])
+def test_band_matting(
+    monkeypatch,
+    fake_bg: SimpleNamespace,
+    square_mask: project.Image.Image,
+    tile_size: int,
+) -> None:
+    """
+    Asserting only the unknown pixels of the band are solved, whatever the tiles are.
+    """
+    solved_pixels: list[int] = [0]
+
+    def estimate_alpha_cf(image, trimap):
+        # A fake solver: the alpha is the image's red channel.
+        assert image.shape[:2] == trimap.shape
+        solved_pixels[0] += trimap.size
+        return image[..., 0]
+
+    monkeypatch.setattr(fake_bg, "estimate_alpha_cf", estimate_alpha_cf, raising=False)
+    rng = np.random.default_rng(5)
+    img = project.Image.fromarray(rng.integers(0, 256, (160, 200, 3), dtype=np.uint8))
+    trimap = project.band_trimap(square_mask, 6, 3, 3)
+
+    alpha = np.asarray(project.band_matting(img, square_mask, 6, 3, 3, tile_size))
+
+    unknown = trimap == 128
+    assert (alpha[~unknown] == trimap[~unknown]).all()
+    assert (alpha[unknown] == np.asarray(img)[..., 0][unknown]).all()
+    if tile_size < 100:
+        # Tiles without unknown pixels (inside the square) are skipped.
+        assert solved_pixels[0] < 200 * 160
+
+
+def test_cutout_band_sizes(monkeypatch, square_mask: project.Image.Image) -> None:
+    """
+    Asserting band matting gets the band width, erode size and dilate size it's given.
+    """
+    calls: list[tuple] = []
+
+    def band_matting(_img, mask, *sizes):
+        calls.append(sizes)
+        return mask
+
+    monkeypatch.setattr(project, "band_matting", band_matting)
+    img = project.Image.new("RGB", square_mask.size)
+
+    project.model_session.cutout(img, square_mask, "band")
+    project.model_session.cutout(img, square_mask, True, (4, 2, 1))
+
+    assert calls == [project.MATTING_BAND_SIZES, (4, 2, 1)]
+
+
+@pytest.mark.parametrize("alpha_matting", [False, "band", "full"])
+def test_cache_settings_band_sizes(alpha_matting) -> None:
+    """
+    Asserting band sizes only change the cache key of band matting, and the default ones don't
+    change it at all (so results cached before they could be changed stay valid).
+    """
+    settings: str = project.cache_settings("photo_NO_BG.jpg", alpha_matting)
+
+    assert ":band_sizes=" not in settings
+    assert (
+        project.cache_settings(
+            "photo_NO_BG.jpg", alpha_matting, band_sizes=project.MATTING_BAND_SIZES
+        )
+        == settings
+    )
+    assert (
+        project.cache_settings("photo_NO_BG.jpg", alpha_matting, band_sizes=(8, 4, 2))
+        != settings
+    ) == (alpha_matting == "band")
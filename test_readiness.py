@@ -0,0 +1,88 @@
+"""
+This module will run various tests on the loading stages from "readiness.py".
+    1. readiness.Readiness(...)
+    2. readiness.Readiness.stage(...), readiness.Readiness.skip(...) and states
+    3. readiness.Readiness.wait(...) with many threads
+"""
+
+import threading
+import time
+import pytest
+import readiness
+
+STAGES: list[str] = ["Importing rembg", "Loading the model", "Warming up the model"]
+
+
+@pytest.mark.parametrize("stages", [[], ["a", "a"], ["a", "b", "a"]])
+def test_readiness_value_errors(stages: list[str]) -> None:
+    """
+    Asserting ValueErrors are raised for missing or repeated stages.
+    """
+    with pytest.raises(ValueError):
+        readiness.Readiness(stages)
+
+
+def test_readiness_unknown_stage() -> None:
+    """
+    Asserting ValueErrors are raised for stages which don't exist.
+    """
+    with pytest.raises(ValueError):
+        readiness.Readiness(STAGES).start("Downloading the internet")
+
+
+def test_readiness_stages() -> None:
+    """
+    Asserting stages go through their states in order and progress is reported.
+    """
+    loading = readiness.Readiness(STAGES)
+    assert loading.current() == STAGES[0] and loading.progress() == 0
+    assert not loading.is_ready()
+
+    with loading.stage(STAGES[0]):
+        assert loading.state(STAGES[0]) == "running"
+        assert loading.current() == STAGES[0]
+    assert loading.state(STAGES[0]) == "done"
+    assert loading.is_ready(STAGES[:1]) and not loading.is_ready()
+    assert loading.current() == STAGES[1]
+    assert loading.progress() == pytest.approx(1 / 3)
+
+    error = RuntimeError("Broken model.")
+    with pytest.raises(RuntimeError):
+        with loading.stage(STAGES[1]):
+            raise error
+    assert loading.state(STAGES[1]) == "failed"
+    assert loading.error(STAGES[1]) is error and loading.error(STAGES[0]) is None
+
+    loading.skip(*STAGES)
+    assert [loading.state(stage) for stage in STAGES] == ["done", "failed", "skipped"]
+    assert loading.is_ready() and loading.current() is None
+    assert loading.progress() == 1
+
+
+@pytest.mark.parametrize("waiters_amount", [1, 4, 16])
+def test_readiness_wait(waiters_amount: int) -> None:
+    """
+    Asserting threads waiting for stages are woken up as soon as those stages are finished.
+    """
+    loading = readiness.Readiness(STAGES)
+    assert not loading.wait(STAGES[:1], timeout=0.01)
+
+    woken: list[bool] = []
+    lock = threading.Lock()
+
+    def waiter() -> None:
+        ready = loading.wait(STAGES[:2], timeout=5)
+        with lock:
+            woken.append(ready and loading.state(STAGES[2]) == "pending")
+
+    threads = [threading.Thread(target=waiter) for _ in range(waiters_amount)]
+    for thread in threads:
+        thread.start()
+    for stage in STAGES[:2]:
+        time.sleep(0.01)
+        with loading.stage(stage):
+            pass
+    for thread in threads:
+        thread.join()
+
+    assert woken == [True] * waiters_amount
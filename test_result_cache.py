@@ -0,0 +1,151 @@
+"""
+This module will run various tests on the results cache from "result_cache.py".
+    1. result_cache.ResultCache(...)
+    2. result_cache.ResultCache.key(...)
+    3. result_cache.ResultCache.restore(...) and result_cache.ResultCache.store(...)
+    4. result_cache.ResultCache.store_data(...) and result_cache.ResultCache.load_data(...)
+    5. result_cache.ResultCache.evict(...)
+"""
+
+import os
+import pickle
+import pytest
+import result_cache
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(tmp_path) -> result_cache.ResultCache:
+    """
+    An empty cache in a temporary folder.
+    """
+    return result_cache.ResultCache(str(tmp_path / "cache"), max_bytes=1000)
+
+
+def write_file(path, content: bytes) -> str:
+    """
+    Writes "content" to "path" and returns it as a string.
+    """
+    path.write_bytes(content)
+    return str(path)
+
+
+@pytest.mark.parametrize("max_bytes", [0, -1, 1.5, "1000", None, True])
+def test_result_cache_value_errors(tmp_path, max_bytes) -> None:
+    """
+    Asserting ValueErrors are raised for wrong cache sizes.
+    """
+    with pytest.raises(ValueError):
+        result_cache.ResultCache(str(tmp_path), max_bytes=max_bytes)
+
+
+def test_result_cache_key(cache: result_cache.ResultCache, tmp_path) -> None:
+    """
+    Asserting keys depend on the input's content and the settings, but not on its path.
+    """
+    first = write_file(tmp_path / "first.jpg", b"same content")
+    second = write_file(tmp_path / "second.jpg", b"same content")
+    third = write_file(tmp_path / "third.jpg", b"other content")
+
+    assert cache.key(first, "u2net:False") == cache.key(second, "u2net:False")
+    assert cache.key(first, "u2net:False") != cache.key(third, "u2net:False")
+    assert cache.key(first, "u2net:False") != cache.key(first, "u2net:True")
+
+
+def test_result_cache_key_notices_changes(
+    cache: result_cache.ResultCache, tmp_path
+) -> None:
+    """
+    Asserting the key changes when the input file changes.
+    """
+    input_path = write_file(tmp_path / "input.jpg", b"before")
+    before: str = cache.key(input_path, "settings")
+    write_file(tmp_path / "input.jpg", b"after!")
+    assert cache.key(input_path, "settings") != before
+
+
+def test_result_cache_restore_and_store(
+    cache: result_cache.ResultCache, tmp_path
+) -> None:
+    """
+    Asserting stored results are restored to other output paths.
+    """
+    key: str = cache.key(write_file(tmp_path / "in.jpg", b"input"), "settings")
+    output_path = write_file(tmp_path / "out.jpg", b"result")
+    other_output_path = str(tmp_path / "other_out.jpg")
+
+    assert not cache.restore(key, other_output_path)
+    cache.store(key, output_path)
+
+    assert cache.restore(key, other_output_path)
+    with open(other_output_path, "rb") as file:
+        assert file.read() == b"result"
+    assert cache.size() == len(b"result")
+
+
+def test_result_cache_store_and_load_data(
+    cache: result_cache.ResultCache, tmp_path
+) -> None:
+    """
+    Asserting data (e.g. masks) can be stored under keys with other settings.
+    """
+    input_path = write_file(tmp_path / "in.jpg", b"input")
+    mask_key: str = cache.key(input_path, "mask:u2net")
+
+    assert cache.load_data(mask_key) is None
+    cache.store_data(mask_key, b"mask bytes")
+    assert cache.load_data(mask_key) == b"mask bytes"
+    assert not cache.restore(cache.key(input_path, "u2net:False"), str(tmp_path / "o"))
+
+
+def test_result_cache_restore_skips_unchanged_outputs(
+    cache: result_cache.ResultCache, tmp_path, monkeypatch
+) -> None:
+    """
+    Asserting nothing is copied if the output already is the cached result.
+    """
+    key: str = cache.key(write_file(tmp_path / "in.jpg", b"input"), "settings")
+    output_path = write_file(tmp_path / "out.jpg", b"result")
+    cache.store(key, output_path)
+
+    def fail(*_args) -> None:
+        raise AssertionError("Nothing should be copied.")
+
+    monkeypatch.setattr(result_cache.shutil, "copyfile", fail)
+    assert cache.restore(key, output_path)
+
+
+def test_result_cache_evicts_least_recently_used(
+    cache: result_cache.ResultCache, tmp_path
+) -> None:
+    """
+    Asserting the least recently used results are evicted once the cache is full.
+    """
+    keys: list[str] = []
+    for pos in range(4):
+        keys.append(
+            cache.key(write_file(tmp_path / f"in{pos}.jpg", bytes([pos])), "settings")
+        )
+        cache.store(keys[-1], write_file(tmp_path / f"out{pos}.jpg", b"x" * 300))
+        if pos == 2:
+            # Using the first result, so the second one is the least recently used.
+            cache.restore(keys[0], str(tmp_path / "restored.jpg"))
+
+    assert cache.size() <= cache.max_bytes
+    assert cache.restore(keys[0], str(tmp_path / "restored_0.jpg"))
+    assert not cache.restore(keys[1], str(tmp_path / "restored_1.jpg"))
+    assert not os.path.exists(cache._result_path(keys[1]))  # pylint: disable=W0212
+    assert cache.restore(keys[3], str(tmp_path / "restored_3.jpg"))
+
+
+def test_result_cache_pickles_settings_only(
+    cache: result_cache.ResultCache, tmp_path
+) -> None:
+    """
+    Asserting a cache (with an open connection) can be sent to worker processes.
+    """
+    key: str = cache.key(write_file(tmp_path / "in.jpg", b"input"), "settings")
+    cache.store(key, write_file(tmp_path / "out.jpg", b"result"))
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert (copy.cache_dir, copy.max_bytes) == (cache.cache_dir, cache.max_bytes)
+    assert copy.restore(key, str(tmp_path / "copy_out.jpg"))
@@ -0,0 +1,295 @@
+"""
+This module will run various tests on the batch scheduler from "scheduler.py".
+    1. scheduler.BatchScheduler(...)
+    2. scheduler.BatchScheduler.imap(...) (with the thread and process backends)
+    3. scheduler.BatchScheduler.run(...)
+    4. scheduler.BatchScheduler(...) with a memory budget
+    5. scheduler.longest_first(...), scheduler.makespan(...) and job durations
+"""
+
+import os
+import threading
+import time
+import pytest
+import scheduler
+
+# Set by "_count_initializations" in each worker (process) of the process backend tests.
+INITIALIZATIONS: int = 0
+
+
+def _count_initializations() -> None:
+    """
+    Initializer used by the process backend tests.
+    """
+    # pylint: disable=global-statement
+    global INITIALIZATIONS
+    INITIALIZATIONS += 1
+
+
+def _square_with_pid(item: int) -> tuple[int, int, int]:
+    """
+    Job used by the process backend tests (it has to be importable to be pickled).
+    """
+    return item * item, os.getpid(), INITIALIZATIONS
+
+
+@pytest.mark.parametrize(
+    "workers, max_in_flight",
+    [
+        (0, None),
+        (-1, None),
+        (1.5, None),
+        ("2", None),
+        (True, None),
+        (2, 1),
+        (2, 0),
+        (2, 2.5),
+        (2, False),
+    ],
+)
+def test_batch_scheduler_value_errors(workers, max_in_flight) -> None:
+    """
+    Asserting ValueErrors are raised for wrong worker/queue sizes.
+    """
+    with pytest.raises(ValueError):
+        scheduler.BatchScheduler(workers=workers, max_in_flight=max_in_flight)
+
+
+@pytest.mark.parametrize("backend", ["", "threads", "processes", "gpu", None, 1])
+def test_batch_scheduler_backend_value_errors(backend) -> None:
+    """
+    Asserting ValueErrors are raised for unknown backends.
+    """
+    with pytest.raises(ValueError):
+        scheduler.BatchScheduler(backend=backend)
+
+
+def test_batch_scheduler_defaults() -> None:
+    """
+    Asserting the worker count defaults to the CPU count and the queue to twice that.
+    """
+    batch_scheduler = scheduler.BatchScheduler()
+    expected_workers: int = scheduler.os.cpu_count() or 1
+    assert batch_scheduler.workers == expected_workers
+    assert batch_scheduler.max_in_flight == 2 * expected_workers
+
+
+@pytest.mark.parametrize("workers, batch_size", [(1, 10), (2, 10), (4, 50), (8, 3)])
+def test_batch_scheduler_bounds_concurrency(workers: int, batch_size: int) -> None:
+    """
+    Asserting no more than "workers" jobs run at once and every item is processed.
+    """
+    lock = threading.Lock()
+    running: list[int] = [0]
+    peak: list[int] = [0]
+
+    def job(item: int) -> int:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.005)
+        with lock:
+            running[0] -= 1
+        return item * 2
+
+    batch_scheduler = scheduler.BatchScheduler(workers=workers)
+    results = {
+        item: future.result()
+        for item, future in batch_scheduler.imap(job, range(batch_size))
+    }
+
+    assert results == {item: item * 2 for item in range(batch_size)}
+    assert peak[0] <= workers
+
+
+@pytest.mark.parametrize("workers, max_in_flight", [(1, 1), (2, 3), (4, 8)])
+def test_batch_scheduler_pulls_items_lazily(workers: int, max_in_flight: int) -> None:
+    """
+    Asserting items are pulled from the iterable only when there is room for them.
+    """
+    pulled: list[int] = [0]
+    finished: list[int] = [0]
+
+    def items():
+        for item in range(100):
+            pulled[0] += 1
+            # Items still queued or running can never exceed "max_in_flight".
+            assert pulled[0] - finished[0] <= max_in_flight
+            yield item
+
+    batch_scheduler = scheduler.BatchScheduler(
+        workers=workers, max_in_flight=max_in_flight
+    )
+    for _ in batch_scheduler.imap(lambda item: item, items()):
+        finished[0] += 1
+
+    assert finished[0] == 100
+
+
+def test_batch_scheduler_run_reports_failures() -> None:
+    """
+    Asserting failed jobs are reported without stopping the rest of the batch.
+    """
+
+    def job(item: int, divisor: int) -> float:
+        return divisor / item
+
+    batch_scheduler = scheduler.BatchScheduler(workers=2)
+    failures = batch_scheduler.run(job, [1, 0, 2, 0, 3], 6)
+
+    assert [item for item, _ in failures] == [0, 0]
+    assert all(isinstance(error, ZeroDivisionError) for _, error in failures)
+
+
+def test_batch_scheduler_run_calls_on_done() -> None:
+    """
+    Asserting "on_done" is called once per item, with the exception of the failed ones.
+    """
+    done: dict[int, type | None] = {}
+
+    def on_done(item: int, exception: BaseException | None) -> None:
+        done[item] = None if exception is None else type(exception)
+
+    batch_scheduler = scheduler.BatchScheduler(workers=3)
+    batch_scheduler.run(lambda item: 1 / item, [2, 1, 0, 3], on_done=on_done)
+
+    assert done == {2: None, 1: None, 0: ZeroDivisionError, 3: None}
+
+
+def test_batch_scheduler_process_backend() -> None:
+    """
+    Asserting the process backend runs jobs in other processes, each initialized only once.
+    """
+    batch_scheduler = scheduler.BatchScheduler(
+        workers=2,
+        backend="process",
+        initializer=_count_initializations,
+    )
+    results = [
+        future.result()
+        for _, future in batch_scheduler.imap(_square_with_pid, range(20))
+    ]
+
+    assert sorted(square for square, _, _ in results) == [
+        item * item for item in range(20)
+    ]
+    assert os.getpid() not in {pid for _, pid, _ in results}
+    assert {initializations for _, _, initializations in results} == {1}
+
+
+@pytest.mark.parametrize(
+    "memory_budget, memory_estimate",
+    [
+        (0, len),
+        (-1, len),
+        (1.5, len),
+        ("100", len),
+        (True, len),
+        (100, None),
+    ],
+)
+def test_batch_scheduler_memory_value_errors(memory_budget, memory_estimate) -> None:
+    """
+    Asserting ValueErrors are raised for wrong memory budgets (or budgets without an estimate).
+    """
+    with pytest.raises(ValueError):
+        scheduler.BatchScheduler(
+            memory_budget=memory_budget, memory_estimate=memory_estimate
+        )
+
+
+@pytest.mark.parametrize(
+    "sizes, workers, budget, expected_peak",
+    [
+        # Small jobs fill every worker.
+        ([10] * 20, 4, 100, 4),
+        # Big ones only run with as many others as fit in the budget.
+        ([40] * 10, 4, 100, 2),
+        # A job bigger than the budget runs alone.
+        ([10, 10, 500, 10, 10], 4, 100, 2),
+        ([60, 30, 10, 60, 30, 10], 4, 100, 3),
+    ],
+)
+def test_batch_scheduler_memory_budget(
+    sizes: list[int], workers: int, budget: int, expected_peak: int
+) -> None:
+    """
+    Asserting jobs only run at once while their estimated memory fits in the budget (or alone).
+    """
+    lock = threading.Lock()
+    running: dict[int, int] = {}
+    peaks: dict[str, int] = {"jobs": 0}
+    over_budget: list[list[int]] = []
+
+    def job(item: int) -> None:
+        with lock:
+            running[item] = sizes[item]
+            peaks["jobs"] = max(peaks["jobs"], len(running))
+            if len(running) > 1 and sum(running.values()) > budget:
+                over_budget.append(list(running.values()))
+        time.sleep(0.01)
+        with lock:
+            del running[item]
+
+    batch_scheduler = scheduler.BatchScheduler(
+        workers=workers,
+        memory_budget=budget,
+        memory_estimate=lambda item: sizes[item],
+    )
+    failures = batch_scheduler.run(job, range(len(sizes)))
+
+    assert not failures
+    assert not over_budget
+    assert peaks["jobs"] == expected_peak
+
+
+@pytest.mark.parametrize(
+    "durations, workers, expected",
+    [
+        ([], 2, 0.0),
+        ([3.0], 4, 3.0),
+        ([1.0, 2.0, 3.0], 1, 6.0),
+        ([1.0, 1.0, 1.0, 1.0, 4.0], 2, 6.0),
+        ([4.0, 1.0, 1.0, 1.0, 1.0], 2, 4.0),
+        ([2.0] * 8, 4, 4.0),
+    ],
+)
+def test_makespan(durations: list[float], workers: int, expected: float) -> None:
+    """
+    Asserting the makespan of jobs taken in order by the first free worker.
+    """
+    assert scheduler.makespan(durations, workers) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("workers", [0, -1, 1.5, "2", True])
+def test_makespan_value_errors(workers) -> None:
+    """
+    Asserting ValueErrors are raised for wrong worker counts.
+    """
+    with pytest.raises(ValueError):
+        scheduler.makespan([1.0], workers)
+
+
+def test_longest_first() -> None:
+    """
+    Asserting items are sorted from the most to the least costly, keeping ties in order.
+    """
+    costs: dict[str, int] = {"a": 1, "b": 5, "c": 1, "d": 9, "e": 5}
+
+    assert scheduler.longest_first(costs, costs.get) == ["d", "b", "e", "a", "c"]
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_batch_scheduler_run_durations(backend: str) -> None:
+    """
+    Asserting the seconds of every job which didn't fail are reported.
+    """
+    durations: list[tuple[object, float]] = []
+
+    failures = scheduler.BatchScheduler(workers=2, backend=backend).run(
+        time.sleep, [0.05, 0.01, -1, 0.02], durations=durations
+    )
+
+    assert [item for item, _ in failures] == [-1]
+    assert sorted(item for item, _ in durations) == [0.01, 0.02, 0.05]
+    assert all(seconds >= item for item, seconds in durations)
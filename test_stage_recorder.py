@@ -0,0 +1,231 @@
+"""
+This module will run various tests on the stage recorders from "stage_recorder.py".
+    1. stage_recorder.percentile(...)
+    2. stage_recorder.StageTimings(...)
+    3. stage_recorder.NullRecorder(...), AggregateRecorder(...) and JsonLinesRecorder(...)
+    4. stage_recorder.format_summary(...)
+"""
+
+import json
+import time
+import tracemalloc
+import pytest
+import stage_recorder
+
+
+@pytest.mark.parametrize(
+    "values, rank, expected",
+    [
+        ([1.0], 50, 1.0),
+        ([1.0], 99, 1.0),
+        ([1.0, 2.0], 0, 1.0),
+        ([1.0, 2.0], 50, 1.5),
+        ([1.0, 2.0], 100, 2.0),
+        ([float(value) for value in range(1, 101)], 95, 95.05),
+        ([float(value) for value in range(1, 101)], 99, 99.01),
+        ([0.0, 0.0, 0.0, 10.0], 50, 0.0),
+    ],
+)
+def test_percentile(values: list[float], rank: float, expected: float) -> None:
+    """
+    Asserting percentiles are interpolated between the closest values.
+    """
+    assert stage_recorder.percentile(values, rank) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("values, rank", [([], 50), ([1.0], -1), ([1.0], 101)])
+def test_percentile_value_errors(values: list[float], rank: float) -> None:
+    """
+    Asserting ValueErrors are raised without values or for ranks out of range.
+    """
+    with pytest.raises(ValueError):
+        stage_recorder.percentile(values, rank)
+
+
+def test_stage_timings_measure() -> None:
+    """
+    Asserting wall and CPU time add up for stages measured more than once.
+    """
+    timings = stage_recorder.StageTimings()
+
+    with timings.measure("sleep"):
+        time.sleep(0.02)
+    with timings.measure("sleep"):
+        time.sleep(0.02)
+    with timings.measure("work"):
+        sum(range(200_000))
+
+    assert list(timings) == ["sleep", "work"]
+    assert timings["sleep"] >= 0.04
+    # Sleeping doesn't use the CPU.
+    assert timings.cpu["sleep"] < timings["sleep"] / 2
+    assert timings.cpu["work"] > 0
+    assert not timings.peak
+    assert not timings.max_rss
+
+
+@pytest.mark.skipif(
+    stage_recorder.resource is None, reason="Needs the resource module."
+)
+def test_stage_timings_max_rss() -> None:
+    """
+    Asserting the resident memory after each stage counts buffers tracemalloc can't see.
+    """
+    timings = stage_recorder.StageTimings(memory=True)
+
+    with timings.measure("allocate"):
+        # Filled with ones, so its pages are actually touched.
+        buffer = b"\x01" * (64 * 1024**2)
+
+    assert len(buffer) == 64 * 1024**2
+    assert timings.max_rss["allocate"] >= 64 * 1024**2
+    assert timings.max_rss["allocate"] <= (stage_recorder.max_rss() or 0)
+
+
+def test_stage_timings_nested_peaks() -> None:
+    """
+    Asserting nested stages keep their own peak allocation and outer stages include the inner
+    ones'.
+    """
+    tracemalloc.start()
+    try:
+        timings = stage_recorder.StageTimings(memory=True)
+        with timings.measure("outer"):
+            small: bytearray = bytearray(1024**2)
+            with timings.measure("inner"):
+                big: bytearray = bytearray(8 * 1024**2)
+                del big
+            with timings.measure("after"):
+                pass
+            del small
+    finally:
+        tracemalloc.stop()
+
+    assert 8 * 1024**2 <= timings.peak["inner"] < 9 * 1024**2
+    assert timings.peak["outer"] >= 9 * 1024**2
+    assert timings.peak["after"] < 1024**2
+
+
+def test_stage_timings_add() -> None:
+    """
+    Asserting shared timings are split by "share", while peaks are kept whole.
+    """
+    batch = stage_recorder.StageTimings()
+    batch["inference"], batch.cpu["inference"] = 3.0, 1.5
+    batch.peak["inference"] = 300
+    timings = stage_recorder.StageTimings()
+    timings["inference"], timings.cpu["inference"] = 1.0, 1.0
+
+    timings.add(batch, 1 / 3)
+
+    assert timings["inference"] == pytest.approx(2.0)
+    assert timings.cpu["inference"] == pytest.approx(1.5)
+    assert timings.peak["inference"] == 300
+
+
+def make_timings(seconds: float, peak: int | None = None):
+    """
+    Timings of an image with a single "decode" stage.
+    """
+    timings = stage_recorder.StageTimings()
+    timings["decode"] = seconds
+    timings.cpu["decode"] = seconds / 2
+    if peak is not None:
+        timings.peak["decode"] = peak
+    return timings
+
+
+def test_null_recorder() -> None:
+    """
+    Asserting the null recorder is disabled and records nothing.
+    """
+    recorder = stage_recorder.NullRecorder()
+    recorder.record("a.jpg", make_timings(1.0))
+
+    assert not recorder.enabled
+    assert not recorder.summary()
+    assert not recorder.report()
+    recorder.close()
+
+
+@pytest.mark.parametrize("with_peaks", [False, True])
+def test_aggregate_recorder(with_peaks: bool) -> None:
+    """
+    Asserting the aggregate recorder reports percentiles of every metric of every stage.
+    """
+    recorder = stage_recorder.AggregateRecorder(memory=False)
+    for value in range(1, 101):
+        recorder.record(
+            f"{value}.jpg", make_timings(value / 100, value if with_peaks else None)
+        )
+
+    summary: dict = recorder.summary()
+
+    assert recorder.enabled
+    assert recorder.images == 100
+    assert summary["decode"]["count"] == 100
+    assert summary["decode"]["wall"]["p50"] == pytest.approx(0.505)
+    assert summary["decode"]["cpu"]["p99"] == pytest.approx(0.49505)
+    assert ("python_heap_peak" in summary["decode"]) == with_peaks
+    assert "max_rss" not in summary["decode"]
+    assert recorder.report().startswith("decode: 0.51s / 0.95s / 0.99s (p50/p95/p99)")
+
+
+def test_aggregate_recorder_tracing() -> None:
+    """
+    Asserting the aggregate recorder only stops the memory tracing it started.
+    """
+    recorder = stage_recorder.AggregateRecorder()
+    assert tracemalloc.is_tracing()
+    recorder.close()
+    assert not tracemalloc.is_tracing()
+
+    tracemalloc.start()
+    try:
+        stage_recorder.AggregateRecorder().close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_json_lines_recorder(tmp_path) -> None:
+    """
+    Asserting the JSON lines recorder appends one line per image (and still aggregates them).
+    """
+    file_path: str = str(tmp_path / "stages.jsonl")
+    for run in range(2):
+        recorder = stage_recorder.JsonLinesRecorder(file_path, memory=False)
+        recorder.record(f"{run}.jpg", make_timings(1.0, 2048))
+        recorder.close()
+        assert recorder.images == 1
+
+    with open(file_path, encoding="utf-8") as file:
+        lines: list[dict] = [json.loads(line) for line in file]
+    assert lines == [
+        {
+            "image": f"{run}.jpg",
+            "stages": {"decode": {"wall": 1.0, "cpu": 0.5, "python_heap_peak": 2048}},
+        }
+        for run in range(2)
+    ]
+
+
+def test_format_summary() -> None:
+    """
+    Asserting summaries are formatted as one line per stage.
+    """
+    summary: dict = {
+        "decode": {"count": 1, "wall": {"p50": 0.1, "p95": 0.2, "p99": 0.3}},
+        "save": {
+            "count": 1,
+            "wall": {"p50": 1.0, "p95": 2.0, "p99": 3.0},
+            "python_heap_peak": {"p50": 0, "p95": 0, "p99": 3 * 1024**2},
+            "max_rss": {"p50": 0, "p95": 0, "p99": 200 * 1024**2},
+        },
+    }
+
+    assert stage_recorder.format_summary(summary) == (
+        "decode: 0.10s / 0.20s / 0.30s (p50/p95/p99)\n"
+        + "save: 1.00s / 2.00s / 3.00s (p50/p95/p99), python heap peak 3.0MB (p99), max RSS"
+        + " 200.0MB (p99)"
+    )
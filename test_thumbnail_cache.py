@@ -0,0 +1,185 @@
+"""
+This module will run various tests on the thumbnail cache from "thumbnail_cache.py".
+    1. thumbnail_cache.decode_thumbnail(...)
+    2. thumbnail_cache.ThumbnailCache(...)
+    3. thumbnail_cache.ThumbnailCache.get(...) and thumbnail_cache.ThumbnailCache.evict(...)
+"""
+
+import os
+import threading
+from multiprocessing.pool import ThreadPool
+import pytest
+import thumbnail_cache
+from PIL import Image, ImageFile
+
+
+@pytest.fixture(name="decodes")
+def fixture_decodes(monkeypatch) -> list[tuple]:
+    """
+    Counts the calls to decode_thumbnail (as a list of their arguments).
+    """
+    calls: list[tuple] = []
+    decode = thumbnail_cache.decode_thumbnail
+
+    def counted_decode(*args):
+        calls.append(args)
+        return decode(*args)
+
+    monkeypatch.setattr(thumbnail_cache, "decode_thumbnail", counted_decode)
+    return calls
+
+
+def save_image(path, size: tuple[int, int], mode: str = "RGB") -> str:
+    """
+    Saves an image with the given size and mode to "path" and returns it as a string.
+    """
+    Image.new(mode, size, "red" if mode != "P" else 1).save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "file_name, mode, image_size, size, expected_size",
+    [
+        ("photo.jpg", "RGB", (1200, 900), None, (1200, 900)),
+        ("photo.jpg", "RGB", (1200, 900), (60, 60), (60, 60)),
+        ("photo.jpg", "L", (1200, 900), 0.1, (120, 90)),
+        ("photo.png", "RGBA", (1200, 900), (100, 50), (100, 50)),
+        ("photo.png", "RGB", (1200, 900), 0.001, (1, 1)),
+        ("photo.png", "P", (300, 300), (40, 40), (40, 40)),
+        ("photo.png", "RGB", (30, 20), 3, (90, 60)),
+    ],
+)
+def test_decode_thumbnail(
+    tmp_path, file_name: str, mode: str, image_size, size, expected_size
+) -> None:
+    """
+    Asserting images are decoded with the requested size.
+    """
+    img = thumbnail_cache.decode_thumbnail(
+        save_image(tmp_path / file_name, image_size, mode), size
+    )
+    assert img.size == expected_size
+
+
+def test_decode_thumbnail_drafts_jpegs(tmp_path, monkeypatch) -> None:
+    """
+    Asserting big JPEGs are decoded at a reduced scale (and never at full resolution).
+    """
+    image_path: str = save_image(tmp_path / "photo.jpg", (4000, 3000))
+    decoded_sizes: list[tuple[int, int]] = []
+    load = ImageFile.ImageFile.load
+
+    def spied_load(img):
+        decoded_sizes.append(img.size)
+        return load(img)
+
+    monkeypatch.setattr(ImageFile.ImageFile, "load", spied_load)
+    img = thumbnail_cache.decode_thumbnail(image_path, (100, 75))
+
+    assert img.size == (100, 75)
+    assert set(decoded_sizes) == {(500, 375)}
+
+
+@pytest.mark.parametrize("max_bytes", [0, -1, 1.5, "1000", None, True])
+def test_thumbnail_cache_value_errors(max_bytes) -> None:
+    """
+    Asserting ValueErrors are raised for wrong cache sizes.
+    """
+    with pytest.raises(ValueError):
+        thumbnail_cache.ThumbnailCache(max_bytes)
+
+
+@pytest.mark.parametrize("size", [None, (40, 40), 0.5, 2])
+def test_thumbnail_cache_hits(tmp_path, decodes: list[tuple], size) -> None:
+    """
+    Asserting each image is decoded only once per requested size.
+    """
+    cache = thumbnail_cache.ThumbnailCache()
+    image_path: str = save_image(tmp_path / "photo.png", (80, 60))
+
+    first = cache.get(image_path, size)
+    assert cache.get(image_path, size) is first
+    cache.get(image_path, (10, 10))
+
+    assert len(decodes) == 2
+    assert len(cache) == 2
+    assert cache.size() == 3 * (first.width * first.height + 10 * 10)
+
+
+def test_thumbnail_cache_notices_changes(tmp_path, decodes: list[tuple]) -> None:
+    """
+    Asserting a changed file is decoded again.
+    """
+    cache = thumbnail_cache.ThumbnailCache()
+    image_path: str = save_image(tmp_path / "photo.png", (80, 60))
+    cache.get(image_path, (10, 10))
+
+    save_image(tmp_path / "photo.png", (60, 80))
+    stat = os.stat(image_path)
+    os.utime(image_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert cache.get(image_path).size == (60, 80)
+    assert len(decodes) == 2
+
+
+def test_thumbnail_cache_evicts_least_recently_used(
+    tmp_path, decodes: list[tuple]
+) -> None:
+    """
+    Asserting the least recently used images are dropped once the cache is full.
+    """
+    # Each 10x10 RGB image takes 300 bytes.
+    cache = thumbnail_cache.ThumbnailCache(max_bytes=1000)
+    paths: list[str] = [
+        save_image(tmp_path / f"photo{pos}.png", (20, 20)) for pos in range(4)
+    ]
+    for pos, image_path in enumerate(paths):
+        cache.get(image_path, (10, 10))
+        if pos == 2:
+            # Using the first one, so the second one is the least recently used.
+            cache.get(paths[0], (10, 10))
+
+    assert cache.size() <= cache.max_bytes
+    assert len(cache) == 3
+    decoded: int = len(decodes)
+    cache.get(paths[0], (10, 10))
+    cache.get(paths[3], (10, 10))
+    assert len(decodes) == decoded
+    cache.get(paths[1], (10, 10))
+    assert len(decodes) == decoded + 1
+
+
+def test_thumbnail_cache_keeps_images_bigger_than_its_budget(tmp_path) -> None:
+    """
+    Asserting the most recently used image is kept, even if it alone is over the budget.
+    """
+    cache = thumbnail_cache.ThumbnailCache(max_bytes=10)
+    image = cache.get(save_image(tmp_path / "photo.png", (20, 20)))
+    assert len(cache) == 1 and cache.size() == 3 * 20 * 20
+    cache.clear()
+    assert len(cache) == cache.size() == 0
+    assert image.size == (20, 20)
+
+
+def test_thumbnail_cache_threads(tmp_path) -> None:
+    """
+    Asserting many threads can use the cache at once.
+    """
+    cache = thumbnail_cache.ThumbnailCache(max_bytes=50 * 300)
+    paths: list[str] = [
+        save_image(tmp_path / f"photo{pos}.png", (40, 40)) for pos in range(20)
+    ]
+    lock = threading.Lock()
+    sizes: set[tuple[int, int]] = set()
+
+    def job(image_path: str) -> None:
+        img = cache.get(image_path, (10, 10))
+        with lock:
+            sizes.add(img.size)
+
+    with ThreadPool(8) as pool:
+        pool.map(job, paths * 10)
+
+    assert sizes == {(10, 10)}
+    assert len(cache) == 20
+    assert cache.size() == 20 * 300
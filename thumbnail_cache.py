@@ -0,0 +1,123 @@
+"""
+This module implements the in memory cache of decoded (and resized) images used by the GUI.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image  # type: ignore[import]
+
+
+def decode_thumbnail(
+    image_path: str, size: tuple[int, int] | float | None = None
+) -> Image.Image:
+    """
+    Decodes an image resized to "size", which can be:
+        A tuple of ints, for resizing;
+        A float or int, for indicating a percentage to resize; or
+        None, to keep original size.
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 of their size (draft mode) when that is still
+    bigger than "size", and any image is reduced by an integer factor before the final resize. So a
+    small thumbnail of a 24MP JPEG never has the full resolution image in memory.
+    """
+    img: Image.Image = Image.open(image_path)
+    if size is None:
+        img.load()
+        return img
+
+    if not isinstance(size, tuple):
+        size = (
+            max(int(img.width * size), 1),
+            max(int(img.height * size), 1),
+        )
+
+    # Draft mode picks the smallest scale which still is at least as big as the requested size
+    # (it does nothing for other formats).
+    img.draft(img.mode, size)
+    img.load()
+    if img.mode in ("1", "P"):
+        # Reducing (and resizing smoothly) needs "real" colors.
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    # Keeping at least twice the requested size, so the final resize still looks good.
+    factor: int = min(img.width // (2 * size[0]), img.height // (2 * size[1]))
+    if factor > 1:
+        img = img.reduce(factor)
+    return img.resize(size)
+
+
+class ThumbnailCache:
+    """
+    Least recently used cache of decoded images (see decode_thumbnail), keyed by path, modification
+    time and requested size. Editing (or replacing) a file changes its key, so stale thumbnails are
+    never returned. It's capped at "max_bytes" of decoded pixels and can be used by many threads at
+    once (images are decoded outside of its lock).
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024**2):
+        if (
+            not isinstance(max_bytes, int)
+            or isinstance(max_bytes, bool)
+            or max_bytes <= 0
+        ):
+            raise ValueError("Expected max_bytes to be a positive int.")
+
+        self.max_bytes: int = max_bytes
+        self._images: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._bytes: int = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def size(self) -> int:
+        """
+        Total size (in bytes) of the cached images' pixels.
+        """
+        return self._bytes
+
+    def get(
+        self, image_path: str, size: tuple[int, int] | float | None = None
+    ) -> Image.Image:
+        """
+        Returns the image at "image_path" resized to "size" (see decode_thumbnail), decoding it
+        only if it isn't cached yet. The returned image is shared, so it shouldn't be modified.
+        """
+        stat = os.stat(image_path)
+        key: tuple = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, size)
+        with self._lock:
+            if (img := self._images.get(key)) is not None:
+                self._images.move_to_end(key)
+                return img
+
+        img = decode_thumbnail(image_path, size)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = img
+                self._bytes += image_bytes(img)
+                self.evict()
+        return img
+
+    def evict(self) -> None:
+        """
+        Drops the least recently used images until the cache fits in "max_bytes" (the most
+        recently used one is always kept). The lock must be held by the caller.
+        """
+        while self._bytes > self.max_bytes and len(self._images) > 1:
+            _, img = self._images.popitem(last=False)
+            self._bytes -= image_bytes(img)
+
+    def clear(self) -> None:
+        """
+        Drops every cached image.
+        """
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+def image_bytes(img: Image.Image) -> int:
+    """
+    Approximate size (in bytes) of an image's decoded pixels.
+    """
+    return img.width * img.height * len(img.getbands())